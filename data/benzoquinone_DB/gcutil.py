@@ -108,13 +108,8 @@ def readzmat(filename):
 
 
 def distance_matrix(xyzarr):
-    npart, ncoord = xyzarr.shape
-    dist_mat = np.zeros([npart, npart])
-    for i in range(npart):
-        for j in range(0, i):
-            rvec = xyzarr[i] - xyzarr[j]
-            dist_mat[i][j] = dist_mat[j][i] = np.sqrt(np.dot(rvec, rvec))
-    return dist_mat
+    rvec = xyzarr[:, None, :] - xyzarr[None, :, :]
+    return np.sqrt(np.sum(rvec ** 2, axis=-1))
 
 
 def angle(xyzarr, i, j, k):
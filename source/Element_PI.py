@@ -1,31 +1,20 @@
-from ripser import Rips
 from ripser import ripser
-rips = Rips()
 from sklearn.base import TransformerMixin
-import collections
+import collections.abc
 import numpy as np
 from scipy.stats import multivariate_normal as mvn
 from scipy.stats import norm
+from scipy.sparse.csgraph import minimum_spanning_tree
 import matplotlib.pyplot as plt
+from geometry_util import read_xyz, distance_matrix
 
 
 
 
 def Makexyzdistance(t):
-    element=np.loadtxt(t,dtype=str,usecols=(0,), skiprows=2)
-    x=np.loadtxt(t,dtype=float,usecols=(1), skiprows=2)
-    y=np.loadtxt(t,dtype=float,usecols=(2),skiprows=2)
-    z=np.loadtxt(t,dtype=float,usecols=(3),skiprows=2)
-
-   #print (x)
-   #def Distance(x):
-    Distance=np.zeros(shape=(len(x),len(x)))
-    for i in range(0,len(x)):
-       # Make an array for each atom
-        for j in range(0,len(x)):
-        #Calculate the distance between every atom
-
-            Distance[i][j]=np.sqrt(  ((x[i]-x[j])**2)  + ((y[i]-y[j])**2)  + ((z[i]-z[j]) **2)  )
+    # one parse of the file, distances in a single broadcast
+    element, coords = read_xyz(t)
+    Distance = distance_matrix(coords)
     return [Distance, element]
 
 __all__ = ["PersImage"]
@@ -100,7 +89,7 @@ class PersImage(TransformerMixin):
             return np.zeros((self.nx, self.ny))
         # if first entry of first entry is not iterable, then diagrams is singular and we need to make it a list of diagrams
         try:
-            singular = not isinstance(diagrams[0][0], collections.Iterable)
+            singular = not isinstance(diagrams[0][0], collections.abc.Iterable)
         except IndexError:
             singular = False
 
@@ -140,37 +129,31 @@ class PersImage(TransformerMixin):
 
         weighting = self.weighting(landscape)
 
-        # Define zeros
-        img = np.zeros((self.nx, self.ny))
-        #print (landscape)
-        # Implement this as a `summed-area table` - it'll be way faster
-        
-        if np.size(landscape,1) == 2:
-            
-            spread = self.spread if self.spread else dx
-            for point in landscape:
-                x_smooth = norm.cdf(xs_upper, point[0], spread) - norm.cdf(
-                    xs_lower, point[0], spread
-                )
-                y_smooth = norm.cdf(ys_upper, point[1], spread) - norm.cdf(
-                    ys_lower, point[1], spread
-                )
-                img += np.outer(x_smooth, y_smooth) * weighting(point)
-            img = img.T[::-1]
-            return img
+        # All points at once: per point CDF differences over the pixel edges,
+        # (P, nx) and (P, ny), summed into the image with one einsum.
+        # Variance embedded landscapes carry a per point spread scale in column 3.
+        spread = self.spread if self.spread else dx
+        landscape = np.asarray(landscape, dtype=float)
+        if np.size(landscape, 1) == 2:
+            point_spread = np.full((landscape.shape[0], 1), spread)
         else:
-            #print("Entering Variance Embedded PH")
-            spread = self.spread if self.spread else dx
-            for point in landscape:
-                x_smooth = norm.cdf(xs_upper, point[0], point[2]*spread) - norm.cdf(
-                    xs_lower, point[0], point[2]*spread
-                )
-                y_smooth = norm.cdf(ys_upper, point[1], point[2]*spread) - norm.cdf(
-                    ys_lower, point[1], point[2]*spread
-                )
-                img += np.outer(x_smooth, y_smooth) * weighting(point)
-            img = img.T[::-1]
-            return img
+            point_spread = landscape[:, 2:3] * spread
+
+        births = landscape[:, 0:1]
+        pers = landscape[:, 1:2]
+        x_smooth = norm.cdf(xs_upper[None, :], births, point_spread) - norm.cdf(
+            xs_lower[None, :], births, point_spread
+        )
+        y_smooth = norm.cdf(ys_upper[None, :], pers, point_spread) - norm.cdf(
+            ys_lower[None, :], pers, point_spread
+        )
+        # linear weighting only looks at interval[1], so the transposed
+        # landscape gives one weight per point
+        weights = np.asarray(weighting(landscape.T), dtype=float)
+
+        img = np.einsum("p,px,py->xy", weights, x_smooth, y_smooth)
+        img = img.T[::-1]
+        return img
 
     def weighting(self, landscape=None):
         """ Define a weighting function, 
@@ -244,32 +227,55 @@ class PersImage(TransformerMixin):
             ax.axis("off")
             
 from elements import ELEMENTS
-def VariancePersistv1(Filename, pixelx=100, pixely=100, myspread=2, myspecs={"maxBD": 2, "minBD":0}, showplot=True):
-    #Generate distance matrix and elementlist
-    D,elements=Makexyzdistance(Filename)
+# electronegativity by atomic number (index 0 unused, missing values as 0)
+ELENEG = np.array([0.0] + [e.eleneg if e.eleneg else 0.0 for e in ELEMENTS])
+ATOMIC_NUMBER = dict((e.symbol, e.number) for e in ELEMENTS)
+
+def eleneg_table(elements):
+    """ Electronegativity of every atom in the element list. """
+    return ELENEG[[ATOMIC_NUMBER[str(i)] for i in elements]]
+
+def h0_merge_edges(D):
+    """ Merge edges of the H0 classes of the Rips filtration of D.
+
+    The finite H0 deaths are the edge lengths of a minimum spanning tree of
+    the distance matrix, so the tree gives each class its atom pair directly.
+    Returns (i, j, death) arrays sorted by death, deaths rounded to float32
+    the way ripser reports them.
+    """
+    mst = minimum_spanning_tree(D).tocoo()
+    order = np.argsort(mst.data, kind="stable")
+    return mst.row[order], mst.col[order], mst.data[order].astype(np.float32).astype(float)
+
+def VariancePersistv1(Filename, pixelx=100, pixely=100, myspread=2, myspecs={"maxBD": 2, "minBD":0}, showplot=True,
+        geometry=None, maxdim=1, thresh=np.inf):
+    #Generate distance matrix and elementlist, geometry=(symbols, coords) skips reading Filename
+    if geometry is None:
+        D,elements=Makexyzdistance(Filename)
+    else:
+        elements=geometry[0]
+        D=distance_matrix(geometry[1])
     
-    #Generate data for persistence diagram
-    a=ripser(D,distance_matrix=True)
-    #Make the birth,death for h0 and h1
-    points=(a['dgms'][0][0:-1,1])
-    pointsh1=(a['dgms'][1])
-    diagrams = rips.fit_transform(D, distance_matrix=True) 
-    #Find pair electronegativies
-    eleneg=list()
-    for index in points:
-        c=np.where(np.abs((index-a['dperm2all'])) < .00000015)[0]
-      #  print (index)
-      #  print (c)
-        eleneg.append(np.abs(ELEMENTS[elements[c[0]]].eleneg - ELEMENTS[elements[c[1]]].eleneg))
+    #Generate data for persistence diagram: H0 comes from the spanning tree below,
+    #so the homology only runs once and only for H1 (maxdim=0 skips it)
+    if maxdim >= 1:
+        h1pairs=ripser(D, distance_matrix=True, maxdim=1, thresh=thresh)['dgms'][1]
+        #classes still alive at the threshold are truncated there
+        h1pairs=np.minimum(h1pairs, thresh)
+    else:
+        h1pairs=np.zeros((0,2))
+    #Find pair electronegativies from the merge edge of each H0 class
+    atom_i, atom_j, deaths = h0_merge_edges(D)
+    en = eleneg_table(elements)
+    eleneg = np.abs(en[atom_i] - en[atom_j])
+    h0pairs = np.column_stack((np.zeros_like(deaths), deaths))
     
     #new matrix with electronegativity variance in third row, completely empirical
     #Formula (| EN1 - EN2| + .4) / 10
-    #print(diagrams[0][0:-1,:])
-    #print ((np.array(eleneg)+.4)/10)
     
-    h0matrix=np.hstack(((diagrams[0][0:-1,:], np.reshape(((np.array(eleneg)+.4)/10 ), (np.size(eleneg),1)))))
-    buffer=np.full((diagrams[1][:,0].size,1), 0.05)
-    h1matrix=np.hstack((diagrams[1],buffer))
+    h0matrix=np.hstack((h0pairs, np.reshape(((eleneg+.4)/10 ), (np.size(eleneg),1))))
+    buffer=np.full((h1pairs[:,0].size,1), 0.05)
+    h1matrix=np.hstack((h1pairs,buffer))
     #print (h0matrix)
     #print (h1matrix)
     #combine them
@@ -288,28 +294,33 @@ def VariancePersistv1(Filename, pixelx=100, pixely=100, myspread=2, myspecs={"ma
 
 
 
-def VariancePersist(Filename, pixelx=100, pixely=100, myspread=2, myspecs={"maxBD": 2, "minBD":0}, showplot=True):
-    #Generate distance matrix and elementlist
-    D,elements=Makexyzdistance(Filename)
+def VariancePersist(Filename, pixelx=100, pixely=100, myspread=2, myspecs={"maxBD": 2, "minBD":0}, showplot=True,
+        geometry=None, maxdim=1, thresh=np.inf):
+    #Generate distance matrix and elementlist, geometry=(symbols, coords) skips reading Filename
+    if geometry is None:
+        D,elements=Makexyzdistance(Filename)
+    else:
+        elements=geometry[0]
+        D=distance_matrix(geometry[1])
    
-    #Generate data for persistence diagram
-    a=ripser(D,distance_matrix=True)
-    #Make the birth,death for h0 and h1
-    points=(a['dgms'][0][0:-1,1])
-    pointsh1=(a['dgms'][1])
-    diagrams = rips.fit_transform(D, distance_matrix=True)
-    #Find pair electronegativies
-    eleneg=list()
-    for index in points:
-        c=np.where(np.abs((index-a['dperm2all'])) < .00000015)[0]
-      #  print (index)
-      #  print (c)
-        eleneg.append(np.abs(ELEMENTS[elements[c[0]]].eleneg - ELEMENTS[elements[c[1]]].eleneg))
+    #Generate data for persistence diagram: H0 comes from the spanning tree below,
+    #so the homology only runs once and only for H1 (maxdim=0 skips it)
+    if maxdim >= 1:
+        h1pairs=ripser(D, distance_matrix=True, maxdim=1, thresh=thresh)['dgms'][1]
+        #classes still alive at the threshold are truncated there
+        h1pairs=np.minimum(h1pairs, thresh)
+    else:
+        h1pairs=np.zeros((0,2))
+    #Find pair electronegativies from the merge edge of each H0 class
+    atom_i, atom_j, deaths = h0_merge_edges(D)
+    en = eleneg_table(elements)
+    eleneg = np.abs(en[atom_i] - en[atom_j])
+    h0pairs = np.column_stack((np.zeros_like(deaths), deaths))
    
    
-    h0matrix=np.hstack(((diagrams[0][0:-1,:], np.reshape((((np.array(eleneg)*1.05)+.01)/10 ), (np.size(eleneg),1)))))
-    buffer=np.full((diagrams[1][:,0].size,1), 0.05)
-    h1matrix=np.hstack((diagrams[1],buffer))
+    h0matrix=np.hstack((h0pairs, np.reshape((((eleneg*1.05)+.01)/10 ), (np.size(eleneg),1))))
+    buffer=np.full((h1pairs[:,0].size,1), 0.05)
+    h1matrix=np.hstack((h1pairs,buffer))
     #print (h0matrix)
     #print (h1matrix)
     #combine them
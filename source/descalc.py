@@ -1,138 +1,97 @@
 import argparse
-import math
 
-import numpy as np
-import pandas as pd
-
-
-def write_des(des, dir_temp):
-    # check if this folder has other folders to traverse, works up to 1 layer deep
-
-    if (des == "aval" or des == "morg" or des == "layer" or des == "rdkit"):
-        from source.utils.helpers import rdk, layer, morgan
-        dir = "../data/sdf/" + dir_temp + "/"
-
-    else:
-        dir = "../data/xyz/" + dir_temp + "/"
-
-    if (des == "aval"):
-        print("...........aval started..........")
-        name, mat, homo, homo1, diff = layer(dir)
-
-    elif (des == "morg"):
-        print("...........morgan started..........")
-        name, mat, homo, homo1, diff = morgan(1024, dir)
-
-    elif (des == "layer"):
-        print("...........layers started..........")
-        name, mat, homo, homo1, diff = layer(dir)
-
-    elif (des == "vae"):
-        from source.utils.vae_util import vae
-        print("...........vae started..........")
-        name, mat, homo, homo1, diff  = vae(dir)
-
-    elif (des == "self"):
-        from source.utils.selfies_util import selfies
-        print("...........selfies started..........")
-        name, mat, homo, homo1, diff = selfies(dir)
-
-    elif (des == "auto"):
-        from molsimplify_util import full_autocorr
-        print("...........autocorrelation started..........")
-        name, mat, homo, homo1, diff = full_autocorr(dir)
-
-    #requires a metal in the compound for this desc
-    elif (des == "delta"):
-        from molsimplify_util import metal_deltametrics
-        print("...........deltametrics started..........")
-        name, mat, homo, homo1, diff = metal_deltametrics(dir)
-
-    elif (des == "persist"):
-        from source.utils.Persist_util import persistent
-        print("...........persistent images started..........")
-        name, mat, homo, homo1, diff= persistent(dir)
-
-    else:
-        from source.utils.helpers import rdk
-        print("...........rdk started..........")
-        name, mat, homo, homo1, diff = rdk(dir)
-
-    if (np.shape(mat)[0] > 70000 and (des == "persist")):
-        size = 25000
-        chunks = math.ceil(np.shape(mat)[0] / size)
-
-        for i in range(chunks):
-            if (i == 0):
-
-                temp_array = np.array(mat[0:size * (i + 1)]).astype("float32")
-                temp_dict = {"name": name[0:size * (i + 1)], "mat": temp_array}
-                df = pd.DataFrame.from_dict(temp_dict, orient="index")
-                df = df.transpose()
-
-            elif (i == chunks - 1):
-                temp_array = np.array(mat[size * i:-1]).astype("float32")
-                temp_dict = {"name": name[size * i:-1], "mat": temp_array}
-                df = pd.DataFrame.from_dict(temp_dict, orient="index")
-                df = df.transpose()
-
-            else:
-                temp_array = np.array(mat[size * i:size * (i + 1)]).astype("float32")
-                temp_dict = {"name": name[size * i:size * (i + 1)], "mat": temp_array}
-                df = pd.DataFrame.from_dict(temp_dict, orient="index")
-                df = df.transpose()
-
-            filename = "desc_calc_" + dir_temp + "_" + des + "_" + str(i)
-            try:
-                # print("suppressed")
-                df.to_pickle("../data/desc/" + filename + ".pkl")
-            except:
-                pass
-
-            try:
-                # print("supressed")
-                df.to_hdf("../data/desc/" + filename + ".h5", key="df", mode='a')
-            except:
-                pass
-
-    else:
-        if (des != "self"):
-            mat = np.array(mat).astype("float32")
-        mat = list(mat)
-        temp_dict = {"name": name, "mat": mat, "HOMO": homo, "HOMO-1": homo1, "diff": diff}
-        df = pd.DataFrame.from_dict(temp_dict, orient="index")
-        df = df.transpose()
-        print(df.head())
-        filename = "desc_calc_" + dir_temp + "_" + des
-        df.to_pickle("../data/desc/" + filename + ".pkl")
-        df.to_hdf("../data/desc/" + filename + ".h5", key="df", mode='a')
-        # df_reload = pd.read_pickle("../data/desc/" + filename + ".pkl")
-        # df_reload2 = pd.read_hdf("../data/desc/" + filename + ".h5")
+from source.utils.descriptor_registry import DESCRIPTORS, get_descriptor, input_dir
+
+
+def write_des(des, dir_temp, n_jobs=None):
+    # every descriptor lives in utils/descriptor_registry.py, its backend
+    # is only imported here when it is the one selected
+    entry = get_descriptor(des)
+    dir = input_dir(des, dir_temp)
+    print("..........." + des + " started..........")
+
+    if (entry["stream"] == True):
+        entry["compute"](dir, n_jobs=n_jobs, prefix=store_prefix(des, dir_temp))
+        return
+
+    name, mat, homo, homo1, diff = entry["compute"](dir, n_jobs=n_jobs)
+    save_des(des, dir_temp, name, mat, homo, homo1, diff)
+
+
+def write_des_fused(des_list, dir_temp, n_jobs=None):
+    # sdf fingerprints in one pass: every molecule is parsed once and
+    # feeds all requested families, each written to its own table
+    from source.utils.fingerprint_util import fingerprint_dir
+    from source.utils.label_util import label_columns
+    dir = "../data/sdf/" + dir_temp + "/"
+
+    specs = {}
+    for des in des_list:
+        if get_descriptor(des)["spec"] is None:
+            raise ValueError(des + " can not run fused, only fingerprints can")
+        specs[des] = get_descriptor(des)["spec"]
+    print("...........fused " + ", ".join(des_list) + " started..........")
+    name, mats, labels = fingerprint_dir(dir, specs, n_jobs=n_jobs)
+    homo, homo1, diff = label_columns(name, labels)
+    for des in des_list:
+        save_des(des, dir_temp, name, mats[des], homo, homo1, diff)
+
+
+def store_prefix(des, dir_temp):
+    # same ../data/desc/<dir>/ location train.py and encoding.py read from
+    import os
+    from source.utils.store_util import desc_prefix
+    prefix = desc_prefix(dir_temp, des)
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    return prefix
+
+
+def save_des(des, dir_temp, name, mat, homo, homo1, diff):
+    import numpy as np
+    import pandas as pd
+    from source.utils.store_util import save_store
+    dtype = get_descriptor(des)["dtype"]
+    prefix = store_prefix(des, dir_temp)
+    # compact store: packed bits for fingerprints, float32 block otherwise
+    if (dtype != "str"):
+        kind = save_store(prefix, name, mat, homo, homo1, diff, bits=(dtype == "bits"))
+        print("descriptor store written as " + kind)
+
+    if (dtype != "str"):
+        mat = np.array(mat).astype("float32")
+    mat = list(mat)
+    temp_dict = {"name": name, "mat": mat, "HOMO": homo, "HOMO-1": homo1, "diff": diff}
+    df = pd.DataFrame.from_dict(temp_dict, orient="index")
+    df = df.transpose()
+    print(df.head())
+    df.to_pickle(prefix + ".pkl")
+    df.to_hdf(prefix + ".h5", key="df", mode='a')
+    # df_reload = pd.read_pickle(prefix + ".pkl")
+    # df_reload2 = pd.read_hdf(prefix + ".h5")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='select descriptor, and directory of files')
-    parser.add_argument("--des", action='store', dest="desc", default="rdkit", help="select descriptor to convert to")
+    parser.add_argument("--des", action='store', dest="desc", default="rdkit",
+                        help="select descriptor to convert to (" + ", ".join(sorted(DESCRIPTORS.keys())) +
+                             "), all, or a comma list of sdf fingerprints")
     parser.add_argument("--dir", action="store", dest="dir", default="DB", help="select directory")
+    parser.add_argument("--jobs", action="store", dest="jobs", default=None, type=int,
+                        help="worker processes, defaults to every core")
 
     results = parser.parse_args()
     des = results.desc
     print("parser parsed")
     dir_temp = results.dir
+    n_jobs = results.jobs
     print("pulled director: " + dir_temp)
 
     if(des == "all"):
         #first env
-        print("......rdk started.....")
-        write_des("rdkit", dir_temp)
-        print("......aval started.....")
-        write_des("aval", dir_temp)
-        print("......morgan started.....")
-        write_des("morg", dir_temp)
-        print("......layer started.....")
-        write_des("layer", dir_temp)
+        print("......rdk, aval, morgan, layer started.....")
+        write_des_fused(["rdkit", "aval", "morg", "layer"], dir_temp, n_jobs)
         print("......persistent images started.....")
-        write_des("persist", dir_temp)
+        write_des("persist", dir_temp, n_jobs)
 
         # print("......autocorrelation started.....")
         # write_des("auto", dir_temp)
@@ -143,7 +102,11 @@ if __name__ == "__main__":
         # os.system("export KERAS_BACKEND=tensorflow")
         # write_des("vae", dir_temp)
 
+    elif("," in des):
+        # e.g. --des morg,rdkit runs the fingerprints fused
+        write_des_fused(des.split(","), dir_temp, n_jobs)
+
     else:
-        write_des(des, dir_temp)
+        write_des(des, dir_temp, n_jobs)
 
 
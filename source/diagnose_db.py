@@ -1,24 +1,20 @@
-import os
 import pandas as pd
+from source.utils.manifest_util import list_dir
 
 def check_file(dir = "../data/desc/ZZ/", dir_orig = "../data/sdf/ZZ/"):
 
 
-    ls_dir = "ls " + dir_orig
-    temp = os.popen(ls_dir).read()
-    temp = str(temp).split()
+    temp = list_dir(dir_orig)
     molecules = len(temp)
     print("original number of molecules: " + str(molecules))
 
-    ls_dir = "ls " + dir
-    temp = os.popen(ls_dir).read()
-    temp = str(temp).split()
+    temp = list_dir(dir, cache=False)
     print("dbs to check " + str(temp))
 
     for db in temp:
         if(db[-1] == "l"):
             try:
-                df_reload = pd.read_pickle("../data/desc/" + filename + ".pkl")
+                df_reload = pd.read_pickle(dir + db)
                 print(db + " converted: " + str(df_reload.shape[0]))
             except:
                 print(db + " isn't working")
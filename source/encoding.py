@@ -1,9 +1,10 @@
 import numpy as np
 import pandas as pd
 from sklearn import preprocessing
-from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.decomposition import PCA, IncrementalPCA, TruncatedSVD
 import seaborn as sn
 import matplotlib.pyplot as plt
+from source.utils.store_util import has_store, load_store, desc_prefix, PackedMatrix
 
 if __name__ == "__main__":
 
@@ -17,33 +18,41 @@ if __name__ == "__main__":
     print("pulling directory: " + dir_temp + " with descriptor: " + des)
 
 
-    if (dir_temp == "DB3" or dir_temp == "DB2"):
-        try:
-            print("done processing dataframe")
-            str = "../data/desc/" + dir_temp + "/desc_calc_" + dir_temp + "_" + des + ".pkl"
-            df = pd.read_pickle(str)
-            pkl = 1
-        except:
-            print("done processing dataframe")
-            str = "../data/desc/" + dir_temp + "/desc_calc_" + dir_temp + "_" + des + ".h5"
-            df = pd.read_hdf(str)
-            pkl = 0
+    store_prefix = desc_prefix(dir_temp, des)
+    if (has_store(store_prefix)):
+        # bit fingerprints stay packed, the fits below unpack them batch by batch
+        df, mat = load_store(store_prefix)
+        x_data = mat
+    else:
+        if (dir_temp == "DB3" or dir_temp == "DB2"):
+            try:
+                print("done processing dataframe")
+                str = store_prefix + ".pkl"
+                df = pd.read_pickle(str)
+                pkl = 1
+            except:
+                print("done processing dataframe")
+                str = store_prefix + ".h5"
+                df = pd.read_hdf(str)
+                pkl = 0
+
+        if (des == "vae"):
+            temp = df["mat"].tolist()
+            mat = list([i.flatten() for i in temp])
+
+        elif (des == "auto"):
+            temp = df["mat"].tolist()
+            mat = list([i.flatten() for i in temp])
+        else:
+            mat = df["mat"].to_numpy()
+        x_data = df["mat"].to_numpy()
+        x_data = np.ndarray.tolist(x_data)
     HOMO = df["HOMO"].to_numpy()
     HOMO_1 = df["HOMO-1"].to_numpy()
     diff = df["diff"].to_numpy()
 
-    if (des == "vae"):
-        temp = df["mat"].tolist()
-        mat = list([i.flatten() for i in temp])
-
-    elif (des == "auto"):
-        temp = df["mat"].tolist()
-        mat = list([i.flatten() for i in temp])
-    else:
-        mat = df["mat"].to_numpy()
-
     scale_x_tf = True
-    if (scale_x_tf == True):
+    if (scale_x_tf == True and not isinstance(mat, PackedMatrix)):
         try:
             mat = preprocessing.scale(np.array(mat))
 
@@ -51,22 +60,44 @@ if __name__ == "__main__":
             mat = list(mat)
             mat = preprocessing.scale(np.array(mat))
 
-    x_data = df["mat"].to_numpy()
-    x_data = np.ndarray.tolist(x_data)
-
-
-    pca = PCA(n_components = 6)
-    pca.fit(x_data)
-    print(pca.explained_variance_ratio_.sum())
 
-    svd = TruncatedSVD(n_components=6, n_iter = 10)
-    svd.fit(x_data)
-    print(svd.explained_variance_ratio_.sum())
 
     print(type(x_data))
-    temp = pd.DataFrame(x_data)
+    if (isinstance(x_data, PackedMatrix)):
+        pca = IncrementalPCA(n_components = 6)
+        n = 0
+        total = np.zeros((x_data.shape[1],))
+        cross = np.zeros((x_data.shape[1], x_data.shape[1]))
+        for batch in x_data.batches():
+            # a tail shorter than n_components can not be partial_fit
+            if (len(batch) >= 6):
+                pca.partial_fit(batch)
+            n += len(batch)
+            total += batch.sum(axis=0)
+            cross += np.dot(batch.T, batch)
+        print(pca.explained_variance_ratio_.sum())
+
+        svd = TruncatedSVD(n_components=6, n_iter = 10)
+        svd.fit(x_data.to_sparse())
+        print(svd.explained_variance_ratio_.sum())
+
+        # pearson correlation from the batch sums, constant bits give NaN as in DataFrame.corr
+        mean = total / n
+        cov = cross / n - np.outer(mean, mean)
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr_matrix = pd.DataFrame(cov / np.outer(std, std))
+    else:
+        pca = PCA(n_components = 6)
+        pca.fit(x_data)
+        print(pca.explained_variance_ratio_.sum())
+
+        svd = TruncatedSVD(n_components=6, n_iter = 10)
+        svd.fit(x_data)
+        print(svd.explained_variance_ratio_.sum())
 
-    corr_matrix = temp.corr()
+        temp = pd.DataFrame(x_data)
+        corr_matrix = temp.corr()
     sn.heatmap(corr_matrix)
     plt.show()
 
@@ -21,6 +21,7 @@
 # Utilities for gc.py
 
 import numpy as np
+from geometry_util import read_xyz, distance_matrix as pairwise_distances
 
 
 def replace_vars(vlist, variables):
@@ -37,27 +38,8 @@ def replace_vars(vlist, variables):
 
 
 def readxyz(filename):
-    xyzf = open(filename, 'r')
-    xyzarr = np.zeros([1, 3])
-    atomnames = []
-    if not xyzf.closed:
-        # Read the first line to get the number of particles
-        npart = int(xyzf.readline())
-        # and next for title card
-        title = xyzf.readline()
-
-        # Make an N x 3 matrix of coordinates
-        xyzarr = np.zeros([npart, 3])
-        i = 0
-        for line in xyzf:
-            words = line.split()
-            if (len(words) > 3):
-                atomnames.append(words[0])
-                xyzarr[i][0] = float(words[1])
-                xyzarr[i][1] = float(words[2])
-                xyzarr[i][2] = float(words[3])
-                i = i + 1
-    return (xyzarr, atomnames)
+    symbols, xyzarr = read_xyz(filename)
+    return (xyzarr, symbols.tolist())
 
 
 def readzmat(filename):
@@ -108,13 +90,7 @@ def readzmat(filename):
 
 
 def distance_matrix(xyzarr):
-    npart, ncoord = xyzarr.shape
-    dist_mat = np.zeros([npart, npart])
-    for i in range(npart):
-        for j in range(0, i):
-            rvec = xyzarr[i] - xyzarr[j]
-            dist_mat[i][j] = dist_mat[j][i] = np.sqrt(np.dot(rvec, rvec))
-    return dist_mat
+    return pairwise_distances(xyzarr)
 
 
 def angle(xyzarr, i, j, k):
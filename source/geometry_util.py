@@ -0,0 +1,49 @@
+import numpy as np
+
+# shared xyz reader for Element_PI, gcutil and Persist_util
+
+def read_xyz(filename):
+    """ Parse an xyz file once.
+
+    Returns the element symbols as an (N,) str array and the coordinates as
+    an (N, 3) float array. Lines after the title card with fewer than four
+    fields are skipped.
+    """
+    with open(filename) as fp:
+        lines = fp.read().splitlines()
+
+    rows = [line.split() for line in lines[2:]]
+    rows = [row for row in rows if len(row) > 3]
+    symbols = np.array([row[0] for row in rows], dtype=str)
+    coords = np.array([row[1:4] for row in rows], dtype=float).reshape(-1, 3)
+    return symbols, coords
+
+def distance_matrix(coords):
+    """ Pairwise euclidean distances of an (N, 3) coordinate array. """
+    coords = np.asarray(coords, dtype=float)
+    delta = coords[:, None, :] - coords[None, :, :]
+    return np.sqrt(np.sum(delta ** 2, axis=-1))
+
+def read_xyz_batch(paths):
+    """ Read many xyz files into one ragged array.
+
+    Returns the paths that parsed, all symbols and coordinates concatenated,
+    and an offset array so molecule i is ``coords[offsets[i]:offsets[i + 1]]``.
+    """
+    names = []
+    symbols = []
+    coords = []
+    offsets = [0]
+    for path in paths:
+        try:
+            sym, xyz = read_xyz(path)
+        except (OSError, ValueError):
+            continue
+        names.append(path)
+        symbols.append(sym)
+        coords.append(xyz)
+        offsets.append(offsets[-1] + len(sym))
+
+    if (len(names) == 0):
+        return names, np.zeros((0,), dtype=str), np.zeros((0, 3)), np.array(offsets)
+    return names, np.concatenate(symbols), np.vstack(coords), np.array(offsets)
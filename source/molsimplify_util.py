@@ -1,61 +1,59 @@
 import sys
 import numpy as np
 from source.utils.helpers import merge_dir_and_data
+from source.utils.label_util import label_columns
+from source.utils.cache_util import DescriptorCache, COMMIT_EVERY
 from molSimplify.Classes.mol3D import *
 from molSimplify.Informatics.autocorrelation import *
 from molSimplify.Informatics.graph_analyze import *
 from molSimplify.Informatics.misc_descriptors import *
 
-def full_autocorr(dir="../data/xyz/"):
+def full_autocorr(dir="../data/xyz/", depth=3, cache=True):
     res = []
     names = []
-    homo = []
-    homo1 = []
-    diff = []
 
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
+    dir_fl_names, labels = merge_dir_and_data(dir = dir)
+
+    # only new or changed geometries get recomputed
+    hits = {}
+    digests = {}
+    if (cache == True):
+        des_cache = DescriptorCache("auto", {"depth": depth})
+        hits, misses, digests = des_cache.lookup([dir + i for i in dir_fl_names])
+        print("cached: " + str(len(hits)) + " to compute: " + str(len(misses)))
     #---------------------------------------------------------------------------
+    new_rows = 0
     for tmp, item in enumerate(dir_fl_names):
         try:
-            this_mol = mol3D()  # mol3D instance
-            this_mol.readfromxyz(dir + item)  # read geo
-            results_auto = generate_full_complex_autocorrelations(this_mol, depth=3, loud=True)["results"]
-
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                res.append(results_auto)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
+            if (dir + item in hits):
+                results_auto = hits[dir + item]
             else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        res.append(results_auto)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    pass
+                this_mol = mol3D()  # mol3D instance
+                this_mol.readfromxyz(dir + item)  # read geo
+                results_auto = generate_full_complex_autocorrelations(this_mol, depth=depth, loud=True)["results"]
+                if (cache == True):
+                    des_cache.put(dir + item, np.array(results_auto), digests.get(dir + item))
+                    new_rows += 1
+                    if (new_rows % COMMIT_EVERY == 0):
+                        des_cache.commit()
+
+            res.append(results_auto)
+            names.append(item)
             sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
             sys.stdout.flush()
         except:
             pass
+    if (cache == True):
+        des_cache.close()
     res = np.array(res)
+    homo, homo1, diff = label_columns(names, labels)
     return names, res, homo, homo1, diff
 
 def deltametrics_gen(dir="../data/xyz/"):
     results_delta = []
     names = []
-    homo = []
-    homo1 = []
-    diff = []
 
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
+    dir_fl_names, labels = merge_dir_and_data(dir = dir)
     #---------------------------------------------------------------------------
     for tmp, item in enumerate(dir_fl_names):
         try:
@@ -63,41 +61,21 @@ def deltametrics_gen(dir="../data/xyz/"):
             this_mol.readfromxyz(item)  # read geo
             results_delta_temp = deltametric(this_mol)["results"]
 
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                results_delta.append(results_delta_temp)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
-            else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        results_delta.append(results_delta_temp)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    pass
+            results_delta.append(results_delta_temp)
+            names.append(item)
             sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
             sys.stdout.flush()
         except:
             pass
     ret = np.array(results_delta)
+    homo, homo1, diff = label_columns(names, labels)
     return names, ret, homo, homo1, diff
 
 def metal_deltametrics(dir="../data/xyz/"):
     res = []
     names = []
-    homo = []
-    homo1 = []
-    diff = []
 
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
+    dir_fl_names, labels = merge_dir_and_data(dir = dir)
     #---------------------------------------------------------------------------
     for tmp, item in enumerate(dir_fl_names):
         try:
@@ -105,30 +83,12 @@ def metal_deltametrics(dir="../data/xyz/"):
             this_mol.readfromxyz(dir + item)  # read geo
             results_delta = generate_metal_deltametrics(this_mol, loud="something")["results"]
 
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                res.append(results_delta)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
-            else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        res.append(results_delta)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    #print(list_to_sort[tmp].split(":")[0], item[0:-4])
-                    pass
+            res.append(results_delta)
+            names.append(item)
             sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
             sys.stdout.flush()
         except:
             pass
     res = np.array(res)
+    homo, homo1, diff = label_columns(names, labels)
     return names, res, homo, homo1, diff
\ No newline at end of file
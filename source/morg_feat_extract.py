@@ -11,8 +11,9 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 import pybel
-from rdkit.Chem import AllChem, DataStructs, SDMolSupplier, Draw
+from rdkit.Chem import AllChem, DataStructs, Draw
 from rdkit.Chem.Draw import IPythonConsole
+from source.utils.sdf_util import iter_sdf
 
 def morgan(dir, bit_length=256):
     morgan = []
@@ -21,10 +22,8 @@ def morgan(dir, bit_length=256):
     bitInfo_arr = []
     mol_arr = []
     dir = "../data/sdf/master.sdf"
-    temp_str = "ls " + dir
-    temp = os.popen(temp_str).read()
-    temp = str(temp).split()
-    mols = [ i for i in SDMolSupplier(dir)]
+    # streamed once, the Mols are kept for the bit drawings below
+    mols = [mol for name, mol in iter_sdf([dir], use_title=True)]
 
 
     for i, suppl in enumerate(mols):
@@ -44,7 +43,7 @@ def morgan(dir, bit_length=256):
             pass
 
     morgan = np.array(morgan)
-    print("successfully processed " + str(i) + " out of " + str(len(temp)) + " molecules")
+    print("successfully processed " + str(len(names)) + " out of " + str(len(mols)) + " molecules")
     return names, morgan, ret_arr, bitInfo_arr, mols
 
 
@@ -1,17 +1,16 @@
-import os
+import itertools
 import numpy as np
 import matplotlib.pyplot as plt
 
 from rdkit.Chem import AllChem, DataStructs
-from rdkit.Chem import SDMolSupplier
 from rdkit.Avalon import pyAvalonTools
+from source.utils.manifest_util import list_dir
+from source.utils.sdf_util import iter_sdf
 
 
 def rd_kit(dir_sdf = "../data/sdf/"):
 
-    temp_str = "ls " + dir_sdf
-    temp = os.popen(temp_str).read()
-    temp = str(temp).split()
+    temp = list_dir(dir_sdf)
     bit_length = 1024
 
     sim_matrix_morgan = []
@@ -19,22 +18,23 @@ def rd_kit(dir_sdf = "../data/sdf/"):
     sim_matrix_aval = []
     sim_matrix_layer = []
 
-    baseline = SDMolSupplier(dir_sdf + temp[0])
+    # one lazy pass over the files (or shards), the first molecule is the baseline
+    mols = iter_sdf([dir_sdf + i for i in temp])
+    baseline_name, baseline = next(mols)
 
-    baseline_morgan = AllChem.GetMorganFingerprintAsBitVect(baseline[0], 2, nBits=bit_length)
-    baseline_rdk = AllChem.RDKFingerprint(baseline[0], maxPath=2)
-    baseline_aval = pyAvalonTools.GetAvalonFP(baseline[0], 128)
-    baseline_layer = AllChem.LayeredFingerprint(baseline[0])
+    baseline_morgan = AllChem.GetMorganFingerprintAsBitVect(baseline, 2, nBits=bit_length)
+    baseline_rdk = AllChem.RDKFingerprint(baseline, maxPath=2)
+    baseline_aval = pyAvalonTools.GetAvalonFP(baseline, 128)
+    baseline_layer = AllChem.LayeredFingerprint(baseline)
     count = 0
-    for item in temp:
-        suppl = SDMolSupplier(dir_sdf + item)
+    for item, mol in itertools.chain([(baseline_name, baseline)], mols):
         count += 1
-        fp = AllChem.GetMorganFingerprint(suppl[0], 2)
+        fp = AllChem.GetMorganFingerprint(mol, 2)
 
-        fp_bit = AllChem.GetMorganFingerprintAsBitVect(suppl[0], 3, nBits=bit_length)
-        fp_rdk = AllChem.RDKFingerprint(suppl[0], maxPath=3)
-        fp_aval = pyAvalonTools.GetAvalonFP(suppl[0], 128)
-        fp_layer = AllChem.LayeredFingerprint(suppl[0])
+        fp_bit = AllChem.GetMorganFingerprintAsBitVect(mol, 3, nBits=bit_length)
+        fp_rdk = AllChem.RDKFingerprint(mol, maxPath=3)
+        fp_aval = pyAvalonTools.GetAvalonFP(mol, 128)
+        fp_layer = AllChem.LayeredFingerprint(mol)
 
         sim_matrix_morgan.append(
             DataStructs.FingerprintSimilarity(baseline_morgan, fp_bit, metric=DataStructs.TanimotoSimilarity))
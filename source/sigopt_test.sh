@@ -2,27 +2,21 @@ eval "$(conda shell.bash hook)"
 conda activate tf_gpu
 conda list
 
-# set this for the experiment to be used
-#export SIGOPT_PROJECT=.sigopt_yaml
+# trials are kept in ../data/train/studies/, start the same line on more
+# nodes sharing that directory to run workers in parallel
 
 # steps: set python command with right descriptor, energy band, yaml, db
 # specify the right yaml file
-# export the right experiment file
 
 
 
-export SIGOPT_PROJECT=ml-co2-db3-diff-morg-sgd
-#export SIGOPT_PROJECT=ml_co2
-sigopt optimize train.py --dir DB3 --des morg --algo sgd --sigopt --diff --sigopt-file ./sigopt_experiments/sgd.yml
-#sigopt run train.py --dir DB3 --des morg --algo sgd --sigopt
-#export SIGOPT_PROJECT=ml-co2-db3-diff-rf
-#sigopt optimize train.py --dir DB3 --des morg --algo rf --sigopt --diff --sigopt-file ./sigopt_experiments/rf.yml
+python train.py --dir DB3 --des morg --algo sgd --sigopt --diff --study-file ./sigopt_experiments/sgd.yml
+#python train.py --dir DB3 --des morg --algo rf --sigopt --diff --study-file ./sigopt_experiments/rf.yml
 
-#export SIGOPT_PROJECT=ml-co2-rdkit-db3-diff-grad
-#sigopt optimize train.py --dir DB3 --des rdkit --algo grad --sigopt --diff --sigopt-file ./sigopt_experiments/grad.yml
+#python train.py --dir DB3 --des rdkit --algo grad --sigopt --diff --study-file ./sigopt_experiments/grad.yml
 
 
-# set --sigopt-file, the choices are:
+# set --study-file, the choices are:
 # ./sigopt_experiments/xgboost.yml
 #./sigopt_experiments/grad.yml
 #./sigopt_experiments/svr.yml
@@ -32,5 +26,5 @@ sigopt optimize train.py --dir DB3 --des morg --algo sgd --sigopt --diff --sigop
 #./sigopt_experiments/sgd.yml
 
 
-#sigopt optimize train.py --dir DB3 --des morg --algo xgboost --sigopt --diff --sigopt-file ./sigopt_experiments/xgboost.yml
+#python train.py --dir DB3 --des morg --algo xgboost --sigopt --diff --study-file ./sigopt_experiments/xgboost.yml
 
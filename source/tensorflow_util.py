@@ -1,7 +1,6 @@
 import numpy as np
 import tensorflow as tf
 import tensorflow.keras as keras
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.model_selection import train_test_split
 from tensorflow.keras.callbacks import TensorBoard, EarlyStopping
 from tensorflow.keras.layers import Dense, MaxPooling2D, Conv2D, Dropout, \
@@ -9,6 +8,8 @@ from tensorflow.keras.layers import Dense, MaxPooling2D, Conv2D, Dropout, \
 from tensorflow.keras.models import Sequential
 import matplotlib.pyplot as plt
 
+from source.utils.metrics_util import as_float32, timed_fit, report
+
 class ResidualUnit(keras.layers.Layer):
     def __init__(self, filters, strides=1, activation="relu", **kwargs):
         super().__init__(**kwargs)
@@ -48,22 +49,10 @@ def resnet34(x, y, scale, iter = 150):
     config.gpu_options.allow_growth = True
     session = InteractiveSession(config=config)
 
-    try:
-        x.shape
-        x = x.tolist()
-    except:
-        pass
-
-    try:
-        x = tf.convert_to_tensor(x.tolist())
-        y = tf.convert_to_tensor(y.tolist())
-        input_dim = np.shape(x[0])
-
-    except:
-        input_dim = len(x[0])
-
-    x = np.array(x)
-    y = np.array(y)
+    # one float32 copy at most, no round trip through python lists
+    x = as_float32(x)
+    y = np.asarray(y, dtype=np.float32)
+    input_dim = np.shape(x)[1]
 
     dim_persist = int(np.shape(x)[1] ** 0.5)
     x = x.reshape((np.shape(x)[0], dim_persist, dim_persist))
@@ -97,43 +86,18 @@ def resnet34(x, y, scale, iter = 150):
     opt = tf.keras.optimizers.Adam(learning_rate=0.001, beta_1=0.9, beta_2=0.999, epsilon=1E-7, amsgrad=False)
     model.compile(optimizer=opt, loss="MSE", metrics=["MeanSquaredError", "MAE"])
     early_stop = EarlyStopping(monitor="loss", verbose=1, patience=10)
-    history = model.fit(x_train, y_train, epochs=iter, batch_size=32, callbacks=[early_stop], validation_split=0.15)
-    ret = model.evaluate(x_test, y_test, verbose=2)
+    history, time_el = timed_fit(model, x_train, y_train, epochs=iter, batch_size=32, callbacks=[early_stop], validation_split=0.15)
     plt.plot(history.history["loss"][2:-1], label = "Training Loss")
     plt.plot(history.history["val_loss"][2:-1], label = "Validation Loss")
     plt.legend()
-    score = str(mean_squared_error(model.predict(x_test), y_test))
-    print("MSE score:   " + str(score))
-
-    score = str(mean_absolute_error(model.predict(x_test), y_test))
-    print("MAE score:   " + str(score))
-
-    score = str(r2_score(model.predict(x_test), y_test))
-    print("r2 score:   " + str(score))
-
-    score_mae = mean_absolute_error(model.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+    model.metrics_ = report(model, x_test, y_test, scale, time_el)
 
     return model
 
 def nn_basic(x, y, scale, iter = 50):
-    try:
-        x.shape
-        x = x.tolist()
-    except:
-        pass
-
-    try:
-        x = tf.convert_to_tensor(x.tolist())
-        y = tf.convert_to_tensor(y.tolist())
-        input_dim = np.shape(x[0])
-
-    except:
-        input_dim = len(x[0])
-
-    x = np.array(x)
-    y = np.array(y)
+    x = as_float32(x)
+    y = np.asarray(y, dtype=np.float32)
+    input_dim = np.shape(x)[1]
 
     x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.1, random_state=42)
     print("Input vector size: " + str(input_dim))
@@ -167,23 +131,14 @@ def nn_basic(x, y, scale, iter = 50):
     #tensorboard_cbk = TensorBoard(log_dir=log_dir)
     #history = model.fit(x_train, y_train, epochs=10, callbacks=[tensorboard_callback])
     early_stop = EarlyStopping(monitor="loss", verbose=1, patience=10)
-    history = model.fit(x_train, y_train, epochs=iter, validation_split=0.15, callbacks = [early_stop])
+    history, time_el = timed_fit(model, x_train, y_train, epochs=iter, validation_split=0.15, callbacks = [early_stop])
 
-    ret = model.evaluate(x_test, y_test, verbose=1)
     print(history.history.keys())
     plt.plot(history.history["loss"][2:-1], label = "Training Loss")
     plt.plot(history.history["val_loss"][2:-1], label = "Validation Loss")
     plt.legend()
 
-    score = str(mean_squared_error(model.predict(x_test), y_test))
-    print("MSE score:   " + str(score))
-    score = str(mean_absolute_error(model.predict(x_test), y_test))
-    print("MAE score:   " + str(score))
-    score = str(r2_score(model.predict(x_test), y_test))
-    print("r2 score:   " + str(score))
-    score_mae = mean_absolute_error(model.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+    model.metrics_ = report(model, x_test, y_test, scale, time_el)
 
     return model
 
@@ -195,22 +150,9 @@ def cnn_basic(x, y, scale, iter = 50):
     config.gpu_options.allow_growth = True
     session = InteractiveSession(config=config)
 
-    try:
-        x.shape
-        x = x.tolist()
-    except:
-        pass
-
-    try:
-        x = tf.convert_to_tensor(x.tolist())
-        y = tf.convert_to_tensor(y.tolist())
-        input_dim = np.shape(x[0])
-
-    except:
-        input_dim = len(x[0])
-
-    x = np.array(x)
-    y = np.array(y)
+    x = as_float32(x)
+    y = np.asarray(y, dtype=np.float32)
+    input_dim = np.shape(x)[1]
 
     dim_persist = int(np.shape(x)[1] ** 0.5)
     x = x.reshape((np.shape(x)[0], dim_persist, dim_persist))
@@ -244,26 +186,14 @@ def cnn_basic(x, y, scale, iter = 50):
     model.compile(optimizer='adam', loss="MSE", metrics=["MeanSquaredError", "MAE"])
 
     # tensorboard_cbk = TensorBoard(log_dir=log_dir)
-    history = model.fit(x_train, y_train, epochs=iter, validation_split=0.15)
-    ret = model.evaluate(x_test, y_test, verbose=2)
+    history, time_el = timed_fit(model, x_train, y_train, epochs=iter, validation_split=0.15)
 
     print(history.history.keys())
     plt.plot(history.history["loss"][2:-1], label = "Training Loss")
     plt.plot(history.history["val_loss"][2:-1], label = "Validation Loss")
     plt.legend()
 
-    score = str(mean_squared_error(model.predict(x_test), y_test))
-    print("MSE score:   " + str(score))
-
-    score = str(mean_absolute_error(model.predict(x_test), y_test))
-    print("MAE score:   " + str(score))
-
-    score = str(r2_score(model.predict(x_test), y_test))
-    print("r2 score:   " + str(score))
-
-    score_mae = mean_absolute_error(model.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+    model.metrics_ = report(model, x_test, y_test, scale, time_el)
 
     return model
 
@@ -275,22 +205,9 @@ def cnn_norm_basic(x, y, scale, iter = 200):
     config.gpu_options.allow_growth = True
     session = InteractiveSession(config=config)
 
-    try:
-        x.shape
-        x = x.tolist()
-    except:
-        pass
-
-    try:
-        x = tf.convert_to_tensor(x.tolist())
-        y = tf.convert_to_tensor(y.tolist())
-        input_dim = np.shape(x[0])
-
-    except:
-        input_dim = len(x[0])
-
-    x = np.array(x)
-    y = np.array(y)
+    x = as_float32(x)
+    y = np.asarray(y, dtype=np.float32)
+    input_dim = np.shape(x)[1]
 
     dim_persist = int(np.shape(x)[1] ** 0.5)
     x = x.reshape((np.shape(x)[0], dim_persist, dim_persist))
@@ -337,24 +254,12 @@ def cnn_norm_basic(x, y, scale, iter = 200):
     log_dir = "./logs/training/"
     model.compile(optimizer='adam', loss="MSE", metrics=["MeanSquaredError", "MAE"])
 
-    history = model.fit(x_train, y_train, epochs=iter, validation_split=0.15)
-    ret = model.evaluate(x_test, y_test, verbose=2)
+    history, time_el = timed_fit(model, x_train, y_train, epochs=iter, validation_split=0.15)
     print(history.history.keys())
     plt.plot(history.history["loss"][2:-1], label = "Training Loss")
     plt.plot(history.history["val_loss"][2:-1], label = "Validation Loss")
     plt.legend()
 
-    score = str(mean_squared_error(model.predict(x_test), y_test))
-    print("MSE score:   " + str(score))
-
-    score = str(mean_absolute_error(model.predict(x_test), y_test))
-    print("MAE score:   " + str(score))
-
-    score = str(r2_score(model.predict(x_test), y_test))
-    print("r2 score:   " + str(score))
-
-    score_mae = mean_absolute_error(model.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+    model.metrics_ = report(model, x_test, y_test, scale, time_el)
 
     return model
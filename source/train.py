@@ -1,13 +1,17 @@
-import joblib, argparse, uuid, sigopt
+import joblib, argparse, uuid
 import pandas as pd
 from sklearn import preprocessing
 from source.utils.sklearn_utils import *
+from source.utils import study_util
+from source.utils.metrics_util import data_fingerprint
+from source.utils.store_util import has_store, load_store, desc_prefix, scale_batched, PackedMatrix
 
 # todo: work on interpretability algo/aspects
 # todo: plots of parameter space
 # todo: process zz's stuff
 
-def calc(x, y, des, scale, rand_tf = False, grid_tf=False, bayes_tf=False, sigopt_tf = False, algo="sgd"):
+def calc(x, y, des, scale, rand_tf = False, grid_tf=False, bayes_tf=False, sigopt_tf = False, algo="sgd",
+         study_file=None, n_trials=None, max_runtime=study_util.MAX_RUNTIME):
 
     if (rand_tf == True):
         #todo incorp all sklearn algos here
@@ -31,8 +35,17 @@ def calc(x, y, des, scale, rand_tf = False, grid_tf=False, bayes_tf=False, sigop
 
     elif (sigopt_tf == True):
 
-        print("........starting sigopt bayes search........")
-        bayes_obj = bayes_sigopt(x, y, method=algo)
+        print("........starting local bayes search........")
+        if study_file is None:
+            study_file = "./sigopt_experiments/" + algo + ".yml"
+        # workers started with the same --dir/--des/--algo share this study
+        db = study_util.STUDY_DIR + "study_" + algo + "_" + des + ".sqlite"
+        # hashed once here instead of on every trial's fold cache lookup
+        x = np.asarray(x)
+        fingerprint = data_fingerprint(x, y)
+        bayes_obj = study_util.optimize(study_file,
+                                        lambda: bayes_sigopt(x, y, method=algo, fingerprint=fingerprint),
+                                        db=db, n_trials=n_trials, max_runtime=max_runtime)
         uuid_temp = uuid.uuid4()
         str = "../data/train/bayes/complete_bayes_" + algo + "_" + des + "_" + uuid_temp.urn[9:] + ".pkl"
         joblib.dump(bayes_obj, str)
@@ -97,6 +110,25 @@ def calc(x, y, des, scale, rand_tf = False, grid_tf=False, bayes_tf=False, sigop
             reg = sgd(x, y, scale)
         return reg
 
+# tensorflow models still train one target at a time
+TF_ALGOS = ["tf_nn", "tf_cnn", "tf_cnn_norm", "resnet"]
+
+def calc_multi(x, targets, algo="sgd"):
+    # Input: feature matrix, dict target name -> raw target column
+    # Output: fitted estimator, dict target name -> scores
+    # one split and one fit for HOMO, HOMO-1 and diff together
+    names = list(targets.keys())
+    cols = []
+    scales = []
+    for name in names:
+        col = np.asarray(targets[name], dtype=float)
+        scale_col = (np.max(col) - np.min(col))
+        cols.append((col - np.min(col)) / scale_col)
+        scales.append(scale_col)
+    y = np.stack(cols, axis=1)
+    print("........starting multi-target evaluation: " + algo + "........")
+    return multi_target(x, y, scales, algo=algo, targets=names)
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='select descriptor, and directory of files')
@@ -107,12 +139,22 @@ if __name__ == "__main__":
                         help="options: [svr_rbf, svr_poly, svr_lin, grad, rf, sgd, bayes, kernel, gaussian, nn]")
     parser.add_argument('--grid', dest="grid_tf", action='store_true')
     parser.add_argument('--bayes', dest="bayes_tf", action='store_true')
-    parser.add_argument('--sigopt', dest="sigopt", action='store_true')
+    parser.add_argument('--sigopt', dest="sigopt", action='store_true',
+                        help="local bayes search over a sigopt-style experiment file")
+    parser.add_argument("--study-file", action="store", dest="study_file", default=None,
+                        help="experiment yml, default ./sigopt_experiments/<algo>.yml")
+    parser.add_argument("--max-runtime", action="store", dest="max_runtime", type=float,
+                        default=study_util.MAX_RUNTIME,
+                        help="seconds before a running trial of a dead worker is reclaimed as failed")
+    parser.add_argument("--trials", action="store", dest="trials", type=int, default=None,
+                        help="trials for this worker, default until the study budget is used")
     parser.add_argument('--rand', dest="rand_tf", action='store_true')
 
     parser.add_argument('--diff', dest="diff", action='store_true')
     parser.add_argument('--homo', dest="homo", action='store_true')
     parser.add_argument('--homo1', dest="homo1", action='store_true')
+    parser.add_argument('--multi', dest="multi", action='store_true',
+                        help="fit HOMO, HOMO-1 and diff in one pass")
 
     results = parser.parse_args()
     des = results.desc
@@ -123,10 +165,14 @@ if __name__ == "__main__":
     grid_tf = results.grid_tf
     bayes_tf = results.bayes_tf
     sigopt_tf = results.sigopt
+    study_file = results.study_file
+    n_trials = results.trials
+    max_runtime = results.max_runtime
 
     diff_tf = results.diff
     homo_tf = results.homo
     homo1_tf = results.homo1
+    multi_tf = results.multi
 
     print("parser parsed")
     print("pulling directory: " + dir_temp + " with descriptor: " + des)
@@ -134,48 +180,87 @@ if __name__ == "__main__":
     if (homo1_tf == False and homo_tf == False):
         diff_tf = True
 
-    if (dir_temp == "DB3" or dir_temp == "DB2"):
-        try:
-            print("done processing dataframe")
-            str = "../data/desc/" + dir_temp + "/desc_calc_" + dir_temp + "_" + des + ".pkl"
-            print(str)
-            df = pd.read_pickle(str)
-            pkl = 1
-        except:
-            print("done processing dataframe")
-            str = "../data/desc/" + dir_temp + "/desc_calc_" + dir_temp + "_" + des + ".h5"
-            print(str)
-            df = pd.read_hdf(str)
-            pkl = 0
-    print(len(df))
-    print(df.head())
-    HOMO = df["HOMO"].to_numpy()
-    HOMO_1 = df["HOMO-1"].to_numpy()
-    diff = df["diff"].to_numpy()
-
-    if (des == "vae"):
-        temp = df["mat"].tolist()
-        mat = list([i.flatten() for i in temp])
-
-    elif (des == "auto"):
-        temp = df["mat"].tolist()
-        mat = list([i.flatten() for i in temp])
+    search_tf = rand_tf or grid_tf or bayes_tf or sigopt_tf
+    if (multi_tf == True and (search_tf or algo in TF_ALGOS)):
+        print("multi-target mode not available for this run, fitting targets one at a time")
+        multi_tf = False
+    if (multi_tf == True):
+        homo_tf, homo1_tf, diff_tf = False, False, False
+
+    store_prefix = desc_prefix(dir_temp, des)
+    store_tf = has_store(store_prefix)
+    if (store_tf == True):
+        # memory mapped store, bit fingerprints stay packed until scaled below
+        print(store_prefix)
+        df, mat = load_store(store_prefix)
+        HOMO = df["HOMO"].to_numpy()
+        HOMO_1 = df["HOMO-1"].to_numpy()
+        diff = df["diff"].to_numpy()
+
     else:
-        mat = df["mat"].to_numpy()
+        if (dir_temp == "DB3" or dir_temp == "DB2"):
+            try:
+                print("done processing dataframe")
+                str = store_prefix + ".pkl"
+                print(str)
+                df = pd.read_pickle(str)
+                pkl = 1
+            except:
+                print("done processing dataframe")
+                str = store_prefix + ".h5"
+                print(str)
+                df = pd.read_hdf(str)
+                pkl = 0
+        print(len(df))
+        print(df.head())
+        HOMO = df["HOMO"].to_numpy()
+        HOMO_1 = df["HOMO-1"].to_numpy()
+        diff = df["diff"].to_numpy()
+
+        if (des == "vae"):
+            temp = df["mat"].tolist()
+            mat = list([i.flatten() for i in temp])
+
+        elif (des == "auto"):
+            temp = df["mat"].tolist()
+            mat = list([i.flatten() for i in temp])
+        else:
+            mat = df["mat"].to_numpy()
+
+    # molecules attach_labels could not label carry NaN targets, drop them
+    labeled = ~(pd.isnull(HOMO) | pd.isnull(HOMO_1) | pd.isnull(diff))
+    if not labeled.all():
+        print("dropping " + str(np.sum(~labeled)) + " unlabeled molecules")
+        HOMO = HOMO[labeled].astype(float)
+        HOMO_1 = HOMO_1[labeled].astype(float)
+        diff = diff[labeled].astype(float)
+        if (isinstance(mat, PackedMatrix)):
+            mat = PackedMatrix(mat.packed[labeled], mat.n_bits)
+        elif (isinstance(mat, np.ndarray)):
+            mat = mat[labeled]
+        else:
+            mat = [i for i, keep in zip(mat, labeled) if keep]
 
     if (sigopt_tf == True):
-        sigopt.log_dataset(name = dir_temp + " " +des)
-        sigopt.log_model(type=algo)
-        sigopt.log_metadata('input_features', np.shape(mat[0]))
-    try:
-        mat = preprocessing.scale(np.array(mat))
-    except:
-        mat = list(mat)
-        mat = preprocessing.scale(np.array(mat))
+        study_util.log_dataset(name = dir_temp + " " +des)
+        study_util.log_model(type=algo)
+        study_util.log_metadata('input_features', np.shape(mat[0]))
+    if (store_tf == True):
+        # unpacked batch by batch into one float32 matrix
+        mat = scale_batched(mat)
+    else:
+        try:
+            mat = preprocessing.scale(np.array(mat))
+        except:
+            mat = list(mat)
+            mat = preprocessing.scale(np.array(mat))
 
     print("Using " + des + " as the descriptor")
     print("Matrix Dimensions: {0}".format(np.shape(mat)))
 
+    if (multi_tf == True):
+        reg_multi, scores_multi = calc_multi(mat, {"HOMO": HOMO, "HOMO-1": HOMO_1, "diff": diff}, algo)
+
     # finish optimization
     if(homo_tf == True):
         des = des + "_homo"
@@ -183,7 +268,7 @@ if __name__ == "__main__":
         scale_HOMO = (np.max(HOMO) - np.min(HOMO))
         HOMO = (HOMO - np.min(HOMO)) / scale_HOMO
         reg_HOMO = calc(mat, HOMO, des, scale_HOMO, rand_tf,
-                        grid_tf, bayes_tf, sigopt_tf, algo)
+                        grid_tf, bayes_tf, sigopt_tf, algo, study_file, n_trials, max_runtime)
 
     if(homo1_tf == True):
         des = des + "_homo_1"
@@ -192,7 +277,7 @@ if __name__ == "__main__":
         scale_HOMO_1 = (np.max(HOMO_1) - np.min(HOMO_1))
         HOMO_1 = (HOMO_1 - np.min(HOMO_1)) / scale_HOMO_1
         reg_HOMO = calc(mat, HOMO_1, des, scale_HOMO_1,rand_tf,
-                        grid_tf, bayes_tf, sigopt_tf, algo)
+                        grid_tf, bayes_tf, sigopt_tf, algo, study_file, n_trials, max_runtime)
 
     if(diff_tf == True):
         des = des + "_diff"
@@ -202,6 +287,6 @@ if __name__ == "__main__":
         scale_diff = (np.max(diff) - np.min(diff))
         diff = (diff - np.min(diff)) / scale_diff
         reg_diff = calc(mat, diff, des, scale_diff, rand_tf,
-                        grid_tf, bayes_tf, sigopt_tf, algo)
+                        grid_tf, bayes_tf, sigopt_tf, algo, study_file, n_trials, max_runtime)
 
 
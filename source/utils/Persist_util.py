@@ -1,52 +1,167 @@
+import os
 import sys
+import math
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from Element_PI import VariancePersistv1
+from geometry_util import read_xyz_batch
 from helpers import merge_dir_and_data
+from label_util import label_columns
+from cache_util import DescriptorCache, COMMIT_EVERY
+from store_util import BlockWriter
 
 
-def persistent(dir="../data/xyz/", pixelsx=50, pixelsy=50, spread=0.28, Max=2.5):
+def persistent(dir="../data/xyz/", pixelsx=50, pixelsy=50, spread=0.28, Max=2.5, cache=True,
+               maxdim=1, thresh=np.inf):
+    # maxdim=0 drops H1, a finite thresh truncates the filtration for H1
 
     persist = []
     names = []
-    homo = []
-    homo1 = []
-    diff = []
 
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
+    dir_fl_names, labels = merge_dir_and_data(dir = dir)
     print(len(dir_fl_names))
-    print(len(list_to_sort))
+
+    # only new or changed geometries get recomputed
+    hits = {}
+    digests = {}
+    misses = [dir + str(i) for i in dir_fl_names]
+    if (cache == True):
+        des_cache = DescriptorCache("persist", {"pixelsx": pixelsx, "pixelsy": pixelsy,
+                                                "spread": spread, "Max": Max,
+                                                "maxdim": maxdim, "thresh": thresh})
+        hits, misses, digests = des_cache.lookup(misses)
+        print("cached: " + str(len(hits)) + " to compute: " + str(len(misses)))
+
+    # every remaining geometry parsed once into ragged arrays
+    read_names, symbols, coords, offsets = read_xyz_batch(misses)
+    geometries = {}
+    for ind, path in enumerate(read_names):
+        geometries[path] = (symbols[offsets[ind]:offsets[ind + 1]], coords[offsets[ind]:offsets[ind + 1]])
 
     #---------------------------------------------------------------------------
+    new_rows = 0
     for tmp, item in enumerate(dir_fl_names):
         temp = dir + str(item)
         try:
-
-            temp_persist = VariancePersistv1(
-                temp.format(temp + str(1)),
-                pixelx=pixelsx, pixely=pixelsy,
-                myspread=spread, myspecs={"maxBD": Max, "minBD": -.10}, showplot=False)
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                persist.append(temp_persist)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
+            if (temp in hits):
+                temp_persist = hits[temp]
             else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        persist.append(temp_persist)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    print(list_to_sort[tmp].split(":")[0], item[0:-4])
-                    pass
+                temp_persist = VariancePersistv1(
+                    temp, pixelx=pixelsx, pixely=pixelsy,
+                    myspread=spread, myspecs={"maxBD": Max, "minBD": -.10}, showplot=False,
+                    geometry=geometries[temp], maxdim=maxdim, thresh=thresh)
+                if (cache == True):
+                    des_cache.put(temp, temp_persist, digests.get(temp))
+                    new_rows += 1
+                    if (new_rows % COMMIT_EVERY == 0):
+                        des_cache.commit()
+            persist.append(temp_persist)
+            names.append(item)
             sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
             sys.stdout.flush()
         except:
             pass
+    if (cache == True):
+        des_cache.close()
+    homo, homo1, diff = label_columns(names, labels)
     return names, persist, homo, homo1, diff
+
+
+def _persist_chunk(paths, params):
+    # worker: one row per path, zeros plus ok=False where the image failed
+    width = params["pixelsx"] * params["pixelsy"]
+    rows = np.zeros((len(paths), width), dtype=np.float32)
+    ok = np.zeros((len(paths),), dtype=bool)
+    read_names, symbols, coords, offsets = read_xyz_batch(paths)
+    geometries = {}
+    for ind, path in enumerate(read_names):
+        geometries[path] = (symbols[offsets[ind]:offsets[ind + 1]], coords[offsets[ind]:offsets[ind + 1]])
+
+    for ind, path in enumerate(paths):
+        try:
+            rows[ind] = VariancePersistv1(
+                path, pixelx=params["pixelsx"], pixely=params["pixelsy"],
+                myspread=params["spread"], myspecs={"maxBD": params["Max"], "minBD": -.10}, showplot=False,
+                geometry=geometries[path], maxdim=params["maxdim"], thresh=params["thresh"])
+            ok[ind] = True
+        except:
+            pass
+    return rows, ok
+
+def _submit_block(executor, writer, des_cache, i, dir, params, chunk_size):
+    # cached rows are filled in here, only the misses go to the pool
+    paths = [dir + str(j) for j in writer.block(i)]
+    rows = np.zeros((len(paths), params["pixelsx"] * params["pixelsy"]), dtype=np.float32)
+    ok = np.zeros((len(paths),), dtype=bool)
+    digests = {}
+    misses = paths
+    if des_cache is not None:
+        hits, misses, digests = des_cache.lookup(paths)
+        for ind, path in enumerate(paths):
+            if path in hits:
+                rows[ind] = hits[path]
+                ok[ind] = True
+    chunks = [misses[j:j + chunk_size] for j in range(0, len(misses), chunk_size)]
+    futures = [executor.submit(_persist_chunk, chunk, params) for chunk in chunks]
+    return i, paths, rows, ok, digests, chunks, futures
+
+def persistent_stream(prefix, dir="../data/xyz/", pixelsx=50, pixelsy=50, spread=0.28, Max=2.5,
+                      maxdim=1, thresh=np.inf, n_jobs=None, block_size=2048, chunk_size=None,
+                      cache=True):
+    """Persistence images straight into a dense store at ``prefix``.
+
+    Blocks of ``block_size`` molecules are looked up in the DescriptorCache
+    and the misses are split into chunks for a process pool (by default
+    about four per worker and block). The next block is submitted before
+    the current one is written, so the pool does not drain at block
+    boundaries, and each finished block goes to the memory mapped float32
+    store and the cache. Rerunning after a crash skips the blocks already
+    on disk, and with a changed file list recomputes only molecules that
+    are not cached.
+    Output: names kept, in directory order.
+    """
+    dir_fl_names, labels = merge_dir_and_data(dir = dir)
+    params = {"pixelsx": pixelsx, "pixelsy": pixelsy, "spread": spread, "Max": Max,
+              "maxdim": maxdim, "thresh": thresh}
+    writer = BlockWriter(prefix, dir_fl_names, pixelsx * pixelsy, block_size=block_size,
+                         params=dict(params, dir=dir, thresh=str(thresh)))
+    todo = writer.todo()
+    print(str(len(dir_fl_names)) + " files, " + str(writer.n_blocks - len(todo)) + " / " +
+          str(writer.n_blocks) + " blocks already stored")
+
+    if chunk_size is None:
+        n_workers = n_jobs if n_jobs is not None else (os.cpu_count() or 1)
+        chunk_size = max(1, int(math.ceil(block_size / float(4 * n_workers))))
+    des_cache = None
+    if (cache == True):
+        des_cache = DescriptorCache("persist", params)
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+        todo = deque(todo)
+        while len(todo) > 0 or len(pending) > 0:
+            # keep one block queued behind the one being collected
+            while len(todo) > 0 and len(pending) < 2:
+                pending.append(_submit_block(executor, writer, des_cache, todo.popleft(), dir, params,
+                                             chunk_size))
+            i, paths, rows, ok, digests, chunks, futures = pending.popleft()
+            pos = dict((path, ind) for ind, path in enumerate(paths))
+            for chunk, future in zip(chunks, futures):
+                chunk_rows, chunk_ok = future.result()
+                for path, row, good in zip(chunk, chunk_rows, chunk_ok):
+                    if (good == True):
+                        rows[pos[path]] = row
+                        ok[pos[path]] = True
+                        if des_cache is not None:
+                            des_cache.put(path, row, digests.get(path))
+            writer.write(i, rows, ok)
+            if des_cache is not None:
+                des_cache.commit()
+            sys.stdout.write("\r block %s /" % (i + 1) + str(writer.n_blocks))
+            sys.stdout.flush()
+    print("")
+    if des_cache is not None:
+        des_cache.close()
+
+    return writer.finish(lambda names: label_columns(names, labels))
@@ -0,0 +1,78 @@
+import os
+import json
+import sqlite3
+import hashlib
+import numpy as np
+
+CACHE_DIR = "../data/desc/cache/"
+# serial builders commit every COMMIT_EVERY molecules, so a killed run keeps its rows
+COMMIT_EVERY = 256
+
+def file_digest(path):
+    """sha1 of the file contents, shared by every cache the file is looked up in."""
+    sha = hashlib.sha1()
+    with open(path, "rb") as fp:
+        sha.update(fp.read())
+    return sha.hexdigest()
+
+class DescriptorCache(object):
+    """Per-molecule descriptor cache on disk.
+
+    Rows are keyed on a sha1 of the xyz/sdf file contents plus the
+    descriptor parameters (bit_length, pixelsx, spread, ...), so a renamed
+    file still hits and a changed geometry or parameter set misses.
+    One sqlite file per descriptor in ``cache_dir``.
+    """
+    def __init__(self, des, params=None, cache_dir=CACHE_DIR):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.des = des
+        self.params = json.dumps(params if params is not None else {}, sort_keys=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "cache_" + des + ".sqlite"))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS descriptors "
+                          "(key TEXT PRIMARY KEY, dtype TEXT, shape TEXT, data BLOB)")
+
+    def key(self, path, digest=None):
+        # digest: file_digest(path) when the caller already hashed the file
+        if digest is None:
+            digest = file_digest(path)
+        return hashlib.sha1((digest + self.params).encode()).hexdigest()
+
+    def get(self, path, digest=None):
+        row = self.conn.execute("SELECT dtype, shape, data FROM descriptors WHERE key = ?",
+                                (self.key(path, digest),)).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[2], dtype=row[0]).reshape(json.loads(row[1]))
+
+    def lookup(self, paths):
+        """Split paths into cached rows (dict path -> array) and misses.
+
+        Each file is read and hashed once, the digests (dict path -> digest)
+        are returned as well so ``put`` does not hash the misses again.
+        """
+        hits = {}
+        misses = []
+        digests = {}
+        for path in paths:
+            try:
+                digests[path] = file_digest(path)
+                arr = self.get(path, digests[path])
+            except OSError:
+                arr = None
+            if arr is None:
+                misses.append(path)
+            else:
+                hits[path] = arr
+        return hits, misses, digests
+
+    def put(self, path, arr, digest=None):
+        arr = np.ascontiguousarray(arr)
+        self.conn.execute("INSERT OR REPLACE INTO descriptors VALUES (?, ?, ?, ?)",
+                          (self.key(path, digest), arr.dtype.str, json.dumps(list(arr.shape)), arr.tobytes()))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,69 @@
+# descalc --des name -> how to compute it
+#   input:   "sdf" or "xyz", picks ../data/<input>/<dir>/
+#   dtype:   "bits" (packed store), "float32" (dense store) or "str" (pkl/h5 only)
+#   width:   columns per molecule, None when it depends on the data
+#   spec:    fingerprint spec for descriptors that can run fused
+#   stream:  compute writes its own store instead of returning a matrix
+#   compute: fn(dir, n_jobs=None) -> names, mat, homo, homo1, diff, or for
+#            stream descriptors fn(dir, n_jobs=None, prefix=...) -> names
+# backends are imported inside compute, so listing or picking a cheap
+# descriptor never pulls in rdkit, keras, molSimplify or ripser
+
+from source.utils.fingerprint_specs import MORGAN, RDKIT, AVAL, LAYER
+
+DESCRIPTORS = {}
+
+def register(name, input, dtype, width=None, spec=None, stream=False):
+    """Decorator adding a compute function to DESCRIPTORS under ``name``."""
+    def wrap(fn):
+        DESCRIPTORS[name] = {"name": name, "input": input, "dtype": dtype, "width": width,
+                             "spec": spec, "stream": stream, "compute": fn}
+        return fn
+    return wrap
+
+def get_descriptor(name):
+    if name not in DESCRIPTORS:
+        raise ValueError("unknown descriptor " + str(name) + ", choose from: " +
+                         ", ".join(sorted(DESCRIPTORS.keys())))
+    return DESCRIPTORS[name]
+
+def input_dir(name, dir_temp):
+    return "../data/" + get_descriptor(name)["input"] + "/" + dir_temp + "/"
+
+def _fingerprint(spec):
+    def compute(dir, n_jobs=None):
+        from source.utils.fingerprint_util import fingerprint_dir
+        from source.utils.label_util import label_columns
+        names, mats, labels = fingerprint_dir(dir, {"fp": spec}, n_jobs=n_jobs)
+        homo, homo1, diff = label_columns(names, labels)
+        return names, mats["fp"], homo, homo1, diff
+    return compute
+
+for _name, _spec in [("morg", MORGAN), ("rdkit", RDKIT), ("aval", AVAL), ("layer", LAYER)]:
+    register(_name, "sdf", "bits", _spec.get("nBits", _spec.get("fpSize")), spec=_spec)(_fingerprint(_spec))
+
+@register("vae", "xyz", "float32")
+def _vae(dir, n_jobs=None):
+    from source.utils.vae_util import vae
+    return vae(dir, n_jobs=n_jobs)
+
+@register("self", "xyz", "str")
+def _selfies(dir, n_jobs=None):
+    from source.utils.selfies_util import selfies
+    return selfies(dir, n_jobs=n_jobs)
+
+@register("auto", "xyz", "float32")
+def _autocorr(dir, n_jobs=None):
+    from molsimplify_util import full_autocorr
+    return full_autocorr(dir)
+
+#requires a metal in the compound for this desc
+@register("delta", "xyz", "float32")
+def _deltametrics(dir, n_jobs=None):
+    from molsimplify_util import metal_deltametrics
+    return metal_deltametrics(dir)
+
+@register("persist", "xyz", "float32", 2500, stream=True)
+def _persist(dir, n_jobs=None, prefix=None):
+    from source.utils.Persist_util import persistent_stream
+    return persistent_stream(prefix, dir, n_jobs=n_jobs)
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import numpy as np
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
+
+import pybel
+
+# seconds, upper edges of the latency histogram buckets
+LATENCY_BINS = [0.5, 1, 2, 5, 10, 30, 60, 120, np.inf]
+
+def read_smiles(file_name):
+    """(name, smiles) pairs from a .smi file, one molecule per line.
+
+    A second column is taken as the name, otherwise <file stem>_<line>.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    items = []
+    with open(file_name) as fp:
+        for ind, line in enumerate(fp):
+            fields = line.split()
+            if (len(fields) == 0):
+                continue
+            name = fields[1] if len(fields) > 1 else stem + "_" + str(ind)
+            items.append((name, fields[0]))
+    return items
+
+def _embed_one(name, smi, forcefield, steps, fmt):
+    # 3D build plus a short force field relaxation, same recipe as the old smiles_to_xyz
+    try:
+        mol = pybel.readstring("smi", smi)
+        mol.title = name
+        mol.make3D(forcefield=forcefield, steps=steps)
+        mol.localopt(forcefield=forcefield)
+        return mol.write(fmt), None
+    except Exception as e:
+        return None, " ".join(str(e).split()) or type(e).__name__
+
+def _embed_worker(conn, forcefield, steps, fmt):
+    # one molecule at a time over a private pipe, so a worker that hangs
+    # can be killed without taking a shared queue down with it
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        conn.send(_embed_one(task[0], task[1], forcefield, steps, fmt))
+
+def print_latency(latency, seconds):
+    counts, _ = np.histogram(latency, bins=[0] + LATENCY_BINS)
+    print("embedded " + str(len(latency)) + " in {0:.1f}s, {1:.2f} mol/s".format(
+        seconds, len(latency) / max(seconds, 1e-9)))
+    lower = 0
+    for upper, count in zip(LATENCY_BINS, counts):
+        print("  {0:>5} - {1:<5}s {2}".format(lower, upper, count))
+        lower = upper
+
+def embed_smiles(items, out, fmt="xyz", forcefield="mmff94", steps=10, timeout=60, n_jobs=None):
+    """3D geometries for many smiles, written to one multi-frame file.
+
+    Input: list of (name, smiles), output file, "xyz" or "sdf", Open Babel
+    force field and build steps, seconds allowed per molecule, number of
+    workers (None uses every core).
+    Output: report dict with ``written``, ``failed`` (list of (name,
+    error)), ``latency`` (seconds per finished molecule) and ``seconds``.
+    Frames are written in input order as soon as they are contiguous; a
+    worker past ``timeout`` is killed and replaced.
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count()
+    t_start = time.time()
+    workers = {}
+
+    def start_worker():
+        parent, child = Pipe()
+        proc = Process(target=_embed_worker, args=(child, forcefield, steps, fmt))
+        proc.daemon = True
+        proc.start()
+        # process, task index (None when idle), start time
+        workers[parent] = [proc, None, 0.0]
+
+    def stop_worker(conn):
+        workers[conn][0].terminate()
+        workers[conn][0].join()
+        conn.close()
+        del workers[conn]
+
+    for i in range(min(n_jobs, len(items))):
+        start_worker()
+
+    results = {}
+    report = {"written": 0, "failed": [], "latency": [], "seconds": 0.0}
+    next_task = 0
+    next_write = 0
+    with open(out, "w") as fp:
+        while next_write < len(items):
+            for conn, state in workers.items():
+                if state[1] is None and next_task < len(items):
+                    conn.send(items[next_task])
+                    state[1] = next_task
+                    state[2] = time.time()
+                    next_task += 1
+
+            for conn in wait(list(workers.keys()), timeout=1.0):
+                state = workers[conn]
+                try:
+                    results[state[1]] = conn.recv() + (time.time() - state[2],)
+                    state[1] = None
+                except EOFError:
+                    results[state[1]] = (None, "worker died", time.time() - state[2])
+                    stop_worker(conn)
+                    start_worker()
+
+            now = time.time()
+            for conn, state in list(workers.items()):
+                if state[1] is not None and now - state[2] > timeout:
+                    results[state[1]] = (None, "timeout", now - state[2])
+                    stop_worker(conn)
+                    start_worker()
+
+            # keep the output in input order
+            written = next_write
+            while next_write in results:
+                block, error, latency = results.pop(next_write)
+                if block is None:
+                    report["failed"].append((items[next_write][0], error))
+                else:
+                    fp.write(block)
+                    report["written"] += 1
+                    report["latency"].append(latency)
+                next_write += 1
+            if (next_write != written):
+                sys.stdout.write("\r %s / " % next_write + str(len(items)))
+                sys.stdout.flush()
+    print("")
+
+    for conn in list(workers.keys()):
+        conn.send(None)
+        workers[conn][0].join()
+        conn.close()
+
+    report["seconds"] = time.time() - t_start
+    report["latency"] = np.array(report["latency"])
+    print_latency(report["latency"], report["seconds"])
+    print("failed: " + str(len(report["failed"])))
+    return report
@@ -0,0 +1,8 @@
+# fingerprint specs, one dict per descriptor family
+# morgan: radius, nBits | morgan_count: radius, nBits (hashed counts, clipped to 255)
+# rdkit: maxPath, fpSize | aval: nBits | layer: fpSize
+# kept free of imports so the descriptor registry can list them without rdkit
+MORGAN = {"type": "morgan", "radius": 2, "nBits": 1024}
+RDKIT = {"type": "rdkit", "maxPath": 2, "fpSize": 2048}
+AVAL = {"type": "aval", "nBits": 256}
+LAYER = {"type": "layer", "fpSize": 2048}
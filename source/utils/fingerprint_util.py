@@ -0,0 +1,243 @@
+import os
+import sys
+import numpy as np
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+from rdkit.Avalon import pyAvalonTools
+from rdkit.Chem import AllChem, DataStructs
+from rdkit.Chem import SDMolSupplier
+from source.utils.cache_util import DescriptorCache, file_digest
+from source.utils.sdf_util import iter_sdf, is_shard
+from source.utils.label_util import DATA_DB3, read_labels, join_labels, print_report, file_stem
+from source.utils.manifest_util import list_dir
+from source.utils.fingerprint_specs import MORGAN, RDKIT, AVAL, LAYER
+
+def mol_fingerprint(mol, spec):
+    """Fingerprint a single rdkit Mol as a dense uint8 row."""
+    fp_type = spec["type"]
+    if (fp_type == "morgan"):
+        fp = AllChem.GetMorganFingerprintAsBitVect(mol, int(spec.get("radius", 2)),
+                                                   nBits=int(spec.get("nBits", 1024)))
+    elif (fp_type == "morgan_count"):
+        fp = AllChem.GetHashedMorganFingerprint(mol, int(spec.get("radius", 2)),
+                                                nBits=int(spec.get("nBits", 1024)))
+        arr = np.zeros((fp.GetLength(),), dtype=np.int32)
+        DataStructs.ConvertToNumpyArray(fp, arr)
+        return np.clip(arr, 0, 255).astype(np.uint8)
+    elif (fp_type == "rdkit"):
+        fp = AllChem.RDKFingerprint(mol, maxPath=int(spec.get("maxPath", 2)),
+                                    fpSize=int(spec.get("fpSize", 2048)))
+    elif (fp_type == "aval"):
+        fp = pyAvalonTools.GetAvalonFP(mol, int(spec.get("nBits", 256)))
+    elif (fp_type == "layer"):
+        fp = AllChem.LayeredFingerprint(mol, fpSize=int(spec.get("fpSize", 2048)))
+    else:
+        raise ValueError("unknown fingerprint type: " + str(fp_type))
+
+    arr = np.zeros((fp.GetNumBits(),), dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(fp, arr)
+    return arr
+
+def _fingerprint_chunk(paths, specs):
+    # worker: one sdf per path, parsed once for every spec;
+    # a molecule that fails any spec comes back as None
+    ret = []
+    for path in paths:
+        try:
+            mol = SDMolSupplier(path)[0]
+            ret.append([mol_fingerprint(mol, spec) for spec in specs])
+        except:
+            ret.append(None)
+    return ret
+
+def _fingerprint_shard(path, specs):
+    # worker: every record of one shard, streamed, as (names, one uint8 matrix per spec)
+    names = []
+    rows = [[] for i in specs]
+    for name, mol in iter_sdf([path]):
+        try:
+            fps = [mol_fingerprint(mol, spec) for spec in specs]
+        except:
+            continue
+        names.append(name)
+        for ind, row in enumerate(fps):
+            rows[ind].append(row)
+    return names, [np.vstack(i) if len(i) > 0 else None for i in rows]
+
+def fingerprint_shards(paths, specs, n_jobs=None, packed=False, cache=False):
+    """fingerprint_matrices for multi-record shards, one task per shard.
+
+    With ``cache`` the record names and matrices of each shard are kept in
+    a DescriptorCache keyed on the shard contents, so only new or changed
+    shards are parsed again.
+    Output: record names in shard order and a dict of name -> (N, nBits)
+    uint8 matrix, bit packed along axis 1 when ``packed``.
+    """
+    keys = list(specs.keys())
+    spec_list = [specs[i] for i in keys]
+    results = {}
+
+    todo = paths
+    digests = {}
+    if (cache == True):
+        # a record failing any spec is dropped, so rows depend on the whole spec list
+        name_cache = DescriptorCache("fp_shard_names", {"specs": spec_list})
+        caches = [DescriptorCache("fp_shard_" + spec["type"], {"spec": spec, "specs": spec_list})
+                  for spec in spec_list]
+        for path in paths:
+            try:
+                digests[path] = file_digest(path)
+            except OSError:
+                continue
+            shard_names = name_cache.get(path, digests[path])
+            mats = [i.get(path, digests[path]) for i in caches]
+            if shard_names is not None and all(i is not None for i in mats):
+                results[path] = (shard_names.tolist(), mats)
+        todo = [i for i in paths if i not in results]
+        print("cached: " + str(len(results)) + " shards to compute: " + str(len(todo)))
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for done, (path, ret) in enumerate(zip(todo, executor.map(_fingerprint_shard, todo, repeat(spec_list)))):
+            results[path] = ret
+            shard_names, mats = ret
+            if (cache == True and len(shard_names) > 0):
+                name_cache.put(path, np.array(shard_names, dtype=str), digests.get(path))
+                for des_cache, mat in zip(caches, mats):
+                    des_cache.put(path, mat, digests.get(path))
+                    des_cache.commit()
+                name_cache.commit()
+            sys.stdout.write("\r %s /" % (done + 1) + str(len(todo)) + " shards")
+            sys.stdout.flush()
+    print("")
+    if (cache == True):
+        name_cache.close()
+        for des_cache in caches:
+            des_cache.close()
+
+    names = []
+    blocks = [[] for i in keys]
+    for path in paths:
+        shard_names, mats = results.get(path, ([], None))
+        if (len(shard_names) > 0):
+            names.extend(shard_names)
+            for ind, mat in enumerate(mats):
+                blocks[ind].append(mat)
+
+    mats = {}
+    for key, key_blocks in zip(keys, blocks):
+        if (len(key_blocks) == 0):
+            mat = np.zeros((0, 0), dtype=np.uint8)
+        else:
+            mat = np.vstack(key_blocks)
+        if (packed == True):
+            mat = np.packbits(mat, axis=1)
+        mats[key] = mat
+    return names, mats
+
+def fingerprint_matrices(paths, specs, n_jobs=None, chunk_size=256, packed=False, cache=False):
+    """Fingerprint a list of sdf files for several specs in a single pass.
+
+    Input: sdf paths, dict of name -> fingerprint spec (see MORGAN, RDKIT, AVAL, LAYER),
+    number of workers (None uses every core), files per task, whether to
+    reuse/extend the per-molecule DescriptorCache.
+    Output: file names that parsed, in input order, and a dict of
+    name -> (N, nBits) uint8 matrix, bit packed along axis 1 when ``packed``.
+    Every matrix has one row per returned name.
+    """
+    keys = list(specs.keys())
+    spec_list = [specs[i] for i in keys]
+    results = {}
+
+    todo = paths
+    if (cache == True):
+        caches = [DescriptorCache("fp_" + spec["type"], spec) for spec in spec_list]
+        # a molecule is only skipped when every family is cached
+        digests = {}
+        for path in paths:
+            try:
+                digests[path] = file_digest(path)
+            except OSError:
+                continue
+            fps = [i.get(path, digests[path]) for i in caches]
+            if all(i is not None for i in fps):
+                results[path] = fps
+        todo = [i for i in paths if i not in results]
+        print("cached: " + str(len(results)) + " to compute: " + str(len(todo)))
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for chunk, ret in zip(chunks, executor.map(_fingerprint_chunk, chunks, repeat(spec_list))):
+            for path, fps in zip(chunk, ret):
+                if fps is not None:
+                    results[path] = fps
+                    if (cache == True):
+                        for des_cache, row in zip(caches, fps):
+                            des_cache.put(path, row, digests.get(path))
+            if (cache == True):
+                for des_cache in caches:
+                    des_cache.commit()
+            done += len(chunk)
+            sys.stdout.write("\r %s /" % done + str(len(todo)))
+            sys.stdout.flush()
+    print("")
+    if (cache == True):
+        for des_cache in caches:
+            des_cache.close()
+
+    names = []
+    rows = [[] for i in keys]
+    for path in paths:
+        if path in results:
+            names.append(os.path.basename(path))
+            for ind, row in enumerate(results[path]):
+                rows[ind].append(row)
+
+    mats = {}
+    for key, key_rows in zip(keys, rows):
+        if (len(key_rows) == 0):
+            mat = np.zeros((0, 0), dtype=np.uint8)
+        else:
+            mat = np.vstack(key_rows)
+        if (packed == True):
+            mat = np.packbits(mat, axis=1)
+        mats[key] = mat
+    return names, mats
+
+def fingerprint_matrix(paths, spec, n_jobs=None, chunk_size=256, packed=False, cache=False):
+    """Fingerprint a list of sdf files across a process pool.
+
+    Input: sdf paths, fingerprint spec (see MORGAN, RDKIT, AVAL, LAYER),
+    number of workers (None uses every core), files per task, whether to
+    use the DescriptorCache.
+    Output: file names that parsed, in input order, and a (N, nBits) uint8
+    matrix, bit packed along axis 1 when ``packed``.
+    """
+    names, mats = fingerprint_matrices(paths, {"fp": spec}, n_jobs=n_jobs,
+                                       chunk_size=chunk_size, packed=packed, cache=cache)
+    return names, mats["fp"]
+
+def fingerprint_dir(dir, specs, n_jobs=None, cache=True, data_file=DATA_DB3):
+    """Labeled fingerprints for a folder of sdf files or packed shards.
+
+    Input: sdf directory, either one molecule per file or shards
+    (<set>_0000.sdf[.gz], see sdf_util.pack_sdf_dir), dict of name -> spec.
+    Output: names that have labels, dict of name -> matrix, label frame.
+    """
+    labels = read_labels(data_file)
+    files = list_dir(dir)
+    shards = [i for i in files if is_shard(i)]
+    if (len(shards) > 0):
+        # molecule names only exist inside the shards, join labels afterwards
+        print("shards to process: " + str(len(shards)))
+        names, mats = fingerprint_shards([dir + i for i in shards], specs, n_jobs=n_jobs, cache=cache)
+        keep = np.array([file_stem(i) in labels.index for i in names], dtype=bool)
+        names, _, report = join_labels(names, labels)
+        mats = dict((key, mat[keep]) for key, mat in mats.items())
+    else:
+        files, _, report = join_labels(files, labels)
+        print("files to process: " + str(len(files)))
+        names, mats = fingerprint_matrices([dir + i for i in files], specs, n_jobs=n_jobs, cache=cache)
+    print_report(report)
+    return names, mats, labels
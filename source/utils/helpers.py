@@ -1,299 +1,114 @@
 import os
 import sys
-import time
 import pandas as pd
 import numpy as np
 import pybel
 
-from rdkit.Avalon import pyAvalonTools
-from rdkit.Chem import AllChem
-from rdkit.Chem import SDMolSupplier
-
-def merge_dir_and_data(dir = "DB3"):
+from source.utils.label_util import DATA_DB3, read_labels, join_labels, label_columns, print_report, \
+    attach_labels
+from source.utils.fingerprint_util import fingerprint_dir
+from source.utils.store_util import has_store, read_index, write_index, desc_prefix
+from source.utils.smiles_util import xyz_strings
+from source.utils.sdf_util import xyz_to_sdf_batch, pack_sdf_dir
+from source.utils.embed_util import read_smiles, embed_smiles
+from source.utils.manifest_util import list_dir
+
+# Input: directory of xyz/sdf files, label file with ---- <segment> ---- headers
+# Output: files that have labels and the label rows aligned with them
+def merge_dir_and_data(dir = "DB3", data_file = DATA_DB3):
     # all files in the directory
-    ls_dir = "ls " + str(dir) + " | sort"
-    dir_fl_names = os.popen(ls_dir).read()
-    dir_fl_names = str(dir_fl_names).split()
-    dir_fl_names.sort()
+    dir_fl_names = list_dir(dir)
 
-    # all energies in the database
-    list_to_sort = []
-    remove_ind = []
-    added_seg = "BQ"
-    with open("../data/DATA_DB3") as fp:
-        line = fp.readline()
-        while line:
-            if(line.split()[0] == "----"):
-                added_seg = line.split()[1]
-            else:
-                list_to_sort.append(added_seg + "_" + line[0:-2])
-            line = fp.readline()
-
-    list_to_sort.sort()
-    only_names=[i[0:-2].split(":")[0] for i in list_to_sort]
-
-    # find the values which are in the dir and database
-    files_relevant = []
-    for i, file_name in enumerate(dir_fl_names):
-        try:
-            ind_find = only_names.index(file_name[0:-4])
-            sys.stdout.write("\r %s /" % i + str(len(dir_fl_names)))
-            sys.stdout.flush()
-            files_relevant.append(file_name)
-        except:
-            ind_empty = dir_fl_names.index(file_name)
-            remove_ind.append(ind_empty)
-            pass
-
-    remove_ind.reverse()
-    [dir_fl_names.pop(i) for i in remove_ind]
-    remove_ind_2 = []
-
-    for ind, files in enumerate(only_names):
-        try:
-            try:
-                ind_find = dir_fl_names.index(files+".sdf")
-            except:
-                ind_find = dir_fl_names.index(files + ".xyz")
-            sys.stdout.write("\r %s /" % ind + str(len(only_names)))
-            sys.stdout.flush()
-        except:
-            ind_empty = only_names.index(files)
-            remove_ind_2.append(ind_empty)
-            pass
-
-    remove_ind_2.reverse()
-    [only_names.pop(i) for i in remove_ind_2]
-    [list_to_sort.pop(i) for i in remove_ind_2]
-    # go back and remove files in directory that we don't have energies
-    return dir_fl_names, list_to_sort
-
-def morgan(bit_length=256, dir="../data/sdf/DB3/", bit=True):
-
-    morgan = []
-    morgan_bit = []
-    names = []
-    homo = []
-    homo1 = []
-    diff = []
+    # all energies in the database, keyed by <segment>_<smiles>
+    labels = read_labels(data_file)
+    dir_fl_names, labels, report = join_labels(dir_fl_names, labels)
+    print_report(report)
+    return dir_fl_names, labels
+
+def morgan(bit_length=256, dir="../data/sdf/DB3/", bit=True, n_jobs=None, cache=True):
 
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
-    print("files to process: " + str(len(dir_fl_names)))
     #---------------------------------------------------------------------------
-    for tmp, item in enumerate(dir_fl_names):
-        try:
-            suppl = SDMolSupplier(dir + item)
-
-            if (bit == True):
-                try:
-                    fp_bit = AllChem.GetMorganFingerprintAsBitVect(suppl[0], int(2), nBits=int(bit_length))
-                    morgan.append(fp_bit)
-                except:
-                    print("error")
-                    pass
-            else:
-                try:
-                    fp = AllChem.GetMorganFingerprint(suppl[0], int(2))
-                    morgan.append(fp)
-                except:
-                    print("error")
-                    pass
-
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
-            else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        morgan.append(fp)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    print(list_to_sort[tmp].split(":")[0], item[0:-4])
-                    pass
-            sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
-            sys.stdout.flush()
-        except:
-            pass
-    morgan = np.array(morgan)
-    return names, morgan, homo, homo1, diff
-
-def rdk(dir="../data/sdf/DB/"):
-
-    rdk = []
-    names = []
-    homo = []
-    homo1 = []
-    diff = []
+    if (bit == True):
+        spec = {"type": "morgan", "radius": 2, "nBits": int(bit_length)}
+    else:
+        spec = {"type": "morgan_count", "radius": 2, "nBits": int(bit_length)}
+    names, mats, labels = fingerprint_dir(dir, {"fp": spec}, n_jobs=n_jobs, cache=cache)
+    homo, homo1, diff = label_columns(names, labels)
+    return names, mats["fp"], homo, homo1, diff
+
+def rdk(dir="../data/sdf/DB/", n_jobs=None, cache=True):
 
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
     #---------------------------------------------------------------------------
-    for tmp, item in enumerate(dir_fl_names):
-        try:
-            suppl = SDMolSupplier(dir + item)
-            fp_rdk = AllChem.RDKFingerprint(suppl[0], maxPath=2)
-
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                rdk.append(fp_rdk)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
-            else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        rdk.append(fp_rdk)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    print(list_to_sort[tmp].split(":")[0], item[0:-4])
-                    pass
-            sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
-            sys.stdout.flush()
-        except:
-            pass
-    rdk = np.array(rdk)
-    return names, rdk, homo, homo1, diff
-
-def aval(dir="../data/sdf/DB/", bit_length=256):
-    aval = []
-    names = []
-    homo = []
-    homo1 = []
-    diff = []
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
+    spec = {"type": "rdkit", "maxPath": 2}
+    names, mats, labels = fingerprint_dir(dir, {"fp": spec}, n_jobs=n_jobs, cache=cache)
+    homo, homo1, diff = label_columns(names, labels)
+    return names, mats["fp"], homo, homo1, diff
+
+def aval(dir="../data/sdf/DB/", bit_length=256, n_jobs=None, cache=True):
+
     #---------------------------------------------------------------------------
-    for tmp, item in enumerate(dir_fl_names):
-        try:
-            suppl = SDMolSupplier(dir + item)
-            fp_aval = pyAvalonTools.GetAvalonFP(suppl[0], bit_length)
-
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                aval.append(fp_aval)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
-            else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        aval.append(fp_aval)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    print(list_to_sort[tmp].split(":")[0], item[0:-4])
-                    pass
-            sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
-            sys.stdout.flush()
-        except:
-            pass
-    aval = np.array(layer)
-    return names, aval, homo, homo1, diff
-
-def layer(dir="../data/sdf/DB/"):
-
-    layer = []
-    names = []
-    homo = []
-    homo1 = []
-    diff = []
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir = dir)
+    spec = {"type": "aval", "nBits": int(bit_length)}
+    names, mats, labels = fingerprint_dir(dir, {"fp": spec}, n_jobs=n_jobs, cache=cache)
+    homo, homo1, diff = label_columns(names, labels)
+    return names, mats["fp"], homo, homo1, diff
+
+def layer(dir="../data/sdf/DB/", n_jobs=None, cache=True):
+
     #---------------------------------------------------------------------------
-    for tmp, item in enumerate(dir_fl_names):
-        try:
-            suppl = SDMolSupplier(dir + item)
-            fp_layer = AllChem.LayeredFingerprint(suppl[0])
-
-            if (item[0:-4] == list_to_sort[tmp].split(":")[0] ):
-                layer.append(fp_layer)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
-            else:
-                try:
-                    if (item[0:-4] == list_to_sort[tmp+1].split(":")[0]):
-                        layer.append(fp_layer)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp+1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp+1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    print(list_to_sort[tmp].split(":")[0], item[0:-4])
-                    pass
-            sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
-            sys.stdout.flush()
-        except:
-            pass
-    layer = np.array(layer)
-    return names, layer, homo, homo1, diff
-
-# TODO: multiprocess all of this
-# this script converts xyz files to rdkit/openbabel-readable sdf
-# Input: not implemented here but a directory with xyz files
-# Input: directory of xyz files
-# Output: None, saves SDF type files to and sdf folder for later
-def xyz_to_sdf(dir="../data/xyz/DB/"):
+    spec = {"type": "layer"}
+    names, mats, labels = fingerprint_dir(dir, {"fp": spec}, n_jobs=n_jobs, cache=cache)
+    homo, homo1, diff = label_columns(names, labels)
+    return names, mats["fp"], homo, homo1, diff
 
-    dir_str = "ls " + str(dir) + " | sort "
-    temp = os.popen(dir_str).read()
-    temp = str(temp).split()
+# Input: directory of sdf files or shards, dict of name -> fingerprint spec
+# Output: names, dict of name -> matrix (every sdf parsed once), labels
+def fingerprints(dir="../data/sdf/DB3/", specs=None, n_jobs=None, cache=True):
 
-    for j,i in enumerate(temp):
-        try:
-            i = i.replace("(","\(").replace(")","\)").replace("[","\[").replace("]","\]")
+    #---------------------------------------------------------------------------
+    names, mats, labels = fingerprint_dir(dir, specs, n_jobs=n_jobs, cache=cache)
+    homo, homo1, diff = label_columns(names, labels)
+    return names, mats, homo, homo1, diff
+
+# this converts xyz files to rdkit/openbabel-readable sdf, bond perception
+# runs in a worker pool instead of one xyz2mol.py process per file
+# Input: directory of xyz files, sdf output folder, molecules per shard,
+# per_file=True for the old one-sdf-per-molecule layout
+# Output: report of written shards and per-file failures
+def xyz_to_sdf(dir="../data/xyz/DB/", out_dir="../data/sdf/", shard_size=10000, per_file=False, n_jobs=None):
 
-            file_str = "python ./xyz2mol/xyz2mol.py " + dir + i + " -o sdf > ../data/sdf/" + i[0:-4] + ".sdf"
-            os.system(file_str)
-            sys.stdout.write("\r %s / " % j + str(len(temp)))
-            sys.stdout.flush()
+    temp = list_dir(dir, suffix=".xyz")
 
-        except:
-            print("not working")
+    if (per_file == True):
+        out = out_dir
+    else:
+        # ../data/xyz/DB/ -> ../data/sdf/DB/DB_0000.sdf, ...
+        set_name = os.path.basename(os.path.normpath(dir))
+        out = out_dir + set_name + "/" + set_name
+
+    return xyz_to_sdf_batch([dir + i for i in temp], out,
+                            shard_size=shard_size, per_file=per_file, n_jobs=n_jobs)
+
+# one-time packing of a one-sdf-per-molecule folder into gzip shards
+# Input: sdf directory, e.g. ../data/sdf/DB3/, molecules per shard
+# Output: shard files, ../data/sdf/DB3_packed/DB3_0000.sdf.gz, ...
+def pack_sdf(dir="../data/sdf/DB3/", out_dir=None, shard_size=10000):
+    set_name = os.path.basename(os.path.normpath(dir))
+    if out_dir is None:
+        out_dir = os.path.dirname(os.path.normpath(dir)) + "/" + set_name + "_packed/"
+    return pack_sdf_dir(dir, out_dir + set_name, shard_size=shard_size)
 
 # Input: directory of xyz files
 # Output: returns a list of smiles strings
-def xyz_to_smiles(dir="../data/xyz/DB2/"):
-    dir_str = "ls " + str(dir) + " | sort -d "
-    temp = os.popen(dir_str).read()
-    temp = str(temp).split()
+def xyz_to_smiles(dir="../data/xyz/DB2/", n_jobs=None):
+    temp = list_dir(dir)
+    # bonds are perceived once per file and kept in the smiles cache
+    strings = xyz_strings([dir + i for i in temp], n_jobs=n_jobs)
     ret_list = []
     names = []
-    for j, i in enumerate(temp):
-        try:
-            mol = next(pybel.readfile("xyz", dir + i))
-            smi = mol.write(format="smi")
-            ret_list.append(smi.split()[0].strip())
+    for i in temp:
+        if (dir + i) in strings:
+            ret_list.append(strings[dir + i]["smiles"])
             names.append(i)
-            sys.stdout.write("\r %s / " % j + str(len(temp)))
-            sys.stdout.flush()
-
-        except:
-            pass
     # print(ret_list[0:4])
     return names, ret_list
 
@@ -303,25 +118,20 @@ def smi_split(file=""):
         temp = str(i)
         mol.write("smi", "%s.smi" % temp)
 
-# converts a log files of smiles strings to a pandas db of xyz
-def smiles_to_xyz( dir="../data/smiles/ZZ/"):
-    dir_str = "ls " + str(dir) + " | sort"
-    temp = os.popen(dir_str).read()
-    temp = str(temp).split()
-    t = []
+# embeds every smiles in a directory of .smi files in a worker pool
+# Input: directory of .smi files (one or more "<smiles> [name]" lines each),
+# output file (default <dir>.xyz), "xyz" or "sdf", seconds per molecule
+# Output: report of frames written, failures and latencies
+def smiles_to_xyz(dir="../data/smiles/ZZ/", out=None, fmt="xyz", timeout=60, n_jobs=None):
+    temp = list_dir(dir)
+    items = []
     for i in temp:
-        t1 = time.time()
-        print("Current file: " + i)
-        mol = next(pybel.readfile("smi", dir + i))
-        mol.make3D(forcefield='mmff94', steps=10)
-        mol.localopt()
-        t2 = time.time()
-        print("Smi Optimization Complete in " + str(t2-t1) + "s")
-        mol.write("xyz", "%s.xyz" % i)
-        t.append(t2-t1)
-        #mol.write("xyz", "%s.xyz" % temp)
-    time_array = np.array(t)
-    print("time average for computation: " + np.mean(time_array))
+        items.extend(read_smiles(dir + i))
+    print(str(len(items)) + " smiles to embed")
+
+    if out is None:
+        out = os.path.normpath(dir) + "." + fmt
+    return embed_smiles(items, out, fmt=fmt, timeout=timeout, n_jobs=n_jobs)
 
 def process_input_DB2(dir="DB2", desc="rdkit"):
     try:
@@ -335,132 +145,64 @@ def process_input_DB2(dir="DB2", desc="rdkit"):
         df = pd.read_hdf(str)
         pkl = 0
 
-    df["HOMO"] = ""
-    df["HOMO-1"] = ""
-    df["diff"] = ""
     print(df.head())
-    list_to_sort = []
-    with open("../../data/benzoquinone_DB/DATA_copy") as fp:
-        line = fp.readline()
-        while line:
-            list_to_sort.append(line[0:-2])
-            line = fp.readline()
-    list_to_sort.sort()
-
-    for i in range(df.copy().shape[0]):
-        for j in list_to_sort:
-
-            # print(df["name"].iloc[i][:-4])
-            # print(j.split(":")[0])
-            if (desc == "auto"):
-                if (df["name"].iloc[i].split("/")[-1][:-4] in j.split(";")[0]):
-                    temp1 = float(j.split(":")[1])
-                    temp2 = float(j.split(":")[2])
-                    df["HOMO"].loc[i] = float(j.split(":")[1])
-                    df["HOMO-1"].loc[i] = float(j.split(":")[2])
-                    df["diff"].loc[i] = temp2 - temp1
-                    print(temp2 - temp1)
-
-            if (df["name"].iloc[i][:-4] in j.split(";")[0]):
-                temp1 = float(j.split(":")[1])
-                temp2 = float(j.split(":")[2])
-
-                print(j)
-
-                df["HOMO"].loc[i] = float(j.split(":")[1])
-                df["HOMO-1"].loc[i] = float(j.split(":")[2])
-                df["diff"].loc[i] = temp2 - temp1
+    labels = read_labels("../../data/benzoquinone_DB/DATA_copy", segmented=False)
+    df, report = attach_labels(df, labels)
     if (pkl == 0):
         df.to_hdf(str, key="df", mode='a')
     else:
         df.to_pickle(str)
+    return report
 
 # TODO : this, once ZZ finishes getting his data
 def process_input_ZZ(dir="ZZ", desc="vae"):
     # todo: process ZZ's
     return 0
 
-def process_input_DB3(dir="DB3", desc="rdkit"):
-    print(desc)
+def read_desc_table(dir="DB3", desc="rdkit"):
+    # legacy h5/pkl table, or the store index for descriptors that only
+    # write a store (persist streams straight into .f32.npy)
+    # Output: df with name, HOMO, HOMO-1, diff, file it came from, pkl flag
+    # (0 h5, 1 pkl, None store index)
+    store_prefix = desc_prefix(dir, desc)
     try:
-        str = "../data/desc/" + dir + "/desc_calc_"+ dir +"_" + desc + ".h5"
-        df = pd.read_hdf(str)
-        pkl = 0
+        str = store_prefix + ".h5"
+        return pd.read_hdf(str), str, 0
     except:
-        str = "../data/desc/" + dir + "/desc_calc_"+ dir +"_" + desc + ".pkl"
-        df = pd.read_pickle(str)
-        pkl = 1
+        pass
+    try:
+        str = store_prefix + ".pkl"
+        return pd.read_pickle(str), str, 1
+    except:
+        pass
+    if (has_store(store_prefix)):
+        return read_index(store_prefix), None, None
+    raise IOError("no descriptor table or store for " + store_prefix)
+
+def process_input_DB3(dir="DB3", desc="rdkit"):
+    print(desc)
+    df, str, pkl = read_desc_table(dir=dir, desc=desc)
 
     print(df.head())
-    df["HOMO"] = 0
-    df["HOMO-1"] = 0
-    df["diff"] = 0
-    list_to_sort = []
-    with open("../../data/DATA_DB3") as fp:
-        line = fp.readline()
-        while line:
-            list_to_sort.append(line[0:-2])
-            line = fp.readline()
-    list_to_sort.sort()
     print("Dimensions of df {0}".format(np.shape(df)))
-    iters = df.copy().shape[0]
-
-    for i in range(iters):
-
-        shift = 0
-        if ("tris" in df["name"].iloc[i]):
-            shift = 4
-        elif ("tetra" in df["name"].iloc[i]):
-            shift = 5
-        elif ("bis-23" in df["name"].iloc[i]):
-            shift = 6
-        elif ("bis-25" in df["name"].iloc[i]):
-            shift = 6
-        elif ("bis-26" in df["name"].iloc[i]):
-            shift = 6
-        elif ("mono" in df["name"].iloc[i]):
-            shift = 4
-        elif ("BQ" in df["name"].iloc[i]):
-            shift = -1
-        else:
-            pass
-        name = df["name"].iloc[i][:-4]
-        shifted_name = df["name"].iloc[i].split("/")[-1][shift + 1:-4]
-
-        for j in list_to_sort:
-            if (name in j.split(";")[0] and j[0:2] != "--"):
-                temp1 = float(j.split(":")[1])
-                temp2 = float(j.split(":")[2])
-                df["HOMO"].loc[i] = float(j.split(":")[1])
-                df["HOMO-1"].loc[i] = float(j.split(":")[2])
-                df["diff"].loc[i] = temp2 - temp1
-                sys.stdout.write("\r {0} / {1}".format(i, np.shape(df)[0]))
-                sys.stdout.flush()
-                print(j.split(":")[0])
-
-                list_to_sort.remove(j)
-                break
-
-            else:
-                if(shifted_name in j.split(":")[0]):
-                    sys.stdout.write("\r {0} / {1}".format(i, np.shape(df)[0]))
-                    sys.stdout.flush()
-
-                    temp1 = float(j.split(":")[1])
-                    temp2 = float(j.split(":")[2])
-                    df["HOMO"].loc[i] = float(j.split(":")[1])
-                    df["HOMO-1"].loc[i] = float(j.split(":")[2])
-                    df["diff"].loc[i] = temp2 - temp1
-                    print(j.split(":")[0])
-                    list_to_sort.remove(j)
-                    break
+    labels = read_labels("../../data/DATA_DB3")
+    # unmatched and ambiguous rows stay NaN, see report["missing"] / ["ambiguous"]
+    df, report = attach_labels(df, labels)
 
     print(df.head())
+    # keep the store index in step with the relabeled table
+    store_prefix = desc_prefix(dir, desc)
+    if (pkl is None):
+        write_index(store_prefix, df)
+    elif (has_store(store_prefix)):
+        index, _ = attach_labels(read_index(store_prefix), labels)
+        write_index(store_prefix, index)
     db_integrity(dir=dir, desc=desc)
     if (pkl == 0):
         df.to_hdf(str, key="df", mode='a')
-    else:
+    elif (pkl == 1):
         df.to_pickle(str)
+    return report
 
 def db_full_integrity(dir="DB3", desc="rdkit"):
     db_integrity(dir="DB3", desc="morg")
@@ -475,14 +217,7 @@ def db_full_integrity(dir="DB3", desc="rdkit"):
 def db_integrity(dir="DB3", desc="rdkit"):
     print(">>>>>>Now testing database integrity")
     print(desc)
-    try:
-        str = "../data/desc/" + dir + "/desc_calc_"+ dir +"_" + desc + ".h5"
-        df = pd.read_hdf(str)
-        pkl = 0
-    except:
-        str = "../data/desc/" + dir + "/desc_calc_"+ dir +"_" + desc + ".pkl"
-        df = pd.read_pickle(str)
-        pkl = 1
+    df, str, pkl = read_desc_table(dir=dir, desc=desc)
 
     try:
         HOMO = df["HOMO"]
@@ -498,48 +233,21 @@ def db_integrity(dir="DB3", desc="rdkit"):
         print("it appears you haven't transcribed diff correctly")
 
     # all energies in the database
-    list_to_sort = []
-    final_lines = []
-
-    added_seg = "BQ"
-    with open("../../data/DATA_DB3") as fp:
-        line = fp.readline()
-        while line:
-            if(line.split()[0] == "----"):
-                added_seg = line.split()[1]
-            else:
-                list_to_sort.append(added_seg + "_" + line[0:-2])
-            line = fp.readline()
-
-    list_to_sort.sort()
-    only_names= [i[0:-2].split(":")[0] for i in list_to_sort]
-    df.sort_values("name")
-    list_len = len(list_to_sort)
+    labels = read_labels("../../data/DATA_DB3")
     count_bad = 0
     for i in range(1000):
         rand_index = np.random.randint(0, df.shape[0])
 
         str_search = df.iloc[rand_index]["name"][0:-4]
-        diff_search = df.iloc[rand_index]["diff"]
         HOMO_search = df.iloc[rand_index]["HOMO"]
 
-        try:
-            index_of_search = only_names.index(str_search)
-
-            name_only_names = list_to_sort[index_of_search]
-            name_of_search = list_to_sort[index_of_search].split(":")[0]
-
-            homo_db = float(list_to_sort[index_of_search].split(":")[1])
-            diff_db = float(list_to_sort[index_of_search].split(":")[1]) - float(list_to_sort[index_of_search].split(":")[2])
+        if (str_search in labels.index):
+            homo_db = labels.at[str_search, "HOMO"]
 
             if(HOMO_search != homo_db):
-                print(str_search, name_of_search, name_only_names)
+                print(str_search, labels.at[str_search, "smiles"])
                 print(HOMO_search, homo_db)
                 count_bad +=1
-            else:
-                pass
-        except:
-            pass
     print(df.shape)
     print(count_bad/1000)
     if(count_bad == 0):
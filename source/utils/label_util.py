@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import time
+import pandas as pd
+
+DATA_DB3 = "../data/DATA_DB3"
+# segment prefixes put on file names; BQ files keep the whole stem
+SEGMENT_PREFIX = r"^(?:tris|tetra|bis-23|bis-25|bis-26|mono)_"
+
+def read_labels(data_file=DATA_DB3, segmented=True):
+    """Parse a label file once into a frame indexed by molecule name.
+
+    Label lines look like ``<smiles>:<HOMO>:<HOMO-1>``. When ``segmented`` the
+    ``---- <segment> ----`` headers switch the prefix so the index holds
+    ``<segment>_<smiles>``, which is how the xyz/sdf files are named.
+    Columns: segment, smiles, HOMO, HOMO-1, diff (HOMO - HOMO-1, as the
+    descriptor builders store it; attach_labels keeps HOMO-1 - HOMO).
+    """
+    names = []
+    segments = []
+    smiles = []
+    homo = []
+    homo1 = []
+
+    added_seg = "BQ"
+    with open(data_file) as fp:
+        for line in fp:
+            line = line.strip()
+            if (len(line) == 0):
+                continue
+            if (line.split()[0] == "----"):
+                added_seg = line.split()[1]
+                continue
+            try:
+                smi, homo_temp, homo1_temp = line.rsplit(":", 2)
+                homo_temp = float(homo_temp)
+                homo1_temp = float(homo1_temp)
+            except ValueError:
+                print("skipping malformed label line: " + line)
+                continue
+
+            if (segmented == True):
+                names.append(added_seg + "_" + smi)
+            else:
+                names.append(smi)
+            segments.append(added_seg)
+            smiles.append(smi)
+            homo.append(homo_temp)
+            homo1.append(homo1_temp)
+
+    labels = pd.DataFrame({"segment": segments, "smiles": smiles, "HOMO": homo, "HOMO-1": homo1},
+                          index=pd.Index(names, name="name"))
+    labels["diff"] = labels["HOMO"] - labels["HOMO-1"]
+    # first entry wins, same as list.index did before
+    labels = labels[~labels.index.duplicated(keep="first")]
+    return labels
+
+def file_stem(file_name):
+    # "dir/tris_C(F)(F)F.sdf" -> "tris_C(F)(F)F"
+    return os.path.splitext(os.path.basename(str(file_name)))[0]
+
+def join_labels(file_names, labels):
+    """Hash join of file names against a label index.
+
+    Returns the files that have labels (input order kept), the label rows
+    aligned with them and a report dict with ``matched``, ``unmatched_file``
+    and ``unmatched_label``.
+    """
+    stems = pd.Index([file_stem(i) for i in file_names])
+    has_label = stems.isin(labels.index)
+
+    files_relevant = [f for f, keep in zip(file_names, has_label) if keep]
+    unmatched_file = [f for f, keep in zip(file_names, has_label) if not keep]
+    unmatched_label = list(labels.index.difference(stems))
+    matched = labels.loc[stems[has_label]]
+
+    report = {"matched": len(files_relevant),
+              "unmatched_file": unmatched_file,
+              "unmatched_label": unmatched_label}
+    return files_relevant, matched, report
+
+def print_report(report):
+    sys.stdout.write("matched: {0} unmatched files: {1} unmatched labels: {2}\n".format(
+        report["matched"], len(report["unmatched_file"]), len(report["unmatched_label"])))
+    sys.stdout.flush()
+
+def label_columns(names, labels):
+    """Look up HOMO, HOMO-1 and diff lists for the given file names."""
+    rows = labels.loc[[file_stem(i) for i in names]]
+    return rows["HOMO"].tolist(), rows["HOMO-1"].tolist(), rows["diff"].tolist()
+
+def split_stem(stem):
+    # "bis-25_CCO" -> ("bis-25", "CCO"), unprefixed stems are BQ
+    match = re.match(SEGMENT_PREFIX, stem)
+    if match is None:
+        return "BQ", stem
+    return match.group(0)[:-1], stem[match.end():]
+
+def attach_labels(df, labels, name_col="name"):
+    """Vectorized relabeling of a descriptor table.
+
+    Every row is matched on its file stem against the label index. Rows
+    that miss are retried on (segment, smiles), with the segment taken
+    from the file's own prefix (BQ when it has none), so a file never
+    picks up another segment's energies. Fallback keys that hit several
+    label rows are ambiguous and left unlabeled, as are misses: HOMO,
+    HOMO-1 and diff stay NaN. diff is HOMO-1 - HOMO, the sign the
+    process_input_* tables always stored (read_labels and the descriptor
+    builders use HOMO - HOMO-1).
+    Returns the table plus a report with ``rows``, ``matched``,
+    ``missing`` and ``ambiguous`` (file names) and ``seconds``.
+    """
+    t1 = time.time()
+    cols = ["HOMO", "HOMO-1"]
+    names = df[name_col].astype(str)
+    stems = names.str.split("/").str[-1].str[:-4]
+    split = [split_stem(i) for i in stems]
+    keys = pd.DataFrame({"_key": stems.values,
+                         "_segment": [i[0] for i in split],
+                         "_smiles": [i[1] for i in split]},
+                        index=df.index)
+
+    found = keys.join(labels[cols], on="_key")[cols]
+
+    # fallback on the file's own segment, only where that pair is unique
+    pair_count = labels.groupby(["segment", "smiles"]).size()
+    by_pair = labels.drop_duplicates(["segment", "smiles"]).set_index(["segment", "smiles"])[cols]
+    by_pair = by_pair[pair_count.reindex(by_pair.index).values == 1]
+    fallback = keys.join(by_pair, on=["_segment", "_smiles"])[cols]
+    found = found.combine_first(fallback)
+
+    missed = found["HOMO"].isna()
+    pair_index = pd.MultiIndex.from_arrays([keys["_segment"], keys["_smiles"]])
+    ambiguous = missed.values & (pair_count.reindex(pair_index).fillna(0).values > 1)
+
+    df["HOMO"] = found["HOMO"]
+    df["HOMO-1"] = found["HOMO-1"]
+    df["diff"] = found["HOMO-1"] - found["HOMO"]
+    t2 = time.time()
+
+    report = {"rows": int(df.shape[0]),
+              "matched": int((~missed).sum()),
+              "missing": names[missed.values & ~ambiguous].tolist(),
+              "ambiguous": names[ambiguous].tolist(),
+              "seconds": t2 - t1}
+    print("labels attached to {0} / {1} rows in {2:.3f}s, missing: {3} ambiguous: {4}".format(
+        report["matched"], report["rows"], report["seconds"], len(report["missing"]),
+        len(report["ambiguous"])))
+    return df, report
@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+
+# next to the descriptor caches, one json listing per directory
+MANIFEST_DIR = "../data/desc/cache/manifest/"
+
+def _manifest_file(dir, manifest_dir):
+    key = hashlib.sha1(os.path.abspath(dir).encode()).hexdigest()
+    return os.path.join(manifest_dir, key + ".json")
+
+def _dir_stat(dir):
+    # one stat call: mtime and ctime move when entries are added, removed or
+    # renamed (ctime also when the mtime is set back), size when the directory grows
+    stat = os.stat(dir)
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns]
+
+def scan(dir):
+    """Sorted listing of the regular, non-hidden files in ``dir``.
+
+    Returns a dict with the directory's stat key and parallel name, size
+    and mtime lists.
+    """
+    # stat before listing: a change during the scan leaves the listing stale
+    dir_stat = _dir_stat(dir)
+    entries = []
+    with os.scandir(dir) as it:
+        for entry in it:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((entry.name, stat.st_size, stat.st_mtime))
+    entries.sort()
+    return {"dir": os.path.abspath(dir), "stat": dir_stat,
+            "names": [i[0] for i in entries], "sizes": [i[1] for i in entries],
+            "mtimes": [i[2] for i in entries]}
+
+def manifest(dir, cache=True, manifest_dir=MANIFEST_DIR):
+    """Listing of ``dir`` from the manifest cache, rescanned when stale.
+
+    The cached listing is reused while a single stat of the directory
+    (inode, size, mtime, ctime) is unchanged, so a cache hit costs no
+    listing. Limits: a change within the timestamp granularity of the
+    filesystem, or hidden by NFS attribute caching, goes unnoticed until the
+    next change to the directory, and files edited in place keep the cached
+    sizes and mtimes. Callers that need an exact listing pass cache=False.
+    """
+    if (cache == False):
+        return scan(dir)
+
+    file_name = _manifest_file(dir, manifest_dir)
+    stat = _dir_stat(dir)
+    try:
+        with open(file_name) as fp:
+            listing = json.load(fp)
+        if (listing["stat"] == stat):
+            return listing
+    except (OSError, ValueError, KeyError):
+        pass
+
+    listing = scan(dir)
+    try:
+        os.makedirs(manifest_dir, exist_ok=True)
+        with open(file_name + ".tmp", "w") as fp:
+            json.dump(listing, fp)
+        os.replace(file_name + ".tmp", file_name)
+    except OSError:
+        pass
+    return listing
+
+def shard_names(names, n_shards=1, shard=0):
+    """Contiguous slice ``shard`` of ``n_shards`` near-equal slices of names."""
+    size, extra = divmod(len(names), n_shards)
+    start = shard * size + min(shard, extra)
+    return names[start:start + size + (1 if shard < extra else 0)]
+
+def list_dir(dir, suffix=None, n_shards=1, shard=0, cache=True):
+    """Sorted file names in ``dir``, drop-in for the old ``ls dir | sort``.
+
+    Input: directory, optional suffix filter (".xyz"), number of shards and
+    which one this worker takes, whether to use the manifest cache.
+    """
+    names = manifest(dir, cache=cache)["names"]
+    if suffix is not None:
+        names = [i for i in names if i.endswith(suffix)]
+    if (n_shards > 1):
+        names = shard_names(names, n_shards, shard)
+    return names
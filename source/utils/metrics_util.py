@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from sklearn.model_selection import ShuffleSplit, cross_validate
+
+def as_float32(x):
+    """Contiguous float32 view of a feature matrix, copied only when needed."""
+    return np.ascontiguousarray(x, dtype=np.float32)
+
+def timed_fit(reg, x_train, y_train, **kwargs):
+    # Input: estimator, training data, extra fit kwargs (keras epochs etc.)
+    # Output: fit() return value, seconds spent fitting
+    t1 = time.time()
+    ret = reg.fit(x_train, y_train, **kwargs)
+    return ret, time.time() - t1
+
+def report(reg, x_test, y_test, scale=1.0, fit_seconds=None, name=None):
+    """Score a fitted model on the test set with a single predict call.
+
+    Input: fitted sklearn/xgboost/keras model, test features (converted to
+    a contiguous float32 array), test targets, target scale used for the
+    min-max normalization, fit time, label for the printout.
+    Output: dict with ``name``, ``mse``, ``mae``, ``r2``, ``scaled_mae``,
+    ``fit_seconds``, ``predict_seconds`` and ``n_test``, printed in the
+    same layout the trainers used before.
+    """
+    x_test = as_float32(x_test)
+    y_test = np.asarray(y_test)
+
+    t1 = time.time()
+    y_pred = np.asarray(reg.predict(x_test)).reshape(y_test.shape)
+    predict_seconds = time.time() - t1
+
+    mae = mean_absolute_error(y_test, y_pred)
+    record = {"name": name,
+              "mse": mean_squared_error(y_test, y_pred),
+              "mae": mae,
+              "r2": r2_score(y_test, y_pred),
+              "scaled_mae": scale * mae,
+              "fit_seconds": fit_seconds,
+              "predict_seconds": predict_seconds,
+              "n_test": len(y_test)}
+
+    if name is not None:
+        print(name + " score:   " + str(record["r2"]) + " time: " + str(fit_seconds))
+    print("MSE score:   " + str(record["mse"]) + " time: " + str(fit_seconds))
+    print("MAE score:   " + str(record["mae"]) + " time: " + str(fit_seconds))
+    print("r2 score:   " + str(record["r2"]) + " time: " + str(fit_seconds))
+    print("predict time: " + str(predict_seconds) + " for " + str(record["n_test"]))
+    print("scaled MAE")
+    print(record["scaled_mae"])
+    return record
+
+CV_CACHE = "../data/train/cache/cv.sqlite"
+CV_SCORING = {"mse": "neg_mean_squared_error", "mae": "neg_mean_absolute_error", "r2": "r2"}
+
+def data_fingerprint(x, y):
+    """sha1 over the shape, dtype and bytes of the feature matrix and target."""
+    sha = hashlib.sha1()
+    for arr in (np.ascontiguousarray(x), np.ascontiguousarray(y)):
+        sha.update((arr.dtype.str + str(arr.shape)).encode())
+        sha.update(arr.data)
+    return sha.hexdigest()
+
+def _params_key(reg):
+    # estimator class plus every constructor argument, objects (kernels) by repr
+    params = dict((k, repr(v)) for k, v in reg.get_params().items())
+    return json.dumps([type(reg).__name__, params], sort_keys=True)
+
+def cross_evaluate(reg, x, y, n_splits=3, n_jobs=None, random_state=42, cache=False,
+                   fingerprint=None, cache_file=CV_CACHE, splitter=None):
+    """Cross validation, one fit per fold for all metrics.
+
+    Input: unfitted estimator, features, target, folds, folds fitted in
+    parallel (None: one per fold), seed for the splits and for estimators
+    with a random_state left at None, whether to read/extend the fold
+    cache, precomputed data_fingerprint(x, y) to skip rehashing the data,
+    sklearn splitter to use instead of ShuffleSplit(n_splits) (KFold for
+    scores comparable with GridSearchCV / BayesSearchCV cv=k).
+    Output: dict with per-fold ``mse``, ``mae``, ``r2`` arrays (errors as
+    positive numbers), ``fit_time`` and ``cached``.
+    The cache is keyed on the estimator parameters, the split settings and
+    the data fingerprint, so a repeated configuration costs no fits.
+    """
+    reg = clone(reg)
+    # cache keys of the default split stay as they were
+    split_key = str((n_splits, random_state))
+    if splitter is None:
+        splitter = ShuffleSplit(n_splits=n_splits, random_state=random_state)
+    else:
+        split_key = repr(splitter)
+    if "random_state" in reg.get_params() and reg.get_params()["random_state"] is None:
+        reg.set_params(random_state=random_state)
+
+    if (cache == True):
+        if fingerprint is None:
+            fingerprint = data_fingerprint(x, y)
+        key = hashlib.sha1((_params_key(reg) + split_key + fingerprint).encode()).hexdigest()
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        conn = sqlite3.connect(cache_file)
+        conn.execute("CREATE TABLE IF NOT EXISTS folds (key TEXT PRIMARY KEY, params TEXT, scores TEXT)")
+        row = conn.execute("SELECT scores FROM folds WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.close()
+            scores = dict((k, np.array(v)) for k, v in json.loads(row[0]).items())
+            scores["cached"] = True
+            return scores
+
+    ret = cross_validate(reg, x, y, cv=splitter, scoring=CV_SCORING,
+                         n_jobs=n_jobs if n_jobs is not None else splitter.get_n_splits())
+    scores = {"mse": -ret["test_mse"], "mae": -ret["test_mae"], "r2": ret["test_r2"],
+              "fit_time": ret["fit_time"]}
+
+    if (cache == True):
+        conn.execute("INSERT OR REPLACE INTO folds VALUES (?, ?, ?)",
+                     (key, _params_key(reg), json.dumps(dict((k, v.tolist()) for k, v in scores.items()))))
+        conn.commit()
+        conn.close()
+    scores["cached"] = False
+    return scores
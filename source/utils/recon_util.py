@@ -0,0 +1,118 @@
+import time
+import numpy as np
+import selfies as sf
+from concurrent.futures import ProcessPoolExecutor
+from rdkit import Chem, DataStructs
+
+# batched encode-decode checks for the selfies autoencoders:
+# argmax over the whole (N, L, A) tensor, every distinct sequence decoded
+# once, canonicalization and fingerprints spread over a process pool
+
+def argmax_index(x, dim):
+    """(N, L * A) or (N, L, A) scores -> (N, L) symbol indices."""
+    return np.asarray(x).reshape(-1, dim[0], dim[1]).argmax(axis=-1)
+
+def decode_unique(index, alphabet):
+    """Decode each distinct index row to smiles exactly once.
+
+    Returns the decoded smiles of the unique rows and, for every input
+    row, the position of its unique row.
+    """
+    unique, inverse = np.unique(index, axis=0, return_inverse=True)
+    smiles = []
+    for row in unique:
+        try:
+            smiles.append(sf.decoder("".join(alphabet[i] for i in row)))
+        except:
+            smiles.append(None)
+    return smiles, inverse.reshape(-1)
+
+def _canon_chunk(smiles):
+    # worker: canonical smiles plus packed RDKit fingerprint, None on failure
+    ret = []
+    for smi in smiles:
+        try:
+            canon = Chem.CanonSmiles(smi)
+            fp = Chem.RDKFingerprint(Chem.MolFromSmiles(canon))
+            arr = np.zeros((fp.GetNumBits(),), dtype=np.uint8)
+            DataStructs.ConvertToNumpyArray(fp, arr)
+            ret.append((canon, np.packbits(arr)))
+        except:
+            ret.append(None)
+    return ret
+
+def canonicalize(smiles, n_jobs=None, chunk_size=1024):
+    """Canonical smiles and packed fingerprints for a list of smiles.
+
+    Failed entries come back as None / a row of zeros, ``ok`` flags the
+    good ones.
+    """
+    chunks = [smiles[i:i + chunk_size] for i in range(0, len(smiles), chunk_size)]
+    canon = []
+    fps = []
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for ret in executor.map(_canon_chunk, chunks):
+            for item in ret:
+                if item is None:
+                    canon.append(None)
+                    fps.append(None)
+                else:
+                    canon.append(item[0])
+                    fps.append(item[1])
+
+    width = max([len(i) for i in fps if i is not None] + [0])
+    ok = np.array([i is not None for i in fps], dtype=bool)
+    fp_mat = np.zeros((len(fps), width), dtype=np.uint8)
+    for ind, fp in enumerate(fps):
+        if fp is not None:
+            fp_mat[ind] = fp
+    return canon, fp_mat, ok
+
+def tanimoto(a, b):
+    """Row-wise Tanimoto similarity of two packed bit matrices."""
+    both = np.unpackbits(a & b, axis=1).sum(axis=1)
+    either = np.unpackbits(a | b, axis=1).sum(axis=1)
+    return np.where(either > 0, both / np.maximum(either, 1), 0.0)
+
+def reconstruction_metrics(x_true, x_pred, dim, alphabet, n_jobs=None, chunk_size=1024):
+    """Reconstruction accuracy and Tanimoto similarity in one pass.
+
+    Input: true and autoencoded one-hot scores, (N, L * A) or (N, L, A),
+    dim = (L, A), the selfies alphabet, pool size.
+    Output: dict with ``accuracy`` (fraction of canonical smiles that
+    match), ``tanimoto`` (N,) RDKit fingerprint similarities (nan where a
+    side failed to parse), ``true_smiles``, ``pred_smiles`` and ``seconds``.
+    """
+    t1 = time.time()
+    true_index = argmax_index(x_true, dim)
+    pred_index = argmax_index(x_pred, dim)
+    n = true_index.shape[0]
+
+    # true and predicted rows share one memo, identical reconstructions are free
+    smiles, inverse = decode_unique(np.vstack((true_index, pred_index)), alphabet)
+    distinct = sorted(set(i for i in smiles if i is not None))
+    canon, fp_mat, ok = canonicalize(distinct, n_jobs=n_jobs, chunk_size=chunk_size)
+    position = dict((smi, ind) for ind, smi in enumerate(distinct))
+
+    # unique row -> canonical row, -1 when decoding or parsing failed
+    unique_canon = np.array([position[i] if i is not None and ok[position[i]] else -1 for i in smiles],
+                            dtype=np.int64)
+    rows = unique_canon[inverse]
+    true_rows = rows[:n]
+    pred_rows = rows[n:]
+    good = (true_rows >= 0) & (pred_rows >= 0)
+
+    # canonical smiles map 1:1 to rows only after collapsing duplicates
+    canon_ids = dict((smi, ind) for ind, smi in enumerate(sorted(set(i for i in canon if i is not None))))
+    canon_of_row = np.array([canon_ids[i] if i is not None else -1 for i in canon], dtype=np.int64)
+    match = np.zeros((n,), dtype=bool)
+    sim = np.full((n,), np.nan)
+    if good.any():
+        match[good] = canon_of_row[true_rows[good]] == canon_of_row[pred_rows[good]]
+        sim[good] = tanimoto(fp_mat[true_rows[good]], fp_mat[pred_rows[good]])
+
+    true_smiles = [canon[i] if i >= 0 else None for i in true_rows]
+    pred_smiles = [canon[i] if i >= 0 else None for i in pred_rows]
+    t2 = time.time()
+    return {"accuracy": float(match.sum()) / max(n, 1), "tanimoto": sim,
+            "true_smiles": true_smiles, "pred_smiles": pred_smiles, "seconds": t2 - t1}
@@ -0,0 +1,175 @@
+import os
+import re
+import sys
+import gzip
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+from rdkit import Chem
+try:
+    from rdkit.Chem import rdDetermineBonds
+except ImportError:
+    # older rdkit builds, fall back on the xyz2mol checkout next to source/
+    rdDetermineBonds = None
+
+XYZ2MOL_DIR = "./xyz2mol/"
+# multi-record files written by xyz_to_sdf_batch / pack_sdf_dir: <set>_0000.sdf[.gz]
+SHARD_PATTERN = re.compile(r"_\d{4}\.sdf(\.gz)?$")
+
+def is_shard(file_name):
+    return SHARD_PATTERN.search(os.path.basename(file_name)) is not None
+
+def iter_sdf(paths, use_title=None):
+    """Stream (name, Mol) pairs from sdf files, lazily, one open per file.
+
+    Every record of a multi-record file is named ``<_Name>.sdf`` and a
+    one-molecule file yields its first record under its own file name, so
+    both layouts give the names the label join expects. ``use_title``
+    forces the multi-record behaviour (e.g. for master.sdf), by default
+    only shards get it. gzip compressed files are read directly. Records
+    rdkit cannot parse are skipped.
+    """
+    for path in paths:
+        multi = is_shard(path) if use_title is None else use_title
+        if path.endswith(".gz"):
+            fp = gzip.open(path, "rb")
+        else:
+            fp = open(path, "rb")
+        with fp:
+            for mol in Chem.ForwardSDMolSupplier(fp):
+                if (multi == False):
+                    if mol is not None:
+                        yield os.path.basename(path), mol
+                    break
+                if mol is not None:
+                    yield mol.GetProp("_Name") + ".sdf", mol
+
+def xyz_to_mol(path, charge=0):
+    """Bond perception for one xyz file, returns an rdkit Mol named after the file."""
+    if rdDetermineBonds is not None:
+        mol = Chem.MolFromXYZFile(path)
+        if mol is None:
+            raise ValueError("unreadable xyz")
+        rdDetermineBonds.DetermineBonds(mol, charge=charge)
+    else:
+        if XYZ2MOL_DIR not in sys.path:
+            sys.path.insert(0, XYZ2MOL_DIR)
+        import xyz2mol as x2m
+        atoms, _, coords = x2m.read_xyz_file(path)
+        mol = x2m.xyz2mol(atoms, coords, charge=charge)
+        if isinstance(mol, list):
+            mol = mol[0]
+    if mol is None:
+        raise ValueError("no molecule perceived")
+    mol.SetProp("_Name", os.path.splitext(os.path.basename(path))[0])
+    return mol
+
+def _convert_chunk(paths, charge):
+    # worker: (name, mol block, error) per path, block is None on failure
+    ret = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            ret.append((name, Chem.MolToMolBlock(xyz_to_mol(path, charge)), None))
+        except Exception as e:
+            ret.append((name, None, " ".join(str(e).split()) or type(e).__name__))
+    return ret
+
+def xyz_to_sdf_batch(paths, out, shard_size=10000, per_file=False, charge=0, n_jobs=None, chunk_size=64):
+    """Convert xyz files to sdf without leaving the interpreter.
+
+    Input: xyz paths, output prefix, molecules per shard, whether to write
+    one <out><name>.sdf per molecule instead, total charge, number of
+    workers (None uses every core), files per task.
+    Output: report dict with ``written``, ``shards`` (files written) and
+    ``failed`` (list of (name, error)), also written to a failed.txt next
+    to the output. Shards are <out>_0000.sdf, ... with the file stem as
+    each record's _Name, in input order.
+    """
+    out_dir = os.path.dirname(out)
+    if (len(out_dir) > 0):
+        os.makedirs(out_dir, exist_ok=True)
+
+    report = {"written": 0, "shards": [], "failed": []}
+    shard = None
+    in_shard = 0
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for ret in executor.map(_convert_chunk, chunks, repeat(charge)):
+            for name, block, error in ret:
+                if block is None:
+                    report["failed"].append((name, error))
+                    continue
+
+                if (per_file == True):
+                    file_name = out + name + ".sdf"
+                    with open(file_name, "w") as fp:
+                        fp.write(block + "$$$$\n")
+                    report["shards"].append(file_name)
+                else:
+                    if shard is None or in_shard == shard_size:
+                        if shard is not None:
+                            shard.close()
+                        file_name = out + "_%04d.sdf" % len(report["shards"])
+                        shard = open(file_name, "w")
+                        report["shards"].append(file_name)
+                        in_shard = 0
+                    shard.write(block + "$$$$\n")
+                    in_shard += 1
+                report["written"] += 1
+
+            done += len(ret)
+            sys.stdout.write("\r %s / " % done + str(len(paths)))
+            sys.stdout.flush()
+    print("")
+    if shard is not None:
+        shard.close()
+
+    # <out>failed.txt inside the per_file folder, <out>.failed.txt next to the shards
+    failed_file = out + ("failed.txt" if per_file == True else ".failed.txt")
+    with open(failed_file, "w") as fp:
+        for name, error in report["failed"]:
+            fp.write(name + "\t" + error + "\n")
+    print("written: " + str(report["written"]) + " failed: " + str(len(report["failed"])))
+    return report
+
+def pack_sdf_dir(dir, out, names=None, shard_size=10000, compress=True):
+    """One-time packing of a one-molecule-per-file sdf tree into shards.
+
+    Input: directory of .sdf files, output prefix (shards are
+    <out>_0000.sdf.gz, ...), file names to pack (default: every .sdf in
+    the directory), molecules per shard, gzip or plain text.
+    Output: list of shards written. Records are copied as text with the
+    file stem as the title line, so nothing is re-perceived.
+    """
+    from source.utils.manifest_util import list_dir
+
+    out_dir = os.path.dirname(out)
+    if (len(out_dir) > 0):
+        os.makedirs(out_dir, exist_ok=True)
+    if names is None:
+        names = [i for i in list_dir(dir, suffix=".sdf") if not is_shard(i)]
+
+    shards = []
+    for start in range(0, len(names), shard_size):
+        file_name = out + "_%04d.sdf" % len(shards) + (".gz" if compress == True else "")
+        if (compress == True):
+            fp = gzip.open(file_name + ".tmp", "wt")
+        else:
+            fp = open(file_name + ".tmp", "w")
+        with fp:
+            for name in names[start:start + shard_size]:
+                with open(dir + name) as sdf_fp:
+                    record = sdf_fp.read().split("$$$$")[0]
+                # swap the title line, the rest of the record is copied verbatim
+                record = os.path.splitext(name)[0] + record[record.find("\n"):]
+                if not record.endswith("\n"):
+                    record += "\n"
+                fp.write(record + "$$$$\n")
+        os.replace(file_name + ".tmp", file_name)
+        shards.append(file_name)
+        sys.stdout.write("\r %s / " % min(start + shard_size, len(names)) + str(len(names)))
+        sys.stdout.flush()
+    print("")
+    return shards
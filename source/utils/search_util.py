@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterGrid
+
+from source.utils.metrics_util import cross_evaluate, data_fingerprint
+from source.utils.study_util import plain_value
+
+class TrialLog(object):
+    """Append-only json lines file of evaluated hyperparameter settings.
+
+    One line per trial with the params, the data fingerprint, the cv split,
+    per-fold mse/mae/r2 and fit times, and the wall time of the trial. Lines are
+    flushed and synced as they are written, so a search killed at any point
+    loses at most the trial in flight; a torn last line is ignored on load.
+    """
+    def __init__(self, file_name):
+        log_dir = os.path.dirname(file_name)
+        if (len(log_dir) > 0):
+            os.makedirs(log_dir, exist_ok=True)
+        self.file_name = file_name
+
+    def load(self, fingerprint=None):
+        trials = []
+        if not os.path.exists(self.file_name):
+            return trials
+        with open(self.file_name) as fp:
+            for line in fp:
+                try:
+                    trial = json.loads(line)
+                except ValueError:
+                    continue
+                if fingerprint is None or trial.get("fingerprint") == fingerprint:
+                    trials.append(trial)
+        return trials
+
+    def append(self, trial):
+        line = json.dumps(trial) + "\n"
+        with open(self.file_name, "a+b") as fp:
+            # close off a line torn by a killed run instead of appending to it
+            if fp.tell() > 0:
+                fp.seek(-1, os.SEEK_END)
+                if fp.read(1) != b"\n":
+                    line = "\n" + line
+            fp.write(line.encode())
+            fp.flush()
+            os.fsync(fp.fileno())
+
+def params_key(params):
+    return json.dumps(dict((k, plain_value(v)) for k, v in params.items()), sort_keys=True)
+
+def _split_space(space):
+    # one-value lists are fixed settings, everything else is searched
+    fixed = {}
+    search = {}
+    for name, dim in space.items():
+        if isinstance(dim, list) and len(dim) == 1:
+            fixed[name] = dim[0]
+        else:
+            search[name] = dim
+    return fixed, search
+
+def _split(cv):
+    # KFold(cv), the split BayesSearchCV / GridSearchCV use for cv=k with a regressor
+    return KFold(n_splits=cv)
+
+def _load(log, fingerprint, cv):
+    # trials scored on another split (or before splits were logged) are not comparable
+    return [i for i in log.load(fingerprint) if i.get("split") == repr(_split(cv))]
+
+def _trial(reg, params, x, y, cv, n_jobs, fingerprint):
+    t1 = time.time()
+    scores = cross_evaluate(reg.set_params(**params), x, y, n_jobs=n_jobs, splitter=_split(cv))
+    return {"params": dict((k, plain_value(v)) for k, v in params.items()), "fingerprint": fingerprint,
+            "split": repr(_split(cv)),
+            "mse": scores["mse"].tolist(), "mae": scores["mae"].tolist(), "r2": scores["r2"].tolist(),
+            "fit_time": scores["fit_time"].tolist(), "seconds": time.time() - t1, "time": time.time()}
+
+def _finish(reg, trials, x, y, refit):
+    # best by mean cv r2, the score BayesSearchCV / GridSearchCV rank on
+    if len(trials) == 0:
+        print("no finished trials, nothing to refit")
+        return None
+    best = max(trials, key=lambda i: np.mean(i["r2"]))
+    reg = clone(reg).set_params(**best["params"])
+    if (refit == True):
+        reg.fit(x, y)
+    reg.best_params_ = best["params"]
+    reg.best_score_ = np.mean(best["r2"])
+    reg.trials_ = trials
+    print(reg.best_params_)
+    print(reg.best_score_)
+    return reg
+
+def bayes_search(reg, space, x, y, log_file, n_iter=100, cv=3, n_jobs=None, deadline=None,
+                 random_state=42, refit=True):
+    """Resumable skopt search, drop-in for BayesSearchCV(...).fit(x, y).
+
+    Input: estimator, dict of skopt dimensions (one-value lists are fixed
+    settings), training data, trial log file, total trials, folds,
+    parallel folds, seconds this run may take, seed, refit the best
+    setting on all of x.
+    Output: estimator with the best settings, best_params_, best_score_
+    (mean cv r2) and trials_, None when no trial finished. Trials already in the log for the same data
+    are told to the optimizer first, so a restarted search continues with
+    the surrogate where the killed one stopped.
+    """
+    from skopt import Optimizer
+    from skopt.space import Categorical, Space
+
+    fixed, search = _split_space(space)
+    names = sorted(search.keys())
+    dims = [search[i] if not isinstance(search[i], list) else Categorical(search[i]) for i in names]
+    x = np.asarray(x)
+    fingerprint = data_fingerprint(x, y)
+    log = TrialLog(log_file)
+
+    # only trials of this search space count toward n_iter and warm the surrogate
+    space = Space(dims)
+    trials = []
+    xs, ys = [], []
+    for trial in _load(log, fingerprint, cv):
+        if sorted(trial["params"].keys()) != sorted(names + list(fixed.keys())):
+            continue
+        if any(trial["params"][i] != fixed[i] for i in fixed):
+            continue
+        point = [trial["params"][i] for i in names]
+        if point in space:
+            trials.append(trial)
+            xs.append(point)
+            ys.append(-np.mean(trial["r2"]))
+    # offset the seed so a resumed run does not replay the first run's random start
+    opt = Optimizer(dims, random_state=random_state + len(xs))
+    if len(xs) > 0:
+        print("resuming from " + str(len(xs)) + " trials in " + log_file)
+        opt.tell(xs, ys)
+
+    t_start = time.time()
+    base = clone(reg).set_params(**fixed)
+    while len(trials) < n_iter:
+        if deadline is not None and time.time() - t_start > deadline:
+            print("deadline reached after " + str(len(trials)) + " trials")
+            break
+        point = opt.ask()
+        params = dict(fixed)
+        params.update(zip(names, point))
+        trial = _trial(clone(base), params, x, y, cv, n_jobs, fingerprint)
+        log.append(trial)
+        trials.append(trial)
+        opt.tell(point, -np.mean(trial["r2"]))
+        print(str(len(trials)) + " / " + str(n_iter) + " r2: " + str(np.mean(trial["r2"])) + " " + params_key(params))
+
+    return _finish(reg, trials, x, y, refit)
+
+def grid_search(reg, grid, x, y, log_file, cv=3, n_jobs=None, deadline=None, refit=True):
+    """Resumable grid search, drop-in for GridSearchCV(...).fit(x, y).
+
+    Same inputs and output as bayes_search with a GridSearchCV-style
+    grid; settings already in the log for the same data are skipped, and
+    logged settings outside the grid are left out of the ranking.
+    """
+    x = np.asarray(x)
+    fingerprint = data_fingerprint(x, y)
+    log = TrialLog(log_file)
+    # only logged settings that are in this grid are reused and ranked
+    keys = set(params_key(i) for i in ParameterGrid(grid))
+    trials = [i for i in _load(log, fingerprint, cv) if params_key(i["params"]) in keys]
+    done = set(params_key(i["params"]) for i in trials)
+    todo = [i for i in ParameterGrid(grid) if params_key(i) not in done]
+    print("grid: " + str(len(done)) + " done, " + str(len(todo)) + " to go")
+
+    t_start = time.time()
+    for ind, params in enumerate(todo):
+        if deadline is not None and time.time() - t_start > deadline:
+            print("deadline reached, " + str(len(todo) - ind) + " settings left")
+            break
+        trial = _trial(clone(reg), params, x, y, cv, n_jobs, fingerprint)
+        log.append(trial)
+        trials.append(trial)
+        print(str(ind + 1) + " / " + str(len(todo)) + " r2: " + str(np.mean(trial["r2"])) + " " + params_key(params))
+
+    return _finish(reg, trials, x, y, refit)
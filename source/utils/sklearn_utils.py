@@ -2,13 +2,10 @@ import sklearn.utils.fixes
 from numpy.ma import MaskedArray
 sklearn.utils.fixes.MaskedArray = MaskedArray
 
-import time, sigopt
+import time
 from boruta import BorutaPy
 import numpy as np
 
-from sigopt import Connection
-from skopt.callbacks import DeadlineStopper, CheckpointSaver
-from skopt.searchcv import BayesSearchCV
 from skopt.space import Real, Integer
 
 from sklearn.svm import SVR
@@ -20,37 +17,42 @@ from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor,\
     ExtraTreesRegressor
+from sklearn.multioutput import MultiOutputRegressor
 from sklearn.gaussian_process.kernels import DotProduct, WhiteKernel
-from sklearn.model_selection import train_test_split, GridSearchCV, cross_val_score, ShuffleSplit
+from sklearn.model_selection import train_test_split
 
-def evaluate_model(reg, x, y):
-    cv = ShuffleSplit(n_splits=3)
-    cv_mse = cross_val_score(reg, x, y, cv=cv, scoring = "neg_mean_squared_error")
-    cv_mae = cross_val_score(reg, x, y, cv=cv, scoring = "neg_mean_absolute_error")
-    cv_r2 = cross_val_score(reg, x, y, cv=cv, scoring = "r2")
-    return (np.mean(cv_mse), np.mean(cv_mae), np.mean(cv_r2))
+from source.utils import study_util
+from source.utils.metrics_util import as_float32, timed_fit, report, cross_evaluate
+from source.utils.search_util import bayes_search, grid_search
 
-def bayes_sigopt(x, y, method="sgd"):
+def evaluate_model(reg, x, y, n_jobs=None, cache=False, fingerprint=None):
+    # Input: unfitted estimator, features, target, parallel folds, fold cache on/off,
+    # data_fingerprint(x, y) when the caller already has it
+    # Output: mean negative mse, mean negative mae, mean r2 over 3 seeded folds
+    scores = cross_evaluate(reg, x, y, n_splits=3, n_jobs=n_jobs, cache=cache, fingerprint=fingerprint)
+    return (-np.mean(scores["mse"]), -np.mean(scores["mae"]), np.mean(scores["r2"]))
+
+def bayes_sigopt(x, y, method="sgd", fingerprint=None):
+    # fingerprint: data_fingerprint(x, y), computed once per study by the caller
 
-    conn = Connection(client_token="BQQYYDTUYJASQCFMUKVLJJEAWAESEKTAHTFKSBHTVBACYTDZ")
     if (method == "grad"):
         print(".........gradient boost optimization selected.........")
         params = {"loss": "ls", "criterion":"mse",
-                  "n_estimators": sigopt.get_parameter("n_estimators", default=100),
-                  "learning_rate": sigopt.get_parameter("learning_rate", default=0.1),
-                  "subsample": sigopt.get_parameter("subsample", default=0.5),
-                  "max_depth": sigopt.get_parameter("max_depth", default=10),
-                  "tol": sigopt.get_parameter("tol", default=0.001)}
+                  "n_estimators": study_util.get_parameter("n_estimators", default=100),
+                  "learning_rate": study_util.get_parameter("learning_rate", default=0.1),
+                  "subsample": study_util.get_parameter("subsample", default=0.5),
+                  "max_depth": study_util.get_parameter("max_depth", default=10),
+                  "tol": study_util.get_parameter("tol", default=0.001)}
         reg = GradientBoostingRegressor(**params)
 
     elif (method == "svr"):
         print(".........svr optimization selected.........")
-        params = {"C": sigopt.get_parameter("C", default=0.1),
-                  "gamma": sigopt.get_parameter("gamma", default=0.001),
-                  "epsilon": sigopt.get_parameter("epsilon", default=0.1),
-                  "degree": sigopt.get_parameter("degree", default=8),
-                  "coef0": sigopt.get_parameter("coef0", default=0.4),
-                  "cache_size": sigopt.get_parameter("cache_size", default=1000),
+        params = {"C": study_util.get_parameter("C", default=0.1),
+                  "gamma": study_util.get_parameter("gamma", default=0.001),
+                  "epsilon": study_util.get_parameter("epsilon", default=0.1),
+                  "degree": study_util.get_parameter("degree", default=8),
+                  "coef0": study_util.get_parameter("coef0", default=0.4),
+                  "cache_size": study_util.get_parameter("cache_size", default=1000),
                   "kernel":"poly"
                   }
         reg = SVR(**params)
@@ -58,12 +60,12 @@ def bayes_sigopt(x, y, method="sgd"):
     elif (method == "bayes"):
 
         print(".........bayes optimization selected.........")
-        params = {"n_iter": sigopt.get_parameter("n_iter", default=1000),
-                  "tol": sigopt.get_parameter("tol", default=0.0001),
-                  "alpha_1": sigopt.get_parameter("alpha_1", default=0.01),
-                  "alpha_2": sigopt.get_parameter("alpha_2", default=0.01),
-                  "lambda_1": sigopt.get_parameter("lambda_1", default=0.01),
-                  "lambda_2": sigopt.get_parameter("lambda_2", default=0.01)
+        params = {"n_iter": study_util.get_parameter("n_iter", default=1000),
+                  "tol": study_util.get_parameter("tol", default=0.0001),
+                  "alpha_1": study_util.get_parameter("alpha_1", default=0.01),
+                  "alpha_2": study_util.get_parameter("alpha_2", default=0.01),
+                  "lambda_1": study_util.get_parameter("lambda_1", default=0.01),
+                  "lambda_2": study_util.get_parameter("lambda_2", default=0.01)
                   }
         reg = BayesianRidge(**params)
 
@@ -71,8 +73,8 @@ def bayes_sigopt(x, y, method="sgd"):
 
         print(".........kernel optimization selected.........")
         params = {"kernel":"rbf",
-                  "alpha": sigopt.get_parameter("alpha", default=0.001),
-                  "gamma": sigopt.get_parameter("gamma", default=0.001)
+                  "alpha": study_util.get_parameter("alpha", default=0.001),
+                  "gamma": study_util.get_parameter("gamma", default=0.001)
                   }
         reg = KernelRidge(**params)
 
@@ -80,10 +82,10 @@ def bayes_sigopt(x, y, method="sgd"):
 
         print(".........sgd optimization selected.........")
         params = {"penalty":"l1", "loss":'squared_loss',
-                     "l1_ratio": sigopt.get_parameter("l1_ratio", default=0.2),
-                     "tol": sigopt.get_parameter("tol", default=0.01),
-                     "epsilon": sigopt.get_parameter("epsilon", default=0.01),
-                     "eta0": sigopt.get_parameter("eta0", default=0.02)
+                     "l1_ratio": study_util.get_parameter("l1_ratio", default=0.2),
+                     "tol": study_util.get_parameter("tol", default=0.01),
+                     "epsilon": study_util.get_parameter("epsilon", default=0.01),
+                     "eta0": study_util.get_parameter("eta0", default=0.02)
                      }
         reg = SGDRegressor(**params)
 
@@ -91,9 +93,9 @@ def bayes_sigopt(x, y, method="sgd"):
 
         print(".........random forest optimization selected.........")
         temp_dict = {"n_jobs": 4,
-                     "max_depth": sigopt.get_parameter("max_depth", default=5),
-                     "min_samples_split": sigopt.get_parameter("min_samples_split", default=3),
-                     "n_estimators": sigopt.get_parameter("n_estimators", default=100)
+                     "max_depth": study_util.get_parameter("max_depth", default=5),
+                     "min_samples_split": study_util.get_parameter("min_samples_split", default=3),
+                     "n_estimators": study_util.get_parameter("n_estimators", default=100)
                      }
 
         reg = RandomForestRegressor(**temp_dict)
@@ -102,10 +104,10 @@ def bayes_sigopt(x, y, method="sgd"):
 
         print(".........extra tree optimization selected.........")
         temp_dict = {"n_jobs": 4,
-                     "max_depth": sigopt.get_parameter("max_depth", default=5),
-                     "min_samples_split": sigopt.get_parameter("min_samples_split", default=3),
-                     "min_samples_leaf": sigopt.get_parameter("min_samples_leaf", default=2),
-                     "n_estimators": sigopt.get_parameter("n_estimators", default=400)
+                     "max_depth": study_util.get_parameter("max_depth", default=5),
+                     "min_samples_split": study_util.get_parameter("min_samples_split", default=3),
+                     "min_samples_leaf": study_util.get_parameter("min_samples_leaf", default=2),
+                     "n_estimators": study_util.get_parameter("n_estimators", default=400)
                      }
 
         reg = ExtraTreesRegressor(**temp_dict)
@@ -115,7 +117,7 @@ def bayes_sigopt(x, y, method="sgd"):
         print(".........gaussian optimization selected.........")
         kernel = DotProduct() + WhiteKernel()
         params = {"kernel": kernel,
-                     "alpha": sigopt.get_parameter("alpha", default=0.01)
+                     "alpha": study_util.get_parameter("alpha", default=0.01)
                      }
         reg = GaussianProcessRegressor(**params)
 
@@ -127,25 +129,24 @@ def bayes_sigopt(x, y, method="sgd"):
     else:
         print(".........alternative, sgd optimization selected.........")
         params = {"penalty":"l1", "loss":'squared_loss',
-                     "l1_ratio": sigopt.get_parameter("l1_ratio", default=0.2),
-                     "tol": sigopt.get_parameter("tol", default=0.01),
-                     "epsilon": sigopt.get_parameter("epsilon", default=0.01),
-                     "eta0": sigopt.get_parameter("eta0", default=0.02)
+                     "l1_ratio": study_util.get_parameter("l1_ratio", default=0.2),
+                     "tol": study_util.get_parameter("tol", default=0.01),
+                     "epsilon": study_util.get_parameter("epsilon", default=0.01),
+                     "eta0": study_util.get_parameter("eta0", default=0.02)
                      }
         reg = SGDRegressor(**params)
 
-    try:
-        (mse, mae, r2) = evaluate_model(reg, x, y)
-    except:
-        (mse, mae, r2) = evaluate_model(reg, list(x), y)
+    # xgboost folds share the gpu
+    (nmse, nmae, r2) = evaluate_model(reg, np.asarray(x), y, n_jobs=1 if method == "xgboost" else None, cache=True,
+                                      fingerprint=fingerprint)
 
-    print("Current MSE: " + str(mse))
-    print("Current MAE: " + str(mae))
+    print("Current MSE: " + str(-nmse))
+    print("Current MAE: " + str(-nmae))
     print("Current R_2: " + str(r2))
-    sigopt.log_metric("mse", mse)
-    sigopt.log_metric("mae", mae)
-    sigopt.log_metric("r2", r2)
-    sigopt.log_metric("nmse", mse)
+    study_util.log_metric("mse", -nmse)
+    study_util.log_metric("mae", -nmae)
+    study_util.log_metric("r2", r2)
+    study_util.log_metric("nmse", nmse)
 
 def bayes(x, y, method="sgd", des = "rdkit"):
 
@@ -259,31 +260,19 @@ def bayes(x, y, method="sgd", des = "rdkit"):
     else:
         print("........." + method + " optimization selected.........")
 
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-        reg = BayesSearchCV(reg, params, n_iter=100, verbose=3, cv=3, n_jobs=4)
+        x_train, x_test, y_train, y_test = train_test_split(np.asarray(x), y, test_size=0.2, random_state=42)
 
+        # every trial lands in the log, rerunning the same command resumes the search
         time_to_stop = 60 * 60 * 47
-        #ckpt_loc = "../data/train/bayes/ckpt_bayes_" + des + ".pkl"
-        #checkpoint_callback = CheckpointSaver(ckpt_loc)
-        #reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop), checkpoint_callback])
-        reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop)])
-
-        print(reg.best_params_)
-        print(reg.best_score_)
-        score = str(reg.score(x_test, y_test))
-        print("Score on test data: " + score)
-        score = str(reg.score(list(x_test), y_test))
-        print("Score on test data: " + score)
-        score = str(mean_squared_error(reg.predict(x_test), y_test))
-        print("MSE score:   " + score)
-        score = str(mean_absolute_error(reg.predict(x_test), y_test))
-        print("MAE score:   " + score)
-        score = str(r2_score(reg.predict(x_test), y_test))
-        print("r2 score:   " + score)
+        log_file = "../data/train/bayes/trials_bayes_" + method + "_" + des + ".jsonl"
+        reg = bayes_search(reg, params, x_train, y_train, log_file, n_iter=100, cv=3, n_jobs=4,
+                           deadline=time_to_stop)
+        if reg is not None:
+            reg.metrics_ = report(reg, x_test, y_test, name="Score on test data")
 
     return reg
 
-def grid(x, y, method="sgd"):
+def grid(x, y, method="sgd", des="rdkit"):
     if (method == "nn"):
         print(".........neural network grid optimization selected.........")
         params = {"alpha": [1e-10, 1e-7, 1e-4, 1e-1],
@@ -397,22 +386,17 @@ def grid(x, y, method="sgd"):
         from source.utils.xgboost_util import xgboost_grid
 
         print(".........xgboost grid optimization selected.........")
-        reg = xgboost_grid(x, y)
+        reg = xgboost_grid(x, y, "../data/train/grid/trials_grid_xgboost_" + des + ".jsonl")
         return reg
     else:
 
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
+        x_train, x_test, y_train, y_test = train_test_split(np.asarray(x), y, test_size=0.2, random_state=42)
 
-        reg = GridSearchCV(reg, params, verbose=6, cv=3)
         time_to_stop = 60 * 60 * 23
-        ckpt_loc = "../data/train/bayes/ckpt_grid_" + method + ".pkl"
-        checkpoint_callback = CheckpointSaver(ckpt_loc)
-        #reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop), checkpoint_callback])
-        reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop)])
-
-        print(reg.best_params_)
-        print(reg.best_score_)
-        print("Score on test data: " + str(reg.score(x_test, y_test)))
+        log_file = "../data/train/grid/trials_grid_" + method + "_" + des + ".jsonl"
+        reg = grid_search(reg, params, x_train, y_train, log_file, cv=3, deadline=time_to_stop)
+        if reg is not None:
+            reg.metrics_ = report(reg, x_test, y_test, name="Score on test data")
 
         return reg
 
@@ -423,308 +407,137 @@ def rand(x, y, method="sgd", desc = "morg"):
     xgboost_rand(x,y, csv_loc)
     return True
 
-def sgd(x, y, scale):
-    x = np.array(x)
-    y = np.array(y)
-
-    params = {"loss": 'squared_loss',
-              "max_iter": 10 ** 7,
-              "tol": 0.0000001,
-              "penalty": "l2", "l1_ratio": 0.15,
-              "epsilon": 0.01,
-              "learning_rate": 'invscaling'
-              }
-
+# estimators that fit an (n_samples, n_targets) y natively, everything
+# else is wrapped in a MultiOutputRegressor for multi_target
+NATIVE_MULTI = ["rf", "extra", "kernel", "gaussian", "nn"]
+
+def build_reg(algo):
+    """Unfitted estimator with the settings the single-target trainers use."""
+    if (algo == "nn"):
+        return MLPRegressor(random_state=1, max_iter=100000, learning_rate_init=0.00001, learning_rate="adaptive",
+                            early_stopping=True, tol=1e-7, shuffle=True, solver="adam", activation="relu",
+                            hidden_layer_sizes=(1000,), verbose=False, alpha=0.00001)
+    elif (algo == "rf"):
+        return RandomForestRegressor(max_depth=20, n_estimators=500, bootstrap=True, min_samples_leaf=2,
+                                     verbose=False, n_jobs=4)
+    elif (algo == "extra"):
+        return ExtraTreesRegressor(n_estimators=500, min_samples_split=2, min_samples_leaf=2,
+                                   n_jobs=16, verbose=False)
+    elif (algo == "grad"):
+        return GradientBoostingRegressor(loss="ls", n_estimators=2000, learning_rate=0.1, subsample=0.8,
+                                         criterion="mse", max_depth=10, tol=0.0001)
+    elif (algo == "svr"):
+        return SVR(kernel='poly', C=100, gamma='auto', degree=6, epsilon=.1, coef0=0.5, cache_size=4000)
+    elif (algo == "bayes"):
+        return BayesianRidge(n_iter=10000, tol=1e-7, copy_X=True, alpha_1=1e-03, alpha_2=1e-03,
+                             lambda_1=1e-03, lambda_2=1e-03)
+    elif (algo == "kernel"):
+        # reg = KernelRidge(alpha=0.0001, degree = 10,kernel = "polynomial")
+        return KernelRidge(kernel='rbf', alpha=0.00005, gamma=0.0001)
+    elif (algo == "gaussian"):
+        kernel = DotProduct() + WhiteKernel()
+        return GaussianProcessRegressor(kernel=kernel, alpha=1e-10, random_state=0)
+    elif (algo == "xgboost"):
+        from source.utils.xgboost_util import xgboost_reg
+        return xgboost_reg()
+    else:
+        return SGDRegressor(loss='squared_loss', max_iter=10 ** 7, tol=0.0000001, penalty="l2",
+                            l1_ratio=0.15, epsilon=0.01, learning_rate='invscaling')
+
+def multi_target(x, y, scales, algo="sgd", targets=("HOMO", "HOMO-1", "diff"), n_jobs=None):
+    """Fit every target column of y on one split, predict once.
+
+    Input: feature matrix, (n_samples, n_targets) scaled targets, the
+    scale of each target, algorithm name as in train.py, target names,
+    workers for the per-target fan-out (None: one per target).
+    Output: fitted estimator and a dict target -> (mse, mae, r2, scaled mae).
+    Native multi-output estimators see all targets at once, the rest are
+    fitted per target in parallel on the shared feature matrix.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
     x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    reg = SGDRegressor(**params)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-
-    score = str(reg.score(list(x_test), y_test))
-    print("stochastic gradient descent score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
 
+    reg = build_reg(algo)
+    if (algo not in NATIVE_MULTI):
+        if (algo == "xgboost"):
+            # one gpu, targets take turns
+            n_jobs = 1
+        reg = MultiOutputRegressor(reg, n_jobs=n_jobs if n_jobs is not None else y.shape[1])
+
+    _, time_el = timed_fit(reg, x_train, y_train)
+    y_pred = np.asarray(reg.predict(as_float32(x_test))).reshape(y_test.shape)
+
+    scores = {}
+    for ind, target in enumerate(targets):
+        mse = mean_squared_error(y_test[:, ind], y_pred[:, ind])
+        mae = mean_absolute_error(y_test[:, ind], y_pred[:, ind])
+        r2 = r2_score(y_test[:, ind], y_pred[:, ind])
+        scores[target] = (mse, mae, r2, scales[ind] * mae)
+        print("........." + target + ".........")
+        print("MSE score:   " + str(mse) + " time: " + str(time_el))
+        print("MAE score:   " + str(mae) + " time: " + str(time_el))
+        print("r2 score:   " + str(r2) + " time: " + str(time_el))
+        print("scaled MAE")
+        print(scales[ind] * mae)
+
+    return reg, scores
+
+def fit_report(reg, x, y, scale, name):
+    # Input: unfitted estimator, features, scaled target, target scale, label
+    # Output: the fitted estimator, its metrics record in reg.metrics_
+    x_train, x_test, y_train, y_test = train_test_split(np.asarray(x), y, test_size=0.2, random_state=42)
+    _, time_el = timed_fit(reg, x_train, y_train)
+    reg.metrics_ = report(reg, x_test, y_test, scale, time_el, name)
     return reg
 
-def gradient_boost_reg(x, y, scale):
-    params = {"loss": "ls",
-              "n_estimators": 2000,
-              "learning_rate": 0.1,
-              "subsample": 0.8,
-              "criterion": "mse",
-              "max_depth": 10,
-              "tol": 0.0001
-              }
-
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    reg = GradientBoostingRegressor(**params)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-    score = reg.score(list(x_test), y_test)
-    print("gradient boost score:                " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+def sgd(x, y, scale):
+    return fit_report(build_reg("sgd"), x, y, scale, "stochastic gradient descent")
 
-    return reg
+def gradient_boost_reg(x, y, scale):
+    return fit_report(build_reg("grad"), x, y, scale, "gradient boost")
 
 def random_forest(x, y, scale):
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-
-    params = {"max_depth": 20,
-              "n_estimators": 500,
-              "bootstrap": True,
-              "min_samples_leaf": 2,
-              "n_jobs": 16,
-              "verbose": False,
-              "n_jobs": 4
-              }
-
-    reg = RandomForestRegressor(**params)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-    score = reg.score(list(x_test), y_test)
-    print("random forest score:                 " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
-
-    return reg
+    return fit_report(build_reg("rf"), x, y, scale, "random forest")
 
 def extra_trees(x, y, scale):
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-
-    params = {"n_estimators": 500,
-              "min_samples_split": 2,
-              "min_samples_leaf": 2,
-              "n_jobs": 16,
-              "verbose": False,
-              }
-
-    reg = ExtraTreesRegressor(**params)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-    score = reg.score(list(x_test), y_test)
-    print("Extra trees score:                 " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
-
-    return reg
+    return fit_report(build_reg("extra"), x, y, scale, "Extra trees")
 
 def gaussian(x, y, scale):
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    kernel = DotProduct() + WhiteKernel()
-    reg = GaussianProcessRegressor(kernel=kernel, alpha=1e-10, random_state=0)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-    score = reg.score(list(x_test), y_test)
-    print("gaussian process score:              " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
-    return reg
+    return fit_report(build_reg("gaussian"), x, y, scale, "gaussian process")
 
 def kernel(x, y, scale):
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    # reg = KernelRidge(alpha=0.0001, degree = 10,kernel = "polynomial")
-    reg = KernelRidge(kernel='rbf', alpha=0.00005, gamma=0.0001)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-    score = reg.score(list(x_test), y_test)
-    print("kernel regression score:             " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
-    return reg
+    return fit_report(build_reg("kernel"), x, y, scale, "kernel regression")
 
 def bayesian(x, y, scale):
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-
-    reg = BayesianRidge(n_iter=10000, tol=1e-7, copy_X=True, alpha_1=1e-03, alpha_2=1e-03,
-                        lambda_1=1e-03, lambda_2=1e-03)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-    score = reg.score(list(x_test), y_test)
-    print("bayesian score:                      " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
-
-    return reg
+    return fit_report(build_reg("bayes"), x, y, scale, "bayesian")
 
 def svr(x, y, scale):
     # change C
     # scale data
     # L1/L2 normalization
 
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
+    x_train, x_test, y_train, y_test = train_test_split(np.asarray(x), y, test_size=0.2, random_state=42)
+    x_test = as_float32(x_test)
 
     svr_rbf = SVR(kernel='rbf', C=0.001, gamma=0.1, epsilon=.1, cache_size=4000)
-    est_rbf = svr_rbf
     svr_lin = SVR(kernel='linear', C=0.1, gamma='auto', cache_size=4000)
-    est_lin = svr_lin
-    svr_poly = SVR(kernel='poly', C=100, gamma='auto', degree=6, epsilon=.1, coef0=0.5, cache_size=4000)
-    est_poly = svr_poly
-
-    t1 = time.time()
-    est_rbf.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_rbf = t2 - t1
-    s1 = svr_rbf.score(list(x_test), y_test)
-
-    t1 = time.time()
-    est_lin.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_svr = t2 - t1
-    s2 = svr_lin.score(list(x_test), y_test)
-
-    t1 = time.time()
-    est_poly.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_poly = t2 - t1
-    score = svr_poly.score(list(x_test), y_test)
-
-    print("linear svr score:                    " + str(s2) + " time: " + str(time_rbf))
-    print("radial basis svr score:              " + str(s1) + " time: " + str(time_svr))
-    print("polynomial svr score:                " + str(score) + " time: " + str(time_poly))
-
-    score = str(mean_squared_error(svr_poly.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_poly))
-
-    score = str(mean_absolute_error(svr_poly.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_poly))
-
-    score = str(r2_score(svr_poly.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_poly))
-    
-    score_mae = mean_absolute_error(svr_poly.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+    svr_poly = build_reg("svr")
 
-    return svr_poly
-
-def sk_nn(x, y, scale):
-    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    reg = MLPRegressor(random_state=1, max_iter=100000, learning_rate_init=0.00001, learning_rate="adaptive",
-                       early_stopping=True, tol=1e-7, shuffle=True, solver="adam", activation="relu",
-                       hidden_layer_sizes=(1000,), verbose=False, alpha=0.00001)
-
-    t1 = time.time()
-    reg.fit(list(x_train), y_train)
-    t2 = time.time()
-    time_el = t2 - t1
-
-    score = reg.score(list(x_test), y_test)
-    print("Neural Network score:                " + str(score) + " time: " + str(time_el))
+    _, time_rbf = timed_fit(svr_rbf, x_train, y_train)
+    s1 = svr_rbf.score(x_test, y_test)
+    _, time_lin = timed_fit(svr_lin, x_train, y_train)
+    s2 = svr_lin.score(x_test, y_test)
+    _, time_poly = timed_fit(svr_poly, x_train, y_train)
 
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score) + " time: " + str(time_el))
+    print("linear svr score:                    " + str(s2) + " time: " + str(time_lin))
+    print("radial basis svr score:              " + str(s1) + " time: " + str(time_rbf))
+    svr_poly.metrics_ = report(svr_poly, x_test, y_test, scale, time_poly, "polynomial svr")
 
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score) + " time: " + str(time_el))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score) + " time: " + str(time_el))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+    return svr_poly
 
-    return reg
+def sk_nn(x, y, scale):
+    return fit_report(build_reg("nn"), x, y, scale, "Neural Network")
 
 def boruta(x, y):
 
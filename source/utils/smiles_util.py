@@ -0,0 +1,131 @@
+import os
+import sys
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import pybel
+from rdkit import Chem
+try:
+    from selfies import encoder
+except ImportError:
+    # the chemvae environment ships without selfies
+    encoder = None
+
+SMILES_CACHE = "../data/desc/cache/smiles.sqlite"
+
+class SmilesCache(object):
+    """xyz -> smiles / canonical smiles / selfies strings on disk.
+
+    Rows are keyed on the absolute path and only trusted while the file's
+    mtime and size are unchanged. A NULL smiles marks a file Open Babel
+    could not read, so it is not retried until the file changes.
+    """
+    def __init__(self, cache_file=SMILES_CACHE):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        self.conn = sqlite3.connect(cache_file)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS strings (path TEXT PRIMARY KEY, mtime REAL, "
+                          "size INTEGER, smiles TEXT, canonical TEXT, selfies TEXT)")
+
+    def lookup(self, paths):
+        """Split paths into fresh rows (dict abspath -> row dict) and stale/missing paths."""
+        hits = {}
+        misses = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            row = self.conn.execute("SELECT mtime, size, smiles, canonical, selfies FROM strings "
+                                    "WHERE path = ?", (os.path.abspath(path),)).fetchone()
+            if row is None or row[0] != stat.st_mtime or row[1] != stat.st_size:
+                misses.append(path)
+            else:
+                hits[os.path.abspath(path)] = {"smiles": row[2], "canonical": row[3], "selfies": row[4]}
+        return hits, misses
+
+    def put(self, path, mtime, size, row):
+        self.conn.execute("INSERT OR REPLACE INTO strings VALUES (?, ?, ?, ?, ?, ?)",
+                          (os.path.abspath(path), mtime, size, row["smiles"], row["canonical"], row["selfies"]))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def _to_selfies(smi):
+    if encoder is None or smi is None:
+        return None
+    try:
+        return encoder(smi)
+    except:
+        return None
+
+def _convert_chunk(paths):
+    # worker: perceive bonds once per xyz, all three strings from one Mol
+    ret = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        row ={"smiles": None, "canonical": None, "selfies": None}
+        try:
+            mol = next(pybel.readfile("xyz", path))
+            row["smiles"] = mol.write(format="smi").split()[0].strip()
+        except:
+            ret.append((path, stat.st_mtime, stat.st_size, row))
+            continue
+        try:
+            row["canonical"] = Chem.CanonSmiles(row["smiles"])
+        except:
+            pass
+        row["selfies"] = _to_selfies(row["smiles"])
+        ret.append((path, stat.st_mtime, stat.st_size, row))
+    return ret
+
+def xyz_strings(paths, n_jobs=None, chunk_size=256, cache=True, cache_file=SMILES_CACHE):
+    """Smiles, canonical smiles and selfies for a list of xyz files.
+
+    Input: xyz paths, number of workers (None uses every core), files per
+    task, whether to read/extend the SmilesCache.
+    Output: dict path -> {"smiles", "canonical", "selfies"}, keyed by the
+    paths as given. Files Open Babel cannot read are left out; canonical or
+    selfies is None where only that step failed.
+    """
+    hits = {}
+    misses = list(paths)
+    if (cache == True):
+        smiles_cache = SmilesCache(cache_file)
+        hits, misses = smiles_cache.lookup(paths)
+        print("cached: " + str(len(hits)) + " to convert: " + str(len(misses)))
+
+    chunks = [misses[i:i + chunk_size] for i in range(0, len(misses), chunk_size)]
+    done = 0
+    if (len(chunks) > 0):
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            for ret in executor.map(_convert_chunk, chunks):
+                for path, mtime, size, row in ret:
+                    hits[os.path.abspath(path)] = row
+                    if (cache == True):
+                        smiles_cache.put(path, mtime, size, row)
+                if (cache == True):
+                    smiles_cache.commit()
+                done += len(ret)
+                sys.stdout.write("\r %s /" % done + str(len(misses)))
+                sys.stdout.flush()
+        print("")
+    if (cache == True):
+        smiles_cache.close()
+
+    strings = {}
+    for path in paths:
+        row = hits.get(os.path.abspath(path))
+        if row is None or row["smiles"] is None:
+            continue
+        if row["selfies"] is None:
+            # cached by an environment without selfies
+            row["selfies"] = _to_selfies(row["smiles"])
+        strings[path] = row
+    return strings
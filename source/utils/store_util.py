@@ -0,0 +1,251 @@
+import os
+import json
+import math
+import numpy as np
+import pandas as pd
+
+# descriptor store next to the legacy desc_calc_<dir>_<des>.pkl/.h5 tables:
+#   <prefix>.bits.npy   bit fingerprints, packed uint8 (N x ceil(n_bits / 8))
+#   <prefix>.f32.npy    dense descriptors, contiguous float32 (N x D)
+#   <prefix>.index.csv  name, HOMO, HOMO-1, diff, one row per matrix row
+#   <prefix>.meta.json  kind ("bits" or "dense"), shape, n_bits
+#   <prefix>.progress.json, <prefix>.names.json  only while a BlockWriter run is unfinished
+
+DESC_DIR = "../data/desc/"
+# rows unpacked / scaled at a time by the batched readers
+BATCH_SIZE = 4096
+
+def desc_prefix(dir_temp, des):
+    """../data/desc/<dir>/desc_calc_<dir>_<des>, shared by descalc and the readers."""
+    return DESC_DIR + dir_temp + "/desc_calc_" + dir_temp + "_" + des
+
+class PackedMatrix(object):
+    """Read-only view over a memory mapped packed-bit matrix.
+
+    Rows are only unpacked when indexed or in ``batches``, ``to_dense``
+    unpacks everything.
+    """
+    def __init__(self, packed, n_bits):
+        self.packed = packed
+        self.n_bits = n_bits
+        self.shape = (packed.shape[0], n_bits)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, item):
+        rows = self.packed[item]
+        return np.unpackbits(rows, axis=-1, count=self.n_bits)
+
+    def to_dense(self, dtype="float32"):
+        return self[:].astype(dtype)
+
+    def batches(self, batch_size=BATCH_SIZE, dtype="float32"):
+        for start in range(0, self.shape[0], batch_size):
+            yield self[start:start + batch_size].astype(dtype)
+
+    def to_sparse(self, batch_size=BATCH_SIZE):
+        # csr matrix of the set bits, built without a dense copy of the whole matrix
+        from scipy import sparse
+        return sparse.vstack([sparse.csr_matrix(i) for i in self.batches(batch_size, "float32")],
+                             format="csr")
+
+def scale_batched(mat, batch_size=BATCH_SIZE):
+    """preprocessing.scale of a store matrix, one batch in memory at a time.
+
+    Input: PackedMatrix or (memory mapped) array. Column means and
+    standard deviations are summed over batches, then a float32 output is
+    filled batch by batch; constant columns are only centered, as in
+    sklearn.
+    """
+    n, d = mat.shape
+    total = np.zeros((d,))
+    total_sq = np.zeros((d,))
+    for start in range(0, n, batch_size):
+        batch = np.asarray(mat[start:start + batch_size], dtype=np.float64)
+        total += batch.sum(axis=0)
+        total_sq += np.square(batch).sum(axis=0)
+    mean = total / n
+    std = np.sqrt(np.maximum(total_sq / n - np.square(mean), 0))
+    std[std == 0] = 1.0
+
+    out = np.empty((n, d), dtype=np.float32)
+    for start in range(0, n, batch_size):
+        batch = np.asarray(mat[start:start + batch_size], dtype=np.float64)
+        out[start:start + batch_size] = (batch - mean) / std
+    return out
+
+def store_paths(prefix):
+    return {"bits": prefix + ".bits.npy", "dense": prefix + ".f32.npy",
+            "index": prefix + ".index.csv", "meta": prefix + ".meta.json"}
+
+def has_store(prefix):
+    return os.path.isfile(store_paths(prefix)["meta"])
+
+def save_store(prefix, names, mat, homo=None, homo1=None, diff=None, bits=None):
+    """Write a descriptor matrix and its name/label index.
+
+    ``bits`` picks the packed format, when None it is used if every value
+    is 0 or 1. Returns the kind that was written.
+    """
+    paths = store_paths(prefix)
+    mat = np.asarray(mat)
+    if (mat.ndim != 2):
+        mat = np.vstack([np.asarray(i).flatten() for i in mat])
+    if (bits is None):
+        bits = bool(np.isin(mat, (0, 1)).all())
+
+    if (bits == True):
+        kind = "bits"
+        np.save(paths["bits"], np.packbits(mat.astype(np.uint8), axis=1))
+    else:
+        kind = "dense"
+        np.save(paths["dense"], np.ascontiguousarray(mat, dtype=np.float32))
+
+    index = pd.DataFrame({"name": list(names)})
+    if (homo is not None):
+        index["HOMO"] = homo
+        index["HOMO-1"] = homo1
+        index["diff"] = diff
+    write_index(prefix, index)
+
+    with open(paths["meta"], "w") as fp:
+        json.dump({"kind": kind, "shape": list(mat.shape), "n_bits": int(mat.shape[1])}, fp)
+    return kind
+
+def read_index(prefix):
+    return pd.read_csv(store_paths(prefix)["index"], dtype={"name": str},
+                       keep_default_na=False, na_values=[""])
+
+def write_index(prefix, index):
+    index.to_csv(store_paths(prefix)["index"], index=False)
+
+def load_store(prefix, mmap=True):
+    """Load a descriptor store without deserializing the matrix.
+
+    Returns the index frame and the matrix: a PackedMatrix for bit
+    fingerprints or a float32 array for dense ones, memory mapped when
+    ``mmap``.
+    """
+    paths = store_paths(prefix)
+    with open(paths["meta"]) as fp:
+        meta = json.load(fp)
+    mmap_mode = "r" if mmap else None
+
+    if (meta["kind"] == "bits"):
+        mat = PackedMatrix(np.load(paths["bits"], mmap_mode=mmap_mode), meta["n_bits"])
+    else:
+        mat = np.load(paths["dense"], mmap_mode=mmap_mode)
+    return read_index(prefix), mat
+
+class BlockWriter(object):
+    """Streams fixed-size float32 row blocks into a dense store.
+
+    The .f32.npy file is preallocated for every name and memory mapped. The
+    names go to <prefix>.names.json once, and each finished block is
+    flushed and its index appended to the small <prefix>.progress.json
+    (with the rows that failed), so a killed run picks up at the first
+    block not on disk. A run over a different name list or ``params``
+    starts over. ``finish`` drops the rows that failed and writes the index
+    and meta files.
+    """
+    def __init__(self, prefix, names, width, block_size=2048, params=None):
+        self.prefix = prefix
+        self.paths = store_paths(prefix)
+        self.names = list(names)
+        self.width = int(width)
+        self.block_size = int(block_size)
+        self.n_blocks = int(math.ceil(len(self.names) / float(self.block_size)))
+        self.progress_file = prefix + ".progress.json"
+        self.names_file = prefix + ".names.json"
+        self.state = {"n": len(self.names), "width": self.width, "block_size": self.block_size,
+                      "params": params if params is not None else {}, "done": [], "failed": []}
+
+        # a half written store must not look finished to has_store
+        if os.path.isfile(self.paths["meta"]):
+            os.remove(self.paths["meta"])
+
+        resume = False
+        if (os.path.isfile(self.progress_file) and os.path.isfile(self.names_file) and
+                os.path.isfile(self.paths["dense"])):
+            try:
+                with open(self.progress_file) as fp:
+                    old = json.load(fp)
+                resume = all(old[i] == self.state[i] for i in ["n", "width", "block_size", "params"])
+                if (resume == True):
+                    with open(self.names_file) as fp:
+                        resume = json.load(fp) == self.names
+            except (ValueError, KeyError):
+                resume = False
+            if (resume == True):
+                self.state = old
+
+        if (resume == True):
+            self.mat = np.load(self.paths["dense"], mmap_mode="r+")
+        else:
+            self.mat = np.lib.format.open_memmap(self.paths["dense"], mode="w+", dtype=np.float32,
+                                                 shape=(len(self.names), self.width))
+            with open(self.names_file, "w") as fp:
+                json.dump(self.names, fp)
+            self._save_state()
+
+    def _save_state(self):
+        temp = self.progress_file + ".tmp"
+        with open(temp, "w") as fp:
+            json.dump(self.state, fp)
+        os.replace(temp, self.progress_file)
+
+    def block(self, i):
+        return self.names[i * self.block_size:(i + 1) * self.block_size]
+
+    def todo(self):
+        done = set(self.state["done"])
+        return [i for i in range(self.n_blocks) if i not in done]
+
+    def write(self, i, rows, ok):
+        """Store block i; ``rows`` has one row per name, ``ok`` flags the valid ones."""
+        start = i * self.block_size
+        self.mat[start:start + len(rows)] = np.asarray(rows, dtype=np.float32)
+        self.mat.flush()
+        self.state["done"].append(int(i))
+        self.state["failed"].extend(start + int(j) for j in np.flatnonzero(~np.asarray(ok, dtype=bool)))
+        self._save_state()
+
+    def finish(self, label_fn=None):
+        """Compact out failed rows, write index/meta and drop the progress file.
+
+        ``label_fn(names)`` returns homo, homo1, diff for the kept names.
+        Returns the kept names.
+        """
+        ok = np.ones((len(self.names),), dtype=bool)
+        ok[self.state["failed"]] = False
+        names = [name for name, keep in zip(self.names, ok) if keep]
+
+        if not ok.all():
+            # copy the good rows block by block so memory stays bounded
+            temp = self.paths["dense"] + ".tmp.npy"
+            out = np.lib.format.open_memmap(temp, mode="w+", dtype=np.float32,
+                                            shape=(len(names), self.width))
+            row = 0
+            for i in range(self.n_blocks):
+                start = i * self.block_size
+                keep = ok[start:start + self.block_size]
+                rows = self.mat[start:start + self.block_size][keep]
+                out[row:row + len(rows)] = rows
+                row += len(rows)
+            out.flush()
+            del out
+            del self.mat
+            os.replace(temp, self.paths["dense"])
+        else:
+            del self.mat
+
+        index = pd.DataFrame({"name": names})
+        if (label_fn is not None):
+            index["HOMO"], index["HOMO-1"], index["diff"] = label_fn(names)
+        write_index(self.prefix, index)
+        with open(self.paths["meta"], "w") as fp:
+            json.dump({"kind": "dense", "shape": [len(names), self.width], "n_bits": self.width}, fp)
+        os.remove(self.progress_file)
+        os.remove(self.names_file)
+        return names
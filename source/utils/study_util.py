@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import numpy as np
+
+# local stand-in for the hosted SigOpt run context. The experiment files in
+# ./sigopt_experiments/ are read as they are; trials live in one sqlite file
+# per study, so any number of workers (on one node or several nodes that
+# share the filesystem) can propose and report against the same study.
+STUDY_DIR = "../data/train/studies/"
+# seconds before a running trial counts as lost (worker or node died) and is
+# marked failed, and consecutive failures after which a worker gives up
+MAX_RUNTIME = 60 * 60 * 24
+MAX_FAILURES = 5
+
+# active trial of this process and metadata logged before it started
+_run = None
+_context = {}
+
+def load_experiment(file_name):
+    """Experiment dict from a sigopt-style yml (name, budget, metric, parameters)."""
+    import yaml
+    with open(file_name) as fp:
+        exp = yaml.safe_load(fp)
+    exp = exp.get("experiment", exp)
+    metric = exp["metrics"][0]
+    return {"name": exp["name"],
+            "budget": exp.get("observation_budget"),
+            "metric": metric["name"],
+            "objective": metric.get("objective", "maximize"),
+            "parameters": exp["parameters"]}
+
+def dimensions(parameters):
+    # skopt search space from the sigopt parameter list
+    from skopt.space import Real, Integer, Categorical
+    dims = []
+    for param in parameters:
+        if param["type"] == "categorical":
+            values = [i["name"] if isinstance(i, dict) else i for i in param["categorical_values"]]
+            dims.append(Categorical(values, name=param["name"]))
+        elif param["type"] == "int":
+            dims.append(Integer(int(param["bounds"]["min"]), int(param["bounds"]["max"]), name=param["name"]))
+        else:
+            prior = "log-uniform" if param.get("transformation") == "log" else "uniform"
+            dims.append(Real(float(param["bounds"]["min"]), float(param["bounds"]["max"]),
+                             prior=prior, name=param["name"]))
+    return dims
+
+def plain_value(value):
+    # numpy scalars from skopt -> json-able python values
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    return value
+
+class Study(object):
+    """Trials of one experiment in a shared sqlite file.
+
+    ``ask`` holds the database write lock while it refits the skopt
+    surrogate on every finished trial and proposes the next point, so
+    concurrent workers never draw the same suggestion. Trials still
+    running elsewhere are told to the surrogate at the best value seen so
+    far (constant liar), which keeps parallel proposals apart.
+    """
+    def __init__(self, db, experiment, max_runtime=MAX_RUNTIME):
+        db_dir = os.path.dirname(db)
+        if (len(db_dir) > 0):
+            os.makedirs(db_dir, exist_ok=True)
+        self.experiment = experiment
+        self.max_runtime = max_runtime
+        self.conn = sqlite3.connect(db, timeout=600, isolation_level=None)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS trials (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                          "state TEXT, params TEXT, metrics TEXT, metadata TEXT, worker TEXT, "
+                          "started REAL, finished REAL)")
+
+    def _value(self, metrics):
+        # skopt minimizes
+        value = metrics[self.experiment["metric"]]
+        return -value if self.experiment["objective"] == "maximize" else value
+
+    def ask(self):
+        """Reserve the next trial, returns (trial id, params) or None when the budget is spent."""
+        from skopt import Optimizer
+
+        names = [i["name"] for i in self.experiment["parameters"]]
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.max_runtime is not None:
+                self.conn.execute("UPDATE trials SET state = 'failed' WHERE state = 'running' AND started < ?",
+                                  (time.time() - self.max_runtime,))
+            rows = self.conn.execute("SELECT state, params, metrics FROM trials").fetchall()
+            # failed trials use up budget too, as observations did on SigOpt
+            budget = self.experiment["budget"]
+            if budget is not None and len(rows) >= budget:
+                self.conn.execute("COMMIT")
+                return None
+
+            # seeded by trial number: reproducible, and distinct initial points per worker
+            opt = Optimizer(dimensions(self.experiment["parameters"]), random_state=len(rows))
+            xs, ys, pending = [], [], []
+            for state, params, metrics in rows:
+                params = json.loads(params)
+                point = [params[i] for i in names]
+                metrics = json.loads(metrics) if metrics is not None else {}
+                if state == "done" and self.experiment["metric"] in metrics:
+                    xs.append(point)
+                    ys.append(self._value(metrics))
+                elif state == "running":
+                    pending.append(point)
+            if len(pending) > 0 and len(ys) > 0:
+                xs += pending
+                ys += [min(ys)] * len(pending)
+            if len(xs) > 0:
+                opt.tell(xs, ys)
+            params = dict((k, plain_value(v)) for k, v in zip(names, opt.ask()))
+
+            cur = self.conn.execute("INSERT INTO trials (state, params, worker, started) VALUES (?, ?, ?, ?)",
+                                    ("running", json.dumps(params), socket.gethostname() + ":" + str(os.getpid()),
+                                     time.time()))
+            self.conn.execute("COMMIT")
+        except:
+            self.conn.execute("ROLLBACK")
+            raise
+        return cur.lastrowid, params
+
+    def tell(self, trial_id, state, params, metrics, metadata):
+        self.conn.execute("UPDATE trials SET state = ?, params = ?, metrics = ?, metadata = ?, finished = ? "
+                          "WHERE id = ?", (state, json.dumps(params), json.dumps(metrics),
+                                           json.dumps(metadata), time.time(), trial_id))
+
+    def trials(self, state="done"):
+        rows = self.conn.execute("SELECT id, params, metrics, metadata FROM trials WHERE state = ? "
+                                 "ORDER BY id", (state,)).fetchall()
+        return [{"id": i[0], "params": json.loads(i[1]),
+                 "metrics": json.loads(i[2]) if i[2] is not None else {},
+                 "metadata": json.loads(i[3]) if i[3] is not None else {}} for i in rows]
+
+    def best(self):
+        done = [i for i in self.trials() if self.experiment["metric"] in i["metrics"]]
+        if len(done) == 0:
+            return None
+        return min(done, key=lambda i: self._value(i["metrics"]))
+
+    def close(self):
+        self.conn.close()
+
+def get_parameter(name, default=None):
+    """Suggested value of ``name`` in the active trial, ``default`` outside one."""
+    if _run is None:
+        return default
+    if name not in _run["params"]:
+        # not in the search space, record what was actually used
+        _run["params"][name] = default
+    return _run["params"][name]
+
+def log_metric(name, value):
+    if _run is None:
+        print(name + ": " + str(value))
+        return
+    _run["metrics"][name] = float(value)
+
+def log_metadata(key, value):
+    _context[key] = plain_value(value) if np.ndim(value) == 0 else [plain_value(i) for i in value]
+
+def log_dataset(name):
+    _context["dataset"] = name
+
+def log_model(type=None):
+    _context["model"] = type
+
+def optimize(experiment_file, fn, db=None, n_trials=None, max_runtime=MAX_RUNTIME, max_failures=MAX_FAILURES):
+    """Run trials of ``fn`` against a shared study until the budget is used up.
+
+    Input: sigopt-style experiment yml, function evaluating one trial
+    (reads get_parameter, reports log_metric), study database (default
+    STUDY_DIR/<experiment name>.sqlite), trials for this worker (None:
+    until the observation budget of the whole study is reached), seconds
+    after which a running trial is reclaimed as failed (None: never),
+    consecutive failed trials after which this worker stops.
+    Output: best finished trial as a dict with id, params, metrics.
+    Start the same command on several workers to search in parallel.
+    """
+    global _run
+    experiment = load_experiment(experiment_file)
+    if db is None:
+        db = STUDY_DIR + experiment["name"] + ".sqlite"
+    study = Study(db, experiment, max_runtime=max_runtime)
+
+    count = 0
+    failures = 0
+    while n_trials is None or count < n_trials:
+        trial = study.ask()
+        if trial is None:
+            break
+        _run = {"id": trial[0], "params": trial[1], "metrics": {}}
+        print("........trial " + str(trial[0]) + ": " + json.dumps(trial[1]) + "........")
+        try:
+            fn()
+            study.tell(trial[0], "done", _run["params"], _run["metrics"], _context)
+            failures = 0
+        except Exception as e:
+            print("trial " + str(trial[0]) + " failed: " + str(e))
+            study.tell(trial[0], "failed", _run["params"], _run["metrics"], _context)
+            failures += 1
+        except:
+            study.tell(trial[0], "failed", _run["params"], _run["metrics"], _context)
+            raise
+        finally:
+            _run = None
+        count += 1
+        if max_failures is not None and failures >= max_failures:
+            print(str(failures) + " trials failed in a row, stopping this worker")
+            break
+
+    best = study.best()
+    study.close()
+    if best is not None:
+        print("best trial " + str(best["id"]) + ": " + json.dumps(best["params"]) + " " + json.dumps(best["metrics"]))
+    return best
@@ -1,78 +1,48 @@
 import os
 import sys
-import pybel
+import numpy as np
 os.system("export KERAS_BACKEND=tensorflow")
 from chemvae.vae_utils import VAEUtils
 from helpers import merge_dir_and_data
+from label_util import label_columns
+from smiles_util import xyz_strings
 
-def vae(dir="../data/xyz/"):
+def vae(dir="../data/xyz/", n_jobs=None, batch_size=1024):
     os.system("export KERAS_BACKEND=tensorflow") # you might need to run this command commandline
     vae = VAEUtils(directory='../data/models/zinc_properties')
 
-    ret = []
-    homo = []
-    homo1 = []
-    diff = []
     names = []
     smiles = []
 
     print("..........converting xyz to smiles.......")
-    dir_fl_names, list_to_sort = merge_dir_and_data(dir=dir)
-    smiles = []
-    rm_ind = []
-
-    for j, i in enumerate(dir_fl_names):
-        try:
-            mol = next(pybel.readfile("xyz", dir + i))
-            smi = mol.write(format="smi")
-            smiles.append(smi.split()[0].strip())
-            sys.stdout.write("\r %s / " % j + str(len(dir_fl_names)))
-            sys.stdout.flush()
-        except:
-            rm_ind.append(j)
+    dir_fl_names, labels = merge_dir_and_data(dir=dir)
+    strings = xyz_strings([dir + item for item in dir_fl_names], n_jobs=n_jobs)
+
+    # canonical smiles come from the cache, only keep what the model can one-hot
+    for item in dir_fl_names:
+        row = strings.get(dir + item)
+        if row is None or row["canonical"] is None:
+            continue
+        smi = row["canonical"]
+        if len(smi) > vae.params['MAX_LEN'] or any(c not in vae.char_indices for c in smi):
+            continue
+        names.append(item)
+        smiles.append(smi)
+    print(len(names))
 
-    rm_ind.reverse()
-    [dir_fl_names.pop(i) for i in rm_ind]
-    [list_to_sort.pop(i) for i in rm_ind]
-    print("\n\nsmiles length: " + str(len(smiles)) + "\n\n")
     # ---------------------------------------------------------------------------
-    for tmp, item in enumerate(smiles):
-        try:
-            mol = next(pybel.readfile("xyz", dir + list_to_sort[tmp].split(":")[0] + ".xyz"))
-            mol_shift = next(pybel.readfile("xyz", dir + list_to_sort[tmp+1].split(":")[0] + ".xyz"))
-            smi = mol.write(format="smi").split()[0].strip()
-            smi_shift = mol_shift.write(format="smi").split()[0].strip()
-            X_1 = vae.smiles_to_hot(str(item), canonize_smiles=True)
-            X_shift = vae.smiles_to_hot(str(smiles[tmp + 1]), canonize_smiles=True)
-            Z_1 = vae.encode(X_1).tolist()
-            Z_shift= vae.encode(X_shift).tolist()
-            if(item == smi):
-                ret.append(Z_1)
-                names.append(item)
-                homo_temp = float(list_to_sort[tmp].split(":")[1])
-                homo1_temp = float(list_to_sort[tmp].split(":")[2])
-                homo.append(homo_temp)
-                homo1.append(homo1_temp)
-                diff.append(homo_temp - homo1_temp)
-            else:
-                try:
-                    if(item == smi_shift):
-                        ret.append(Z_shift)
-                        names.append(item)
-                        homo_temp = float(list_to_sort[tmp + 1].split(":")[1])
-                        homo1_temp = float(list_to_sort[tmp + 1].split(":")[2])
-                        homo.append(homo_temp)
-                        homo1.append(homo1_temp)
-                        diff.append(homo_temp - homo1_temp)
-                except:
-                    #print(list_to_sort[tmp].split(":")[0], item[0:-4])
-                    pass
-            sys.stdout.write("\r %s /" % tmp + str(len(dir_fl_names)))
-            sys.stdout.flush()
-        except:
-            pass
-    print(len(diff))
+    # one forward pass per batch instead of one per molecule
+    blocks = []
+    for start in range(0, len(smiles), batch_size):
+        X_1 = vae.smiles_to_hot(smiles[start:start + batch_size], canonize_smiles=False)
+        blocks.append(np.asarray(vae.encode(X_1), dtype=np.float32))
+        sys.stdout.write("\r %s /" % min(start + batch_size, len(smiles)) + str(len(smiles)))
+        sys.stdout.flush()
+    print("")
+
+    if (len(blocks) > 0):
+        ret = np.vstack(blocks)
+    else:
+        ret = np.zeros((0, 0), dtype=np.float32)
+    homo, homo1, diff = label_columns(names, labels)
     return names, ret, homo, homo1, diff
-
-
-
@@ -2,8 +2,7 @@ import sklearn.utils.fixes
 from numpy.ma import MaskedArray
 sklearn.utils.fixes.MaskedArray = MaskedArray
 
-from datetime import datetime
-import csv, joblib, time, sigopt
+import os, csv, joblib, time
 import numpy as np
 import xgboost as xgb
 import scipy.stats as stats
@@ -12,28 +11,21 @@ from rdkit.Chem import AllChem
 from rdkit.Chem import DataStructs
 from rdkit.Chem import Draw
 
-from skopt.searchcv import BayesSearchCV
-from skopt.callbacks import DeadlineStopper, CheckpointSaver
 from skopt.space import Real, Integer
 
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score,\
     make_scorer
 
-from sklearn.model_selection import train_test_split, GridSearchCV, RandomizedSearchCV,\
-    ShuffleSplit, cross_val_score
+from sklearn.model_selection import train_test_split, RandomizedSearchCV
+
+from source.utils import study_util
+from source.utils.metrics_util import timed_fit, report, cross_evaluate
+from source.utils.search_util import bayes_search, grid_search
 
 csv_loc_rand = "../data/train/rand.csv"
-csv_loc_bayes = "../data/train/bayes.csv"
 
-def xgboost(x, y, scale, dict=None):
-    
-    x = np.array(x)
-    y = np.array(y)
-    try:
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    except:
-        x = list(x)
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
+def xgboost_reg(dict=None):
+    # unfitted regressor, default settings or the best ones from a search
     if(dict == None):
         params = {
             "colsample_bytree": 0.58,
@@ -53,30 +45,19 @@ def xgboost(x, y, scale, dict=None):
         params["eta"] = dict["eta"]
         params["n_estimators"] = dict["n_estimators"]
 
-    reg = xgb.XGBRegressor(**params, objective="reg:squarederror", tree_method="gpu_hist")
+    return xgb.XGBRegressor(**params, objective="reg:squarederror", tree_method="gpu_hist")
+
+def xgboost(x, y, scale, dict=None):
+    
+    x = np.asarray(x)
+    y = np.asarray(y)
+    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
+    reg = xgboost_reg(dict)
 
-    t1 = time.time()
     # non grid
     print(y_train)
-    reg.fit(x_train, y_train)
-    t2 = time.time()
-
-    time_el = t2 - t1
-    score = reg.score(x_test, y_test)
-    print("xgboost score:               " + str(score) + " time: " + str(time_el))
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score))
-
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score))
-
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score))
-
-    score_mae = mean_absolute_error(reg.predict(x_test), y_test)
-    print("scaled MAE")
-    print(scale * score_mae)
+    _, time_el = timed_fit(reg, x_train, y_train)
+    reg.metrics_ = report(reg, x_test, y_test, scale, time_el, "xgboost")
 
     """
     fimportance = reg.feature_importances_
@@ -101,12 +82,8 @@ def xgboost(x, y, scale, dict=None):
     """
     return reg
 
-def xgboost_grid(x, y):
-    try:
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    except:
-        x = list(x)
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
+def xgboost_grid(x, y, log_file="../data/train/grid/trials_grid_xgboost.jsonl"):
+    x_train, x_test, y_train, y_test = train_test_split(np.asarray(x), y, test_size=0.2, random_state=42)
 
     params = {"objective": ['reg:squarederror'],
               "colsample_bytree": [0.25, 0.5, 0.75],
@@ -119,30 +96,17 @@ def xgboost_grid(x, y):
               "tree_method": ["gpu_hist"]}
 
     xgb_temp = xgb.XGBRegressor()
-    reg = GridSearchCV(xgb_temp, params, verbose=5, cv=3)
-
     time_to_stop = 60 * 60
-    ckpt_loc = "../data/train/bayes/ckpt_bayes_xgboost.pkl"
-    checkpoint_callback = CheckpointSaver(ckpt_loc)
-    reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop), checkpoint_callback])
-    print(reg.best_params_)
-    print(reg.best_score_)
+    # folds share the gpu
+    reg = grid_search(xgb_temp, params, x_train, y_train, log_file, cv=3, n_jobs=1, deadline=time_to_stop)
     return reg
 
 def xgboost_bayes_basic(x, y, csv_loc= "../data/train/bayes.csv"):
 
-    global csv_loc_bayes
-    csv_loc_bayes = csv_loc
-
-    try:
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
-    except:
-        x = list(x)
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=42)
+    x_train, x_test, y_train, y_test = train_test_split(np.asarray(x), y, test_size=0.2, random_state=42)
 
     xgb_temp = xgb.XGBRegressor()
-    reg = BayesSearchCV(
-        xgb_temp, {
+    space = {
             "colsample_bytree": Real(0.5, 0.99),
             "max_depth": Integer(5, 25),
             "lambda": Real(0, 0.25),
@@ -153,36 +117,16 @@ def xgboost_bayes_basic(x, y, csv_loc= "../data/train/bayes.csv"):
             "n_estimators": Integer(500, 5000),
             "objective": ["reg:squarederror"],
             "tree_method": ["gpu_hist"]
-        },
-        n_iter=10000,
-        verbose=4, cv=3)
+        }
 
+    # trials (params, fold scores, timings) go to <csv_loc>.jsonl, the same
+    # call picks up where a killed search stopped
     time_to_stop = 60 * 60 * 47
-
-    now = datetime.now()
-    year = now.strftime("%Y")
-    month = now.strftime("%m")
-    day = now.strftime("%d")
-    hour = now.strftime("%H")
-    minute = now.strftime("%M")
-    sec = now.strftime("%S")
-    #ckpt_loc = "../data/train/bayes/ckpt_bayes_xgboost" + str(year) + "_"+ str(month) + "_" + str(day) + "_" + \
-    #           str(hour) + "_" + str(minute) + "_" + str(sec) + ".pkl"
-    #checkpoint_callback = CheckpointSaver(ckpt_loc)
-    #reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop), checkpoint_callback])
-
-
-
-    custom_scorer = custom_skopt_scorer
-    reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop), custom_scorer(x,y)])
-    #reg.fit(x_train, y_train, callback=[DeadlineStopper(time_to_stop)])
-
-    score = str(mean_squared_error(reg.predict(x_test), y_test))
-    print("MSE score:   " + str(score))
-    score = str(mean_absolute_error(reg.predict(x_test), y_test))
-    print("MAE score:   " + str(score))
-    score = str(r2_score(reg.predict(x_test), y_test))
-    print("r2 score:   " + str(score))
+    log_file = os.path.splitext(csv_loc)[0] + ".jsonl"
+    reg = bayes_search(xgb_temp, space, x_train, y_train, log_file, n_iter=10000, cv=3, n_jobs=1,
+                       deadline=time_to_stop)
+    if reg is not None:
+        reg.metrics_ = report(reg, x_test, y_test, name="xgboost bayes")
     return reg
 
 def xgboost_rand(x, y, csv_loc = "../data/train/rand.csv"):
@@ -218,26 +162,23 @@ def xgboost_rand(x, y, csv_loc = "../data/train/rand.csv"):
 def xgboost_bayes_sigopt(x, y):
 
     params = {"objective": "reg:squarederror", "tree_method": "gpu_hist",
-         "colsample_bytree": sigopt.get_parameter("colsample_bytree", default = 0.5),
-         "max_depth": sigopt.get_parameter("max_depth", default = 10),
-         "lambda": sigopt.get_parameter("lambda", default = 0.0),
-         "learning_rate": sigopt.get_parameter("learning_rate", default = 0.1),
-         "alpha": sigopt.get_parameter("alpha", default = 0.0),
-         "eta": sigopt.get_parameter("eta", default =0.01),
-         "gamma": sigopt.get_parameter("gamma", default = 0),
-         "n_estimators": sigopt.get_parameter("n_estimators", default= 200)}
+         "colsample_bytree": study_util.get_parameter("colsample_bytree", default = 0.5),
+         "max_depth": study_util.get_parameter("max_depth", default = 10),
+         "lambda": study_util.get_parameter("lambda", default = 0.0),
+         "learning_rate": study_util.get_parameter("learning_rate", default = 0.1),
+         "alpha": study_util.get_parameter("alpha", default = 0.0),
+         "eta": study_util.get_parameter("eta", default =0.01),
+         "gamma": study_util.get_parameter("gamma", default = 0),
+         "n_estimators": study_util.get_parameter("n_estimators", default= 200)}
 
     xgb_reg = xgb.XGBRegressor(**params)
 
     return xgb_reg
 
-def evaluate_model(reg, x, y):
-
-    cv = ShuffleSplit(n_splits=3)
-    cv_mse = cross_val_score(reg, x, y, cv=cv, scoring = "neg_mean_squared_error")
-    cv_mae = cross_val_score(reg, x, y, cv=cv, scoring = "neg_mean_absolute_error")
-    cv_r2 = cross_val_score(reg, x, y, cv=cv, scoring = "r2")
-    return np.mean(cv_mse), np.mean(cv_mae), np.mean(cv_r2)
+def evaluate_model(reg, x, y, n_jobs=1, cache=False, fingerprint=None):
+    # folds run one after the other by default, they share the gpu
+    scores = cross_evaluate(reg, x, y, n_splits=3, n_jobs=n_jobs, cache=cache, fingerprint=fingerprint)
+    return -np.mean(scores["mse"]), -np.mean(scores["mae"]), np.mean(scores["r2"])
 
 def custom_sklearn_scorer(reg,x,y):
 
@@ -270,46 +211,3 @@ def custom_sklearn_scorer(reg,x,y):
         fd.write(str_csv)
 
     return np.mean(mean_squared_error)
-
-class custom_skopt_scorer(object):
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.dir = csv_loc_bayes
-
-    def __call__(self, res):
-        from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-
-        dict = {
-            "objective":"reg:squarederror", "tree_method":"gpu_hist",
-             "alpha":res["x"][0], "colsample_bytree":res["x"][1],"eta":res["x"][2],
-            "gamma":res["x"][3], "lambda": res["x"][4], "learning_rate":res["x"][5],
-            "max_depth":res["x"][6],"n_estimators":res["x"][7]
-        }
-        reg = xgb.XGBRegressor(**dict)
-
-        x_train, x_test, y_train, y_test = train_test_split(self.x, self.y, test_size=0.2)
-        reg.fit(x_train, y_train)
-        y_pred = np.array(reg.predict(x_test))
-
-        alpha = res["x"][0]
-        lamb = res["x"][4]
-        learn_rate = res["x"][5]
-        colsamples = res["x"][1]
-        n_estimators = res["x"][7]
-        max_depth = res["x"][6]
-        gamma = res["x"][3]
-        eta = res["x"][2]
-
-        mse = mean_squared_error(y_test, y_pred)
-        mae = mean_absolute_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
-
-        str_csv = str(alpha) + ", " + str(colsamples) + ", " + str(eta) + ", " + str(gamma) + ", " \
-                  + str(lamb) + ", " + str(learn_rate) + ", " + str(max_depth) + ", " + str(n_estimators) \
-                  + ", " + str(mse) + ", " + str(mae) + "," + str(r2) + "\n"
-        with open(self.dir, 'a') as fd:
-            fd.write(str_csv)
-
-        return 0
-
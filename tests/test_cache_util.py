@@ -0,0 +1,26 @@
+import numpy as np
+
+from source.utils.cache_util import DescriptorCache, file_digest
+
+def test_lookup_digests_feed_put(tmp_path):
+    a = tmp_path / "a.xyz"
+    b = tmp_path / "b.xyz"
+    a.write_text("1\n\nH 0 0 0\n")
+    b.write_text("1\n\nHe 0 0 0\n")
+    des_cache = DescriptorCache("test", {"depth": 3}, cache_dir=str(tmp_path / "cache"))
+    hits, misses, digests = des_cache.lookup([str(a), str(b), str(tmp_path / "gone.xyz")])
+    assert hits == {} and len(misses) == 3
+    assert digests == {str(a): file_digest(str(a)), str(b): file_digest(str(b))}
+
+    des_cache.put(str(a), np.arange(4.0), digests[str(a)])
+    # same contents under a new name still hit, other parameters miss
+    c = tmp_path / "c.xyz"
+    c.write_text(a.read_text())
+    hits, misses, _ = des_cache.lookup([str(c), str(b)])
+    assert list(hits.keys()) == [str(c)] and misses == [str(b)]
+    assert np.array_equal(hits[str(c)], np.arange(4.0))
+    des_cache.close()
+
+    other = DescriptorCache("test", {"depth": 2}, cache_dir=str(tmp_path / "cache"))
+    assert other.get(str(a)) is None
+    other.close()
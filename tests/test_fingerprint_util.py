@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("rdkit")
+
+from rdkit import Chem
+
+from source.utils import fingerprint_util
+from source.utils.fingerprint_util import fingerprint_shards, MORGAN, AVAL
+
+def _shard(path, smiles):
+    writer = Chem.SDWriter(str(path))
+    for ind, smi in enumerate(smiles):
+        mol = Chem.MolFromSmiles(smi)
+        mol.SetProp("_Name", "m" + str(ind) + "_" + path.stem)
+        writer.write(mol)
+    writer.close()
+
+def test_fingerprint_shards_cache(tmp_path, monkeypatch):
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(str(work))
+    shards = [tmp_path / "DB_0000.sdf", tmp_path / "DB_0001.sdf"]
+    _shard(shards[0], ["CCO", "c1ccccc1"])
+    _shard(shards[1], ["CC(=O)O"])
+    paths = [str(i) for i in shards]
+    specs = {"morg": MORGAN, "aval": AVAL}
+
+    names, mats = fingerprint_shards(paths, specs, n_jobs=1, cache=False)
+    assert len(names) == 3 and mats["morg"].shape == (3, 1024)
+    cached_names, cached_mats = fingerprint_shards(paths, specs, n_jobs=1, cache=True)
+
+    # second run parses nothing, every shard comes from the cache
+    def no_parse(path, specs):
+        raise AssertionError("parsed " + path)
+    monkeypatch.setattr(fingerprint_util, "_fingerprint_shard", no_parse)
+    again_names, again_mats = fingerprint_shards(paths, specs, n_jobs=1, cache=True)
+    assert names == cached_names == again_names
+    for key in specs:
+        assert np.array_equal(mats[key], again_mats[key])
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from source.utils.label_util import read_labels, attach_labels, split_stem
+
+LABELS = """CCO:-5.0:-6.0
+---- bis-23 ----
+CC=O:-4.0:-4.5
+---- bis-25 ----
+CCN:-3.0:-3.5
+---- tris ----
+CC=O:-2.0:-2.5
+"""
+
+def _labels(tmp_path, segmented=True):
+    data_file = tmp_path / "DATA"
+    data_file.write_text(LABELS)
+    return read_labels(str(data_file), segmented=segmented)
+
+def test_read_labels_diff(tmp_path):
+    labels = _labels(tmp_path)
+    assert list(labels.index) == ["BQ_CCO", "bis-23_CC=O", "bis-25_CCN", "tris_CC=O"]
+    assert labels.loc["bis-23_CC=O", "diff"] == -4.0 - -4.5
+
+def test_split_stem():
+    assert split_stem("bis-25_CCN") == ("bis-25", "CCN")
+    assert split_stem("CCO") == ("BQ", "CCO")
+
+def test_attach_labels_exact_and_fallback(tmp_path):
+    labels = _labels(tmp_path)
+    df = pd.DataFrame({"name": ["xyz/bis-23_CC=O.xyz", "xyz/CCO.xyz", "xyz/BQ_CCO.xyz"]})
+    df, report = attach_labels(df, labels)
+    assert df["HOMO"].tolist() == [-4.0, -5.0, -5.0]
+    # process_input_* tables keep HOMO-1 - HOMO
+    assert np.allclose(df["diff"], [-4.5 - -4.0, -6.0 - -5.0, -6.0 - -5.0])
+    assert report["matched"] == 3
+    assert report["missing"] == [] and report["ambiguous"] == []
+
+def test_attach_labels_stays_in_segment(tmp_path):
+    # bis-25_CC=O has no label of its own, bis-23 and tris do
+    labels = _labels(tmp_path)
+    df = pd.DataFrame({"name": ["xyz/bis-25_CC=O.xyz", "xyz/tris_CC=O.xyz"]})
+    df, report = attach_labels(df, labels)
+    assert np.isnan(df["HOMO"].iloc[0]) and np.isnan(df["diff"].iloc[0])
+    assert df["HOMO"].iloc[1] == -2.0
+    assert report["missing"] == ["xyz/bis-25_CC=O.xyz"]
+
+def test_attach_labels_ambiguous(tmp_path):
+    # unsegmented index keys on the bare smiles, so the prefixed stems only
+    # match through the fallback; a second bis-23 CC=O row makes it ambiguous
+    labels = _labels(tmp_path, segmented=False)
+    labels = pd.concat([labels, labels.iloc[[1]].rename(index=lambda i: "dup")])
+    df = pd.DataFrame({"name": ["xyz/bis-23_CC=O.xyz", "xyz/tris_CC=O.xyz"]})
+    df, report = attach_labels(df, labels)
+    assert np.isnan(df["HOMO"].iloc[0])
+    assert report["ambiguous"] == ["xyz/bis-23_CC=O.xyz"]
+    # tris row was dropped by the first-wins dedup of the bare smiles index
+    assert report["missing"] == ["xyz/tris_CC=O.xyz"]
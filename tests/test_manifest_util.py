@@ -0,0 +1,26 @@
+import os
+
+from source.utils.manifest_util import manifest, list_dir
+
+def test_manifest_rescans_when_mtime_is_set_back(tmp_path):
+    data = tmp_path / "xyz"
+    data.mkdir()
+    (data / "a.xyz").write_text("a")
+    manifest_dir = str(tmp_path / "manifest")
+    assert manifest(str(data), manifest_dir=manifest_dir)["names"] == ["a.xyz"]
+
+    # a new file behind a restored directory mtime still moves the ctime
+    stat = os.stat(str(data))
+    (data / "b.xyz").write_text("b")
+    os.utime(str(data), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert manifest(str(data), manifest_dir=manifest_dir)["names"] == ["a.xyz", "b.xyz"]
+
+def test_manifest_cache_false_sees_in_place_edits(tmp_path):
+    data = tmp_path / "xyz"
+    data.mkdir()
+    (data / "a.xyz").write_text("a")
+    manifest_dir = str(tmp_path / "manifest")
+    assert manifest(str(data), manifest_dir=manifest_dir)["sizes"] == [1]
+    (data / "a.xyz").write_text("abc")
+    assert manifest(str(data), cache=False, manifest_dir=manifest_dir)["sizes"] == [3]
+    assert list_dir(str(data), suffix=".xyz", cache=False) == ["a.xyz"]
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("skopt")
+
+from skopt.space import Real
+from sklearn.kernel_ridge import KernelRidge
+
+from source.utils.search_util import TrialLog, bayes_search, grid_search
+
+def data():
+    x = np.random.RandomState(0).rand(60, 3)
+    return x, x[:, 0] ** 2
+
+def space(high=1.0):
+    return {"alpha": Real(1e-4, high, prior="log-uniform"), "kernel": ["rbf"]}
+
+def test_bayes_resume(tmp_path):
+    x, y = data()
+    log_file = str(tmp_path / "trials.jsonl")
+    reg = bayes_search(KernelRidge(), space(), x, y, log_file, n_iter=3, n_jobs=1)
+    assert len(reg.trials_) == 3
+    # a torn last line from a killed run is skipped
+    with open(log_file, "a") as fp:
+        fp.write('{"params": ')
+    reg = bayes_search(KernelRidge(), space(), x, y, log_file, n_iter=5, n_jobs=1)
+    assert len(reg.trials_) == 5
+    assert len(TrialLog(log_file).load()) == 5
+    assert reg.best_score_ == max(np.mean(i["r2"]) for i in reg.trials_)
+
+def test_bayes_ignores_trials_outside_space(tmp_path):
+    x, y = data()
+    log_file = str(tmp_path / "trials.jsonl")
+    bayes_search(KernelRidge(), space(), x, y, log_file, n_iter=3, n_jobs=1)
+    trials = TrialLog(log_file).load()
+    # shrink the space below every logged alpha
+    low = min(i["params"]["alpha"] for i in trials) / 2
+    reg = bayes_search(KernelRidge(), {"alpha": Real(1e-5, low), "kernel": ["rbf"]}, x, y, log_file,
+                       n_iter=2, n_jobs=1)
+    assert len(reg.trials_) == 2
+    assert all(i["params"]["alpha"] <= low for i in reg.trials_)
+
+def test_bayes_empty(tmp_path):
+    x, y = data()
+    assert bayes_search(KernelRidge(), space(), x, y, str(tmp_path / "a.jsonl"), n_iter=0) is None
+    assert bayes_search(KernelRidge(), space(), x, y, str(tmp_path / "b.jsonl"), n_iter=5,
+                        deadline=-1) is None
+
+def test_grid_resume(tmp_path):
+    x, y = data()
+    log_file = str(tmp_path / "grid.jsonl")
+    grid = {"alpha": [1e-3, 1e-2, 1e-1], "kernel": ["rbf"]}
+    assert grid_search(KernelRidge(), grid, x, y, log_file, n_jobs=1, deadline=-1) is None
+    reg = grid_search(KernelRidge(), grid, x, y, log_file, n_jobs=1)
+    assert len(reg.trials_) == 3
+    reg = grid_search(KernelRidge(), grid, x, y, log_file, n_jobs=1)
+    assert len(reg.trials_) == 3
+    with open(log_file) as fp:
+        assert len([json.loads(i) for i in fp]) == 3
+
+def test_grid_scores_match_gridsearchcv(tmp_path):
+    from sklearn.model_selection import GridSearchCV
+    x, y = data()
+    grid = {"alpha": [1e-3, 1e-1], "kernel": ["rbf"]}
+    reg = grid_search(KernelRidge(), grid, x, y, str(tmp_path / "grid.jsonl"), cv=3, n_jobs=1)
+    ref = GridSearchCV(KernelRidge(), grid, cv=3).fit(x, y)
+    assert reg.best_params_ == ref.best_params_
+    assert np.isclose(reg.best_score_, ref.best_score_)
+
+def test_grid_ignores_trials_outside_grid(tmp_path):
+    x, y = data()
+    log_file = str(tmp_path / "grid.jsonl")
+    grid_search(KernelRidge(), {"alpha": [1e-3], "kernel": ["rbf"]}, x, y, log_file, n_jobs=1)
+    reg = grid_search(KernelRidge(), {"alpha": [10.0, 100.0], "kernel": ["rbf"]}, x, y, log_file, n_jobs=1)
+    assert len(reg.trials_) == 2
+    assert reg.best_params_["alpha"] in [10.0, 100.0]
@@ -0,0 +1,77 @@
+import json
+import os
+
+import numpy as np
+
+from sklearn import preprocessing
+
+from source.utils.store_util import BlockWriter, PackedMatrix, load_store, has_store, save_store, \
+    scale_batched, desc_prefix
+
+def _rows(names):
+    return np.array([[float(i[1:])] * 3 for i in names], dtype=np.float32)
+
+def test_block_writer_resume(tmp_path):
+    prefix = str(tmp_path / "desc_calc_DB_persist")
+    names = ["m" + str(i) for i in range(10)]
+    writer = BlockWriter(prefix, names, 3, block_size=4, params={"spread": 0.28})
+    assert writer.todo() == [0, 1, 2]
+    writer.write(0, _rows(writer.block(0)), [True] * 4)
+    del writer
+
+    # progress holds block indices only, the names are written once
+    with open(prefix + ".progress.json") as fp:
+        progress = json.load(fp)
+    assert progress["done"] == [0] and "names" not in progress
+
+    writer = BlockWriter(prefix, names, 3, block_size=4, params={"spread": 0.28})
+    assert writer.todo() == [1, 2]
+    writer.write(1, _rows(writer.block(1)), [True, False, True, True])
+    writer.write(2, _rows(writer.block(2)), [True, True])
+    kept = writer.finish()
+
+    assert kept == [i for i in names if i != "m5"]
+    assert has_store(prefix)
+    assert not os.path.exists(prefix + ".progress.json") and not os.path.exists(prefix + ".names.json")
+    index, mat = load_store(prefix)
+    assert index["name"].tolist() == kept
+    assert np.array_equal(mat, _rows(kept))
+
+def test_block_writer_restarts_on_other_names(tmp_path):
+    prefix = str(tmp_path / "desc_calc_DB_persist")
+    names = ["m" + str(i) for i in range(6)]
+    writer = BlockWriter(prefix, names, 3, block_size=4)
+    writer.write(0, _rows(writer.block(0)), [True] * 4)
+    del writer
+
+    writer = BlockWriter(prefix, names[::-1], 3, block_size=4)
+    assert writer.todo() == [0, 1]
+    writer = BlockWriter(prefix, names[::-1], 3, block_size=4, params={"spread": 0.3})
+    assert writer.todo() == [0, 1]
+
+def test_packed_matrix_round_trip(tmp_path):
+    prefix = str(tmp_path / "desc_calc_DB_morg")
+    # 13 bits: the last byte is padded
+    bits = (np.random.RandomState(0).rand(9, 13) > 0.5).astype(np.uint8)
+    assert save_store(prefix, ["m" + str(i) for i in range(9)], bits, [1.0] * 9, [2.0] * 9, [-1.0] * 9) == "bits"
+    index, mat = load_store(prefix)
+    assert isinstance(mat, PackedMatrix)
+    assert mat.shape == (9, 13)
+    assert np.array_equal(mat[2:5], bits[2:5])
+    assert np.array_equal(mat.to_dense(), bits)
+    assert np.array_equal(np.vstack(list(mat.batches(4))), bits)
+    assert np.array_equal(mat.to_sparse(4).toarray(), bits)
+    assert index["diff"].tolist() == [-1.0] * 9
+
+def test_scale_batched_matches_sklearn(tmp_path):
+    bits = (np.random.RandomState(1).rand(11, 16) > 0.7).astype(np.uint8)
+    bits[:, 3] = 1
+    mat = PackedMatrix(np.packbits(bits, axis=1), 16)
+    expected = preprocessing.scale(bits.astype(np.float64))
+    assert np.allclose(scale_batched(mat, batch_size=4), expected, atol=1e-5)
+    dense = np.random.RandomState(2).rand(11, 5).astype(np.float32)
+    assert np.allclose(scale_batched(dense, batch_size=3), preprocessing.scale(dense.astype(np.float64)),
+                       atol=1e-5)
+
+def test_desc_prefix():
+    assert desc_prefix("DB3", "morg") == "../data/desc/DB3/desc_calc_DB3_morg"
@@ -0,0 +1,80 @@
+import time
+import sqlite3
+
+import pytest
+
+pytest.importorskip("skopt")
+pytest.importorskip("yaml")
+
+from source.utils import study_util
+
+EXPERIMENT = """experiment:
+  name: toy
+  observation_budget: 6
+  metrics:
+     - name: nmse
+       objective: maximize
+  parameters:
+    - name: a
+      bounds: {min: -3, max: 3}
+      type: double
+    - name: b
+      bounds: {min: 1, max: 10}
+      type: int
+"""
+
+@pytest.fixture
+def experiment(tmp_path):
+    file_name = tmp_path / "toy.yml"
+    file_name.write_text(EXPERIMENT)
+    return str(file_name)
+
+def states(db):
+    conn = sqlite3.connect(db)
+    ret = dict(conn.execute("SELECT state, COUNT(*) FROM trials GROUP BY state").fetchall())
+    conn.close()
+    return ret
+
+def test_optimize_uses_budget(experiment, tmp_path):
+    db = str(tmp_path / "study.sqlite")
+
+    def fn():
+        a = study_util.get_parameter("a")
+        study_util.log_metric("nmse", -(a - 1) ** 2)
+
+    best = study_util.optimize(experiment, fn, db=db)
+    assert states(db) == {"done": 6}
+    assert best["metrics"]["nmse"] <= 0
+    # budget spent, a second worker does nothing
+    study_util.optimize(experiment, fn, db=db)
+    assert states(db) == {"done": 6}
+
+def test_failures_stop_worker(experiment, tmp_path):
+    db = str(tmp_path / "study.sqlite")
+
+    def fn():
+        raise RuntimeError("boom")
+
+    assert study_util.optimize(experiment, fn, db=db, max_failures=3) is None
+    assert states(db) == {"failed": 3}
+
+def test_failures_count_toward_budget(experiment, tmp_path):
+    db = str(tmp_path / "study.sqlite")
+
+    def fn():
+        raise RuntimeError("boom")
+
+    study_util.optimize(experiment, fn, db=db, max_failures=None)
+    assert states(db) == {"failed": 6}
+
+def test_stale_running_trial_reclaimed(experiment, tmp_path):
+    db = str(tmp_path / "study.sqlite")
+    study = study_util.Study(db, study_util.load_experiment(experiment), max_runtime=0.2)
+    study.ask()
+    time.sleep(0.5)
+    study.ask()
+    study.close()
+    assert states(db) == {"failed": 1, "running": 1}
+
+def test_get_parameter_outside_trial():
+    assert study_util.get_parameter("a", default=0.5) == 0.5